@@ -1,25 +1,118 @@
 import sys
 import os
-import json
 import uuid
+import atexit
+from datetime import datetime, timezone
+import math
+import time
+from concurrent.futures import wait
+from typing import List, Optional, Tuple, Union
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from flask import Flask, request, jsonify, g
-from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from flask import Flask, Response, request, jsonify, g, stream_with_context
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, TooManyRequests, UnsupportedMediaType
 from shared.logging import set_correlation_id, get_correlation_id
 
 from shared.models import IncomingEvent
 from shared.logging import setup_logging
-from shared.rabbit import RabbitMQProducer
+from shared.rabbit import RabbitMQProducerPool
+from shared.publisher import ConfirmingPublisher, ConfirmTimeout, PublishError
+from shared.spool import Spool, SpoolDrainer, SpoolFullError, SpoolRecord
+from shared.codec import resolve_content_type
+from shared.schemas import SchemaRegistry
 from api.config import Config
+from api.health import HealthProber
+from api.events import prepare_event
+from api.body import NO_LINE, TimedLineReader, iter_lines, open_body_stream, read_body
+from api.dedupe import RecentEventCache
+from api.ratelimit import RateLimiter, parse_limits
+from api import metrics
+from shared.jsonutil import dumps, loads, split_event, split_event_array
 
 app = Flask(__name__)
 app.config.from_object(Config)
 logger = setup_logging(__name__, Config.LOG_LEVEL, json_format=Config.JSON_LOGS)
 
-# Инициализация RabbitMQ продюсера
-rabbit_producer = RabbitMQProducer(Config.RABBIT_URL)
+# Формат тел сообщений в RabbitMQ (AMQP content_type): JSON или MessagePack
+MESSAGE_CONTENT_TYPE = resolve_content_type(Config.MESSAGE_FORMAT)
+
+# Пул долгоживущих RabbitMQ продюсеров, общий для всех потоков-обработчиков
+rabbit_producer = RabbitMQProducerPool(
+    Config.RABBIT_URL,
+    size=Config.RABBIT_POOL_SIZE,
+    acquire_timeout=Config.RABBIT_POOL_TIMEOUT
+)
+# Соединения живут всё время работы процесса и закрываются при выходе
+atexit.register(rabbit_producer.close)
+
+# Фоновый публикатор с publisher confirms: 202 отдаём только после подтверждения брокером
+confirm_publisher: Optional[ConfirmingPublisher] = None
+if Config.RABBIT_PUBLISHER_CONFIRMS:
+    confirm_publisher = ConfirmingPublisher(
+        Config.RABBIT_URL,
+        max_batch=Config.PUBLISH_BATCH_SIZE,
+        linger_ms=Config.PUBLISH_LINGER_MS
+    )
+    confirm_publisher.start()
+    atexit.register(confirm_publisher.stop)
+
+# Фоновая проверка RabbitMQ: /health и /ready отдают закэшированный результат
+health_prober = HealthProber(
+    Config.RABBIT_URL,
+    Config.RABBIT_QUEUE_EVENTS,
+    interval=Config.HEALTH_PROBE_INTERVAL,
+    stale_after=Config.HEALTH_STALE_AFTER
+)
+health_prober.start()
+atexit.register(health_prober.stop)
+
+# Дисковый спул: пока брокер недоступен или медленный, события копятся на диске
+spool: Optional[Spool] = None
+spool_drainer: Optional[SpoolDrainer] = None
+if Config.SPOOL_ENABLED:
+    spool = Spool(
+        Config.SPOOL_DIR,
+        segment_bytes=Config.SPOOL_SEGMENT_BYTES,
+        max_bytes=Config.SPOOL_MAX_BYTES,
+        fsync=Config.SPOOL_FSYNC,
+        fsync_interval=Config.SPOOL_FSYNC_INTERVAL
+    )
+    # atexit вызывает функции в обратном порядке: сначала дренаж, потом спул
+    atexit.register(spool.close)
+
+# Недавно принятые event_id: повтор клиента получает исходный 202 без публикации
+dedupe_cache: Optional[RecentEventCache] = None
+if Config.DEDUPE_ENABLED:
+    dedupe_cache = RecentEventCache(max_size=Config.DEDUPE_CACHE_SIZE, ttl=Config.DEDUPE_TTL)
+
+# Лимиты приёма по source / event_type: шумный источник не забивает очередь остальным
+rate_limiter: Optional[RateLimiter] = None
+if Config.RATE_LIMIT_ENABLED:
+    rate_limiter = RateLimiter(
+        (Config.RATE_LIMIT_SOURCE_RATE, max(1.0, Config.RATE_LIMIT_SOURCE_BURST)) if Config.RATE_LIMIT_SOURCE_RATE > 0 else None,
+        source_overrides=parse_limits(Config.RATE_LIMIT_SOURCES),
+        event_type_limits=parse_limits(Config.RATE_LIMIT_EVENT_TYPES),
+        max_keys=Config.RATE_LIMIT_MAX_KEYS
+    )
+
+# Схемы payload: неизвестные event_type / schema_version проходят без проверки
+schema_registry: Optional[SchemaRegistry] = None
+if Config.SCHEMA_DIR:
+    schema_registry = SchemaRegistry(
+        Config.SCHEMA_DIR,
+        reload_interval=Config.SCHEMA_RELOAD_INTERVAL,
+        max_depth=Config.SCHEMA_MAX_DEPTH,
+        max_nodes=Config.SCHEMA_MAX_NODES
+    )
+
+# Content-Type потокового приёма
+STREAM_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+
+# Результат доставки сообщения (иначе — исключение)
+DELIVERY_PUBLISHED = 'published'
+DELIVERY_SPOOLED = 'spooled'
+Delivery = Union[str, Exception]
 
 
 @app.before_request
@@ -29,6 +122,7 @@ def before_request():
     correlation_id = request.headers.get('X-Correlation-ID', str(uuid.uuid4()))
     set_correlation_id(correlation_id)
     g.correlation_id = correlation_id
+    g.request_started = time.perf_counter()
 
 
 @app.after_request
@@ -37,27 +131,48 @@ def after_request(response):
     correlation_id = get_correlation_id()
     if correlation_id:
         response.headers['X-Correlation-ID'] = correlation_id
+    
+    # Метка — шаблон маршрута, а не путь: число серий ограничено
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe_request(endpoint, response.status_code, time.perf_counter() - g.request_started)
     return response
 
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Проверка здоровья сервиса"""
-    # Проверяем подключение к RabbitMQ
-    try:
-        rabbit_producer.connect()
-        rabbit_status = "connected"
-    except Exception as e:
-        logger.warning(f"RabbitMQ health check failed: {e}")
-        rabbit_status = "disconnected"
+    """Проверка здоровья сервиса (результат фоновой проверки, без похода в брокер)"""
+    snapshot = health_prober.snapshot()
     
     return jsonify({
         "status": "healthy",
         "service": "ingestion-api",
-        "rabbitmq": rabbit_status
+        "rabbitmq": snapshot["rabbitmq"],
+        "rabbitmq_check": snapshot,
+        "dedupe_cache": dedupe_cache.stats() if dedupe_cache is not None else None,
+        "schemas": schema_registry.stats() if schema_registry is not None else None,
+        "rate_limit": rate_limiter.stats() if rate_limiter is not None else None
     })
 
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Готовность принимать трафик: брокер недавно успешно отвечал"""
+    ready = health_prober.is_ready()
+    
+    return jsonify({
+        "status": "ready" if ready else "not_ready",
+        "service": "ingestion-api",
+        "rabbitmq_check": health_prober.snapshot()
+    }), 200 if ready else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Метрики в формате Prometheus (агрегированные по процессам в мультипроцессном режиме)"""
+    body, content_type = metrics.render_latest()
+    return Response(body, content_type=content_type)
+
+
 @app.route('/events', methods=['POST'])
 def receive_event():
     """Приём события от клиента"""
@@ -66,14 +181,39 @@ def receive_event():
     if not request.is_json:
         raise BadRequest("Content-Type must be application/json")
     
+    # Тело может быть сжато (Content-Encoding), лимит — на распакованный размер
+    started = time.perf_counter()
+    raw_body = read_body(request, Config.MAX_BODY_BYTES)
+    parse_started = time.perf_counter()
+    metrics.STAGE_READ_BODY.observe(parse_started - started)
+    metrics.BODY_EVENT.observe(len(raw_body))
+    
+    # Тело разбирается один раз; на быстром пути исходный payload не перекодируется
     try:
-        raw_data = request.get_json(force=True)
-    except json.JSONDecodeError as e:
+        if Config.API_FAST_PATH:
+            raw_data, payload_json = split_event(raw_body)
+        else:
+            raw_data, payload_json = loads(raw_body), None
+    except ValueError as e:
         logger.warning(f"Invalid JSON received: {str(e)}")
         raise BadRequest(f"Invalid JSON: {str(e)}")
+    metrics.STAGE_PARSE.observe(time.perf_counter() - parse_started)
+    
+    # Повтор уже принятого события: отвечаем как в первый раз, без валидации и публикации
+    client_event_id = _client_event_id(raw_data)
+    original_response = _recent_response(client_event_id)
+    if original_response is not None:
+        logger.info(f"Duplicate event {client_event_id} answered from cache, correlation: {correlation_id}")
+        return jsonify(original_response), 202
+    
+    # Лимит проверяем до валидации: отклонённое событие не тратит CPU
+    retry_after = _check_rate_limit(raw_data)
+    if retry_after:
+        logger.warning(f"Event throttled: source={raw_data.get('source')}, correlation: {correlation_id}")
+        raise TooManyRequests("Rate limit exceeded, retry later", retry_after=_retry_after_seconds(retry_after))
     
     try:
-        event = IncomingEvent(**raw_data)
+        event, message_body = prepare_event(raw_data, payload_json, MESSAGE_CONTENT_TYPE, schemas=schema_registry)
     except Exception as e:
         logger.warning(f"Validation failed: {str(e)}")
         raise BadRequest(f"Invalid event data: {str(e)}")
@@ -86,37 +226,515 @@ def receive_event():
         extra={'event_id': event.event_id, 'correlation_id': correlation_id}
     )
     
-    # Сериализуем событие в JSON
-    message_body = event.serialize_to_json()
-    
     # Отправляем в RabbitMQ с correlation_id в заголовках
-    try:
-        rabbit_producer.publish(
-            queue_name=Config.RABBIT_QUEUE_EVENTS,
-            message_body=message_body,
-            headers={
-                'event_id': event.event_id,
-                'event_type': event.event_type,
-                'source': event.source,
-                'schema_version': str(event.schema_version),
-                'correlation_id': correlation_id  # Добавляем correlation_id
-            }
-        )
+    delivery = _publish_messages([(message_body, _event_headers(event, correlation_id))])[0]
+    if isinstance(delivery, Exception):
+        logger.error(f"Failed to publish event to RabbitMQ: {delivery}, correlation: {correlation_id}")
+        return jsonify({
+            "error": "Internal Server Error",
+            "message": "Failed to process event"
+        }), 500
+    
+    if delivery == DELIVERY_SPOOLED:
+        logger.warning(f"Event {event.event_id} spooled for later delivery, correlation: {correlation_id}")
+    else:
         logger.info(f"Event {event.event_id} published to RabbitMQ, correlation: {correlation_id}")
+    
+    response = _accepted_response(event.event_id, correlation_id, delivery)
+    if client_event_id is not None and dedupe_cache is not None:
+        dedupe_cache.remember(client_event_id, response)
+    
+    return jsonify(response), 202
+
+
+@app.route('/events/batch', methods=['POST'])
+def receive_events_batch():
+    """Пакетный приём событий: JSON-массив, статус по каждому элементу"""
+    correlation_id = get_correlation_id()
+    
+    if not request.is_json:
+        raise BadRequest("Content-Type must be application/json")
+    
+    started = time.perf_counter()
+    raw_body = read_body(request, Config.MAX_BATCH_BYTES)
+    parse_started = time.perf_counter()
+    metrics.STAGE_READ_BODY.observe(parse_started - started)
+    metrics.BODY_BATCH.observe(len(raw_body))
+    
+    try:
+        if Config.API_FAST_PATH:
+            raw_items = split_event_array(raw_body)
+        else:
+            raw_items = loads(raw_body)
+            if isinstance(raw_items, list):
+                raw_items = [(raw_data, None) for raw_data in raw_items]
+    except ValueError as e:
+        logger.warning(f"Invalid JSON batch received: {str(e)}")
+        raise BadRequest(f"Invalid JSON: {str(e)}")
+    metrics.STAGE_PARSE.observe(time.perf_counter() - parse_started)
+    
+    if not isinstance(raw_items, list):
+        raise BadRequest("Batch body must be a JSON array of events")
+    
+    if len(raw_items) > Config.MAX_BATCH_EVENTS:
+        raise RequestEntityTooLarge(f"Batch contains more than {Config.MAX_BATCH_EVENTS} events")
+    
+    # Валидируем каждый элемент отдельно: ошибка одного не ломает пачку
+    now = datetime.now(timezone.utc)
+    results = []
+    published = []
+    messages = []
+    client_event_ids = []
+    duplicates = 0
+    throttled = 0
+    min_retry_after = 0.0
+    for index, (raw_data, payload_json) in enumerate(raw_items):
+        client_event_id = _client_event_id(raw_data)
+        if _recent_response(client_event_id) is not None:
+            duplicates += 1
+            results.append({
+                "index": index,
+                "event_id": client_event_id,
+                "status": "duplicate"
+            })
+            continue
         
-    except Exception as e:
-        logger.error(f"Failed to publish event to RabbitMQ: {e}, correlation: {correlation_id}")
+        retry_after = _check_rate_limit(raw_data)
+        if retry_after:
+            throttled += 1
+            min_retry_after = min(min_retry_after or retry_after, retry_after)
+            results.append({
+                "index": index,
+                "status": "throttled",
+                "retry_after": _retry_after_seconds(retry_after)
+            })
+            continue
+        
+        try:
+            event, message_body = prepare_event(raw_data, payload_json, MESSAGE_CONTENT_TYPE, now, schema_registry)
+        except Exception as e:
+            results.append({
+                "index": index,
+                "status": "rejected",
+                "reason": f"Invalid event data: {str(e)}"
+            })
+            continue
+        
+        messages.append((message_body, _event_headers(event, correlation_id)))
+        published.append({
+            "index": index,
+            "event_id": event.event_id,
+            "status": "accepted"
+        })
+        results.append(published[-1])
+        client_event_ids.append(client_event_id)
+    
+    # Публикуем все валидные события за один проход
+    deliveries = _publish_messages(messages)
+    errors = [delivery for delivery in deliveries if isinstance(delivery, Exception)]
+    for result, delivery, client_event_id in zip(published, deliveries, client_event_ids):
+        if isinstance(delivery, Exception):
+            result["status"] = "failed"
+            result["reason"] = "Failed to publish event"
+            continue
+        if delivery == DELIVERY_SPOOLED:
+            result["status"] = "spooled"
+        if client_event_id is not None and dedupe_cache is not None:
+            dedupe_cache.remember(client_event_id, _accepted_response(result["event_id"], correlation_id, delivery))
+    
+    failed = len(errors)
+    if messages and failed == len(messages):
+        logger.error(f"Failed to publish batch to RabbitMQ: {errors[0]}, correlation: {correlation_id}")
         return jsonify({
             "error": "Internal Server Error",
-            "message": "Failed to process event"
+            "message": "Failed to process batch"
         }), 500
     
-    return jsonify({
-        "event_id": event.event_id,
+    accepted = len(messages) - failed
+    rejected = len(results) - len(messages) - duplicates - throttled
+    
+    logger.info(
+        f"Batch received: total={len(results)}, accepted={accepted}, duplicates={duplicates}, "
+        f"throttled={throttled}, rejected={rejected}, failed={failed}, correlation_id={correlation_id}"
+    )
+    
+    response = jsonify({
+        "correlation_id": correlation_id,
+        "accepted": accepted,
+        "duplicates": duplicates,
+        "throttled": throttled,
+        "rejected": rejected,
+        "failed": failed,
+        "results": results
+    })
+    if accepted or duplicates:
+        return response, 202
+    if throttled:
+        response.headers['Retry-After'] = str(_retry_after_seconds(min_retry_after))
+        return response, 429
+    return response, 400
+
+
+@app.route('/events/stream', methods=['POST'])
+def receive_events_stream():
+    """
+    Потоковый приём NDJSON: одно событие на строку в одном долгом запросе
+    
+    Строки разбираются и валидируются по мере чтения, валидные события
+    публикуются пачками до STREAM_BATCH_SIZE, а в ответ построчно
+    отдаются подтверждения (тоже NDJSON). Память не зависит от длины потока.
+    """
+    correlation_id = get_correlation_id()
+    
+    if request.mimetype not in STREAM_MIMETYPES:
+        raise UnsupportedMediaType("Content-Type must be application/x-ndjson")
+    
+    # Открываем поток до начала ответа: неизвестный Content-Encoding — обычный 415
+    stream = open_body_stream(request)
+    acks = _stream_acks(iter_lines(stream, Config.MAX_BODY_BYTES), correlation_id)
+    
+    return Response(stream_with_context(acks), mimetype='application/x-ndjson')
+
+
+def _stream_acks(lines, correlation_id: str):
+    """Генератор строк-подтверждений для receive_events_stream"""
+    counts = {"accepted": 0, "duplicates": 0, "throttled": 0, "rejected": 0, "failed": 0}
+    # (подтверждение, сообщение, event_id клиента) — ждут публикации
+    pending = []
+    batch_started = 0.0
+    linger = Config.STREAM_LINGER_MS / 1000.0
+    # Строки читаются в фоне: неполная пачка уходит по таймеру, даже если клиент молчит
+    reader = TimedLineReader(lines, max_buffered=Config.STREAM_BATCH_SIZE)
+    
+    def linger_left() -> Optional[float]:
+        if not pending:
+            return None
+        return max(0.0, batch_started + linger - time.monotonic())
+    
+    def ack_line(ack: dict) -> bytes:
+        return dumps(ack) + b'\n'
+    
+    def flush():
+        messages = [message for _, message, _ in pending]
+        deliveries = _publish_messages(messages)
+        for (ack, _, client_event_id), delivery in zip(pending, deliveries):
+            if isinstance(delivery, Exception):
+                ack["status"] = "failed"
+                ack["reason"] = "Failed to publish event"
+                counts["failed"] += 1
+            else:
+                if delivery == DELIVERY_SPOOLED:
+                    ack["status"] = "spooled"
+                counts["accepted"] += 1
+                if client_event_id is not None and dedupe_cache is not None:
+                    dedupe_cache.remember(client_event_id, _accepted_response(ack["event_id"], correlation_id, delivery))
+            yield ack_line(ack)
+        pending.clear()
+    
+    line_number = 0
+    try:
+        for line in reader.lines(linger_left):
+            if line is NO_LINE:
+                # За STREAM_LINGER_MS новых строк не было — отправляем неполную пачку
+                yield from flush()
+                continue
+            
+            line_number += 1
+            if line is None:
+                counts["rejected"] += 1
+                yield ack_line({
+                    "line": line_number,
+                    "status": "rejected",
+                    "reason": f"Line exceeds {Config.MAX_BODY_BYTES} bytes"
+                })
+                continue
+            if not line.strip():
+                continue
+            
+            metrics.BODY_STREAM_LINE.observe(len(line))
+            parse_started = time.perf_counter()
+            try:
+                if Config.API_FAST_PATH:
+                    raw_data, payload_json = split_event(line)
+                else:
+                    raw_data, payload_json = loads(line), None
+            except ValueError as e:
+                counts["rejected"] += 1
+                yield ack_line({"line": line_number, "status": "rejected", "reason": f"Invalid JSON: {str(e)}"})
+                continue
+            metrics.STAGE_PARSE.observe(time.perf_counter() - parse_started)
+            
+            client_event_id = _client_event_id(raw_data)
+            if _recent_response(client_event_id) is not None:
+                counts["duplicates"] += 1
+                yield ack_line({"line": line_number, "event_id": client_event_id, "status": "duplicate"})
+                continue
+            
+            retry_after = _check_rate_limit(raw_data)
+            if retry_after:
+                counts["throttled"] += 1
+                yield ack_line({
+                    "line": line_number,
+                    "status": "throttled",
+                    "retry_after": _retry_after_seconds(retry_after)
+                })
+                continue
+            
+            try:
+                event, message_body = prepare_event(raw_data, payload_json, MESSAGE_CONTENT_TYPE, schemas=schema_registry)
+            except Exception as e:
+                counts["rejected"] += 1
+                yield ack_line({
+                    "line": line_number,
+                    "status": "rejected",
+                    "reason": f"Invalid event data: {str(e)}"
+                })
+                continue
+            
+            if not pending:
+                batch_started = time.monotonic()
+            pending.append((
+                {"line": line_number, "event_id": event.event_id, "status": "accepted"},
+                (message_body, _event_headers(event, correlation_id)),
+                client_event_id
+            ))
+            
+            # Пачку отправляем по размеру или по времени (строки идут без пауз)
+            linger_expired = time.monotonic() - batch_started >= linger
+            if len(pending) >= Config.STREAM_BATCH_SIZE or linger_expired:
+                yield from flush()
+        
+        if pending:
+            yield from flush()
+    except BadRequest as e:
+        logger.warning(f"Event stream aborted at line {line_number}: {e.description}, correlation: {correlation_id}")
+        if pending:
+            yield from flush()
+        yield ack_line({"error": "Bad Request", "message": str(e.description), "line": line_number})
+    finally:
+        reader.close()
+    
+    logger.info(
+        f"Event stream finished: lines={line_number}, accepted={counts['accepted']}, "
+        f"duplicates={counts['duplicates']}, throttled={counts['throttled']}, "
+        f"rejected={counts['rejected']}, failed={counts['failed']}, correlation_id={correlation_id}"
+    )
+    yield ack_line({"correlation_id": correlation_id, "lines": line_number, **counts})
+
+
+def _publish_messages(messages: List[Tuple[bytes, dict]]) -> List[Delivery]:
+    """Доставка сообщений с учётом метрик (см. _deliver_messages)"""
+    started = time.perf_counter()
+    deliveries = _deliver_messages(messages)
+    metrics.STAGE_PUBLISH.observe(time.perf_counter() - started)
+    
+    for delivery in deliveries:
+        if delivery == DELIVERY_PUBLISHED:
+            metrics.EVENTS_PUBLISHED.inc()
+        elif delivery == DELIVERY_SPOOLED:
+            metrics.EVENTS_SPOOLED.inc()
+        else:
+            metrics.EVENTS_FAILED.inc()
+            metrics.PUBLISH_ERRORS.labels(type(delivery).__name__).inc()
+    return deliveries
+
+
+def _deliver_messages(messages: List[Tuple[bytes, dict]]) -> List[Delivery]:
+    """
+    Доставка сообщений: публикация в брокер, при сбое — в дисковый спул
+    
+    Пока в спуле есть недоотправленные сообщения, новые пишутся сразу
+    в спул, чтобы дренаж сохранил порядок. Сообщение, уже отправленное
+    в канал, но не подтверждённое вовремя (ConfirmTimeout), в спул
+    не пишется: брокер ещё может его принять.
+    
+    Args:
+        messages: Список пар (тело сообщения, заголовки)
+    
+    Returns:
+        Результат по каждому сообщению: DELIVERY_PUBLISHED, DELIVERY_SPOOLED
+        или исключение
+    """
+    if spool is None:
+        return [
+            DELIVERY_PUBLISHED if error is None else error
+            for error in _publish_to_broker(messages, Config.PUBLISH_CONFIRM_TIMEOUT)
+        ]
+    
+    if spool.pending_bytes():
+        return [_spool_message(body, headers, None) for body, headers in messages]
+    
+    timeout = min(Config.PUBLISH_CONFIRM_TIMEOUT, Config.SPOOL_LATENCY_BUDGET_MS / 1000.0)
+    errors = _publish_to_broker(messages, timeout)
+    deliveries: List[Delivery] = []
+    for (body, headers), error in zip(messages, errors):
+        if error is None:
+            deliveries.append(DELIVERY_PUBLISHED)
+        elif isinstance(error, ConfirmTimeout):
+            # Брокер ещё может принять сообщение: копия в спуле стала бы дубликатом
+            deliveries.append(error)
+        else:
+            deliveries.append(_spool_message(body, headers, error))
+    return deliveries
+
+
+def _spool_message(body: bytes, headers: dict, error: Optional[Exception]) -> Delivery:
+    """Запись сообщения в спул; если спул полон, возвращается ошибка публикации"""
+    try:
+        spool.append(body, headers, MESSAGE_CONTENT_TYPE)
+    except (SpoolFullError, OSError) as e:
+        logger.error(f"Failed to spool message: {e}")
+        return error or e
+    return DELIVERY_SPOOLED
+
+
+def _publish_to_broker(messages: List[Tuple[bytes, dict]],
+                       timeout: float,
+                       content_type: str = MESSAGE_CONTENT_TYPE) -> List[Optional[Exception]]:
+    """
+    Публикация сообщений в очередь событий
+    
+    С publisher confirms ждём подтверждения брокером каждого сообщения
+    (не дольше timeout), без них публикуем пачкой через пул продюсеров.
+    
+    Args:
+        messages: Список пар (тело сообщения, заголовки)
+        timeout: Сколько ждать подтверждений (секунды)
+        content_type: Формат тел сообщений
+    
+    Returns:
+        Ошибка по каждому сообщению (None — сообщение опубликовано)
+    """
+    if not messages:
+        return []
+    
+    if confirm_publisher is None:
+        try:
+            rabbit_producer.publish_batch(Config.RABBIT_QUEUE_EVENTS, messages, content_type)
+        except Exception as e:
+            return [e] * len(messages)
+        return [None] * len(messages)
+    
+    futures = [
+        confirm_publisher.submit(Config.RABBIT_QUEUE_EVENTS, body, headers, content_type)
+        for body, headers in messages
+    ]
+    wait(futures, timeout=timeout)
+    
+    errors = []
+    for future in futures:
+        # Отмена удаётся, только пока сообщение ждёт в очереди публикатора:
+        # в брокер оно уже не уйдёт
+        if future.cancel():
+            errors.append(PublishError("Timed out before publishing"))
+        elif not future.done():
+            # Сообщение в канале, подтверждение ещё может прийти
+            errors.append(ConfirmTimeout("Timed out waiting for broker confirm"))
+        else:
+            errors.append(future.exception())
+    return errors
+
+
+def _client_event_id(raw_data) -> Optional[str]:
+    """event_id, переданный клиентом (сгенерированные API id не кэшируются)"""
+    if isinstance(raw_data, dict):
+        event_id = raw_data.get('event_id')
+        if isinstance(event_id, str) and event_id:
+            return event_id
+    return None
+
+
+def _recent_response(client_event_id: Optional[str]) -> Optional[dict]:
+    """Исходный ответ на уже принятое событие с этим event_id"""
+    if client_event_id is None or dedupe_cache is None:
+        return None
+    
+    response = dedupe_cache.get(client_event_id)
+    if response is None:
+        metrics.DEDUPE_MISS.inc()
+    else:
+        metrics.DEDUPE_HIT.inc()
+    return response
+
+
+def _check_rate_limit(raw_data) -> float:
+    """Retry-After в секундах, если событие превышает лимит, иначе 0"""
+    if rate_limiter is None or not isinstance(raw_data, dict):
+        return 0.0
+    
+    retry_after = rate_limiter.check(raw_data.get('source'), raw_data.get('event_type'))
+    if retry_after:
+        metrics.THROTTLED.inc()
+    return retry_after
+
+
+def _retry_after_seconds(retry_after: float) -> int:
+    """Значение заголовка Retry-After: целые секунды, не меньше 1"""
+    return max(1, math.ceil(min(retry_after, Config.RATE_LIMIT_MAX_RETRY_AFTER)))
+
+
+def _accepted_response(event_id: str, correlation_id: str, delivery: Delivery) -> dict:
+    """Тело ответа 202 на принятое событие"""
+    return {
+        "event_id": event_id,
         "correlation_id": correlation_id,  # Добавляем в ответ
         "status": "accepted",
-        "message": "Event published to queue"
-    }), 202
+        "message": "Event spooled for delivery" if delivery == DELIVERY_SPOOLED else "Event published to queue"
+    }
+
+
+def _event_headers(event: IncomingEvent, correlation_id: str) -> dict:
+    """Заголовки AMQP-сообщения для события"""
+    return {
+        'event_id': event.event_id,
+        'event_type': event.event_type,
+        'source': event.source,
+        'schema_version': str(event.schema_version),
+        'correlation_id': correlation_id
+    }
+
+
+def _publish_spooled(records: List[SpoolRecord]) -> List[Optional[Exception]]:
+    """
+    Републикация сообщений из спула с тем content_type, с которым они записаны
+    
+    MESSAGE_FORMAT мог смениться между перезапусками, поэтому подряд идущие
+    записи одного формата публикуются одной пачкой, а после первой же
+    неудачной пачки остальные не отправляются (дренаж всё равно
+    остановится на первой ошибке).
+    """
+    errors: List[Optional[Exception]] = []
+    start = 0
+    while start < len(records):
+        content_type = records[start][2]
+        end = start
+        while end < len(records) and records[end][2] == content_type:
+            end += 1
+        
+        group_errors = _publish_to_broker(
+            [(body, headers) for body, headers, _ in records[start:end]],
+            Config.PUBLISH_CONFIRM_TIMEOUT,
+            content_type
+        )
+        errors.extend(group_errors)
+        failed = next((error for error in group_errors if error is not None), None)
+        if failed is not None:
+            errors.extend([failed] * (len(records) - end))
+            break
+        start = end
+    return errors
+
+
+if spool is not None:
+    # Дренаж спула в порядке записи, как только брокер снова принимает сообщения
+    spool_drainer = SpoolDrainer(
+        spool,
+        _publish_spooled,
+        batch_size=Config.SPOOL_DRAIN_BATCH,
+        interval=Config.SPOOL_DRAIN_INTERVAL
+    )
+    spool_drainer.start()
+    atexit.register(spool_drainer.stop)
 
 
 @app.errorhandler(BadRequest)
@@ -135,6 +753,25 @@ def handle_too_large(error):
     }), 413
 
 
+@app.errorhandler(TooManyRequests)
+def handle_too_many_requests(error):
+    response = jsonify({
+        "error": "Too Many Requests",
+        "message": str(error.description)
+    })
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
+@app.errorhandler(UnsupportedMediaType)
+def handle_unsupported_media_type(error):
+    return jsonify({
+        "error": "Unsupported Media Type",
+        "message": str(error.description)
+    }), 415
+
+
 @app.errorhandler(Exception)
 def handle_unexpected_error(error):
     logger.error(f"Unexpected error: {str(error)}", exc_info=True)
@@ -144,11 +781,5 @@ def handle_unexpected_error(error):
     }), 500
 
 
-@app.teardown_appcontext
-def teardown_rabbit(exception=None):
-    """Закрываем соединение с RabbitMQ при завершении приложения"""
-    rabbit_producer.close()
-
-
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=app.config['DEBUG'])
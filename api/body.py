@@ -0,0 +1,216 @@
+import io
+import queue
+import threading
+import zlib
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from flask import Request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+
+# zstd поддерживается, только если установлен zstandard
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_CHUNK_SIZE = 64 * 1024
+
+_DECOMPRESSION_ERRORS = (zlib.error, EOFError) + ((zstandard.ZstdError,) if zstandard else ())
+
+# TimedLineReader.lines(): за отведённое время новой строки не пришло
+NO_LINE = object()
+_END = object()
+
+
+class _ZlibReader(io.RawIOBase):
+    """
+    Потоковая распаковка gzip/deflate
+    
+    Распаковывается не больше, чем запрошено в read(), поэтому размер
+    распакованных данных ограничивается без распаковки всего тела.
+    """
+    
+    def __init__(self, raw: BinaryIO, wbits: int):
+        self._raw = raw
+        self._wbits = wbits
+        self._decompressor = zlib.decompressobj(wbits)
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        size = len(buffer)
+        while True:
+            if self._decompressor.eof:
+                # gzip может состоять из нескольких members подряд
+                data = self._decompressor.unused_data
+                if not data:
+                    data = self._raw.read(_CHUNK_SIZE)
+                    if not data:
+                        return 0
+                self._decompressor = zlib.decompressobj(self._wbits)
+            elif self._decompressor.unconsumed_tail:
+                data = self._decompressor.unconsumed_tail
+            else:
+                data = self._raw.read(_CHUNK_SIZE)
+                if not data:
+                    raise EOFError("Compressed body is truncated")
+            
+            chunk = self._decompressor.decompress(data, size)
+            if chunk:
+                buffer[:len(chunk)] = chunk
+                return len(chunk)
+
+
+def open_body_stream(request: Request) -> BinaryIO:
+    """
+    Поток тела запроса с учётом Content-Encoding
+    
+    Поддерживаются identity, gzip, deflate и zstd (если установлен zstandard).
+    
+    Raises:
+        UnsupportedMediaType: неизвестный Content-Encoding
+    """
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    
+    if encoding in ('', 'identity'):
+        return request.stream
+    if encoding in ('gzip', 'x-gzip'):
+        return io.BufferedReader(_ZlibReader(request.stream, 16 + zlib.MAX_WBITS), _CHUNK_SIZE)
+    if encoding == 'deflate':
+        return io.BufferedReader(_ZlibReader(request.stream, zlib.MAX_WBITS), _CHUNK_SIZE)
+    if encoding == 'zstd' and zstandard is not None:
+        reader = zstandard.ZstdDecompressor().stream_reader(request.stream, read_size=_CHUNK_SIZE)
+        return io.BufferedReader(reader, _CHUNK_SIZE)
+    
+    raise UnsupportedMediaType(f"Unsupported Content-Encoding: {encoding}")
+
+
+def read_body(request: Request, limit: int) -> bytes:
+    """
+    Чтение (и распаковка) тела запроса с ограничением размера
+    
+    Лимит применяется к распакованным данным и проверяется по ходу
+    распаковки — защита от decompression bomb.
+    
+    Args:
+        request: Запрос Flask
+        limit: Максимальный размер тела после распаковки (байты)
+    
+    Raises:
+        RequestEntityTooLarge: тело больше limit
+        BadRequest: повреждённые сжатые данные
+    """
+    if request.content_length is not None and request.content_length > limit:
+        raise RequestEntityTooLarge(f"Request body exceeds {limit} bytes")
+    
+    stream = open_body_stream(request)
+    try:
+        data = stream.read(limit + 1)
+    except _DECOMPRESSION_ERRORS as e:
+        raise BadRequest(f"Invalid compressed body: {e}")
+    
+    if len(data) > limit:
+        raise RequestEntityTooLarge(f"Request body exceeds {limit} bytes after decompression")
+    return data
+
+
+def iter_lines(stream: BinaryIO, max_line_bytes: int) -> Iterator[Optional[bytes]]:
+    """
+    Построчное чтение потока тела (NDJSON) с ограничением длины строки
+    
+    В памяти держится не больше одной строки, поэтому поток может быть
+    сколь угодно длинным. Строка длиннее max_line_bytes дочитывается до
+    конца и отбрасывается — вместо неё возвращается None.
+    
+    Raises:
+        BadRequest: повреждённые сжатые данные
+    """
+    try:
+        while True:
+            line = stream.readline(max_line_bytes + 1)
+            if not line:
+                return
+            
+            if len(line) > max_line_bytes and not line.endswith(b'\n'):
+                while line and not line.endswith(b'\n'):
+                    line = stream.readline(_CHUNK_SIZE)
+                yield None
+                continue
+            
+            yield line
+    except _DECOMPRESSION_ERRORS as e:
+        raise BadRequest(f"Invalid compressed body: {e}")
+
+
+class TimedLineReader:
+    """
+    Строки потока тела с ожиданием не дольше заданного срока
+    
+    readline() блокируется, пока клиент не пришлёт данные, и неполную
+    пачку нельзя отправить по таймеру. Поэтому строки читает фоновый
+    поток, а потребитель ждёт следующую строку с таймаутом. Очередь
+    между ними ограничена max_buffered строками: пока потребитель
+    публикует пачку, чтение тела (и клиент) ждёт.
+    """
+    
+    def __init__(self, lines: Iterator[Optional[bytes]], max_buffered: int = 1000):
+        """
+        Args:
+            lines: Строки потока (iter_lines)
+            max_buffered: Максимум прочитанных, но не разобранных строк
+        """
+        self._queue: queue.Queue = queue.Queue(max(1, max_buffered))
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(lines,), name='stream-reader', daemon=True)
+        self._thread.start()
+    
+    def _run(self, lines: Iterator[Optional[bytes]]) -> None:
+        try:
+            for line in lines:
+                if not self._put((line, None)):
+                    return
+        except Exception as e:
+            self._put((_END, e))
+            return
+        self._put((_END, None))
+    
+    def _put(self, item) -> bool:
+        """Ожидание места в очереди; False — потребитель закрыл читатель"""
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def lines(self, timeout: Callable[[], Optional[float]]) -> Iterator:
+        """
+        Строки по порядку (None — слишком длинная строка, как в iter_lines)
+        
+        Args:
+            timeout: Сколько ждать следующую строку (None — без ограничения);
+                вызывается перед каждым ожиданием
+        
+        Returns:
+            Итератор строк; NO_LINE — за timeout() секунд строки не было
+        
+        Raises:
+            BadRequest: повреждённые сжатые данные
+        """
+        while True:
+            try:
+                line, error = self._queue.get(timeout=timeout())
+            except queue.Empty:
+                yield NO_LINE
+                continue
+            if error is not None:
+                raise error
+            if line is _END:
+                return
+            yield line
+    
+    def close(self) -> None:
+        """Остановка чтения (поток завершится после текущего readline)"""
+        self._closed.set()
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class RecentEventCache:
+    """
+    Ограниченный кэш недавно принятых event_id (LRU + TTL)
+    
+    Хранит ответ, который клиент получил при первой успешной публикации,
+    чтобы повторы с тем же event_id получали тот же 202 без похода в
+    RabbitMQ и PostgreSQL. Кэш живёт в памяти процесса, поэтому повтор,
+    попавший в другой процесс gunicorn, по-прежнему дойдёт до
+    идемпотентной вставки в PostgreSQL.
+    """
+    
+    def __init__(self, max_size: int = 100000, ttl: float = 600.0):
+        """
+        Инициализация кэша
+        
+        Args:
+            max_size: Максимум хранимых event_id
+            ttl: Сколько помнить event_id (секунды)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        
+        self._lock = threading.Lock()
+        # event_id -> (истекает в, ответ клиенту); порядок — от старых к новым
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Ответ, отданный при первой публикации события
+        
+        Returns:
+            Тело исходного ответа или None, если event_id не встречался
+            (или запись устарела)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(event_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[event_id]
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(event_id)
+            self.hits += 1
+            return entry[1]
+    
+    def remember(self, event_id: str, response: Dict[str, Any]) -> None:
+        """Запомнить ответ на успешно опубликованное событие"""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[event_id] = (expires_at, response)
+            self._entries.move_to_end(event_id)
+            
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кэша для мониторинга"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
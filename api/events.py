@@ -0,0 +1,78 @@
+import time
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from api import metrics
+from shared.codec import CONTENT_TYPE_JSON, encode_message
+from shared.jsonutil import PAYLOAD_FIELD
+from shared.models import IncomingEvent
+from shared.schemas import SchemaRegistry
+from shared.validation import validate_event
+
+
+class PreparedEvent(NamedTuple):
+    """Провалидированное событие и готовое тело сообщения для RabbitMQ"""
+    event: IncomingEvent
+    message_body: bytes
+
+
+def prepare_event(raw_data: Any,
+                  payload_json: Optional[str] = None,
+                  content_type: str = CONTENT_TYPE_JSON,
+                  now: Optional[datetime] = None,
+                  schemas: Optional[SchemaRegistry] = None) -> PreparedEvent:
+    """
+    Валидация события и сериализация для RabbitMQ
+    
+    Если известен исходный JSON-текст payload (см. shared.jsonutil.split_event),
+    модель строится только из полей конверта, а payload попадает в сообщение
+    без валидации pydantic и повторного кодирования. В этом случае
+    event.payload пустой — используйте message_body.
+    
+    Args:
+        raw_data: Разобранное тело события
+        payload_json: Исходный JSON-текст поля payload
+        content_type: Формат тела сообщения (см. shared.codec)
+        now: Текущее время (UTC) для проверки occurred_at — общее на пачку
+        schemas: Реестр схем payload (None — payload не проверяется)
+    
+    Returns:
+        PreparedEvent
+    
+    Raises:
+        ValueError: событие не прошло валидацию
+        PayloadSchemaError: payload не соответствует схеме типа события
+    """
+    if not isinstance(raw_data, dict):
+        raise ValueError("event must be a JSON object")
+    
+    has_payload = PAYLOAD_FIELD in raw_data
+    fast_path = not has_payload or (payload_json is not None and isinstance(raw_data[PAYLOAD_FIELD], dict))
+    
+    started = time.perf_counter()
+    if fast_path:
+        envelope = {key: value for key, value in raw_data.items() if key != PAYLOAD_FIELD}
+        event = validate_event(envelope, now)
+    else:
+        # Полный путь: payload не объект или исходный текст неизвестен
+        event = validate_event(raw_data, now)
+    
+    if schemas is not None:
+        payload = raw_data.get(PAYLOAD_FIELD, {}) if fast_path else event.payload
+        schemas.validate(event.event_type, event.schema_version, payload)
+    validated = time.perf_counter()
+    
+    if content_type == CONTENT_TYPE_JSON:
+        if fast_path:
+            message_body = event.serialize_with_payload_json(payload_json or '{}')
+        else:
+            message_body = event.serialize_to_json()
+    else:
+        data = event.dict_for_rabbitmq()
+        if fast_path:
+            data[PAYLOAD_FIELD] = raw_data.get(PAYLOAD_FIELD, {})
+        message_body = encode_message(data, content_type)
+    
+    metrics.STAGE_VALIDATE.observe(validated - started)
+    metrics.STAGE_SERIALIZE.observe(time.perf_counter() - validated)
+    return PreparedEvent(event, message_body)
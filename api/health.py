@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import pika
+
+from shared.rabbit import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProber:
+    """
+    Фоновая проверка RabbitMQ с кэшированием результата
+    
+    Поток раз в interval секунд делает пассивный queue_declare на своём
+    соединении и сохраняет снимок состояния. /health и /ready только читают
+    готовый снимок и не ходят в брокер.
+    """
+    
+    def __init__(self, rabbit_url: str, queue_name: str,
+                 interval: float = 5.0, stale_after: float = 15.0):
+        """
+        Инициализация проверки
+        
+        Args:
+            rabbit_url: URL подключения к RabbitMQ
+            queue_name: Очередь, глубину которой отслеживаем
+            interval: Период проверки (секунды)
+            stale_after: Через сколько секунд без успешной проверки сервис не готов
+        """
+        self.rabbit_url = rabbit_url
+        self.queue_name = queue_name
+        self.interval = interval
+        self.stale_after = stale_after
+        
+        self._connection: Optional[pika.BlockingConnection] = None
+        self._channel = None
+        self._last_success: Optional[float] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        
+        # Снимок заменяется целиком, поэтому читается без блокировок
+        self._snapshot: Dict[str, Any] = {
+            "rabbitmq": "unknown",
+            "checked_at": None,
+            "last_success_at": None,
+            "latency_ms": None,
+            "queue_depth": None,
+            "consumers": None,
+            "error": None
+        }
+    
+    def start(self) -> None:
+        """Запуск фонового потока проверки"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Остановка проверки и закрытие соединения"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.interval)
+            self._thread = None
+        self._close()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Последний результат проверки"""
+        return self._snapshot
+    
+    def is_ready(self) -> bool:
+        """Брокер успешно отвечал не позже stale_after секунд назад"""
+        last_success = self._last_success
+        return last_success is not None and time.monotonic() - last_success <= self.stale_after
+    
+    def probe(self) -> None:
+        """Одна проверка брокера: соединение + пассивный queue_declare"""
+        started = time.monotonic()
+        checked_at = datetime.now(timezone.utc).isoformat()
+        
+        try:
+            if self._connection is None or self._connection.is_closed:
+                self._connection = get_connection(self.rabbit_url)
+                self._channel = self._connection.channel()
+            
+            result = self._channel.queue_declare(queue=self.queue_name, passive=True)
+            latency_ms = (time.monotonic() - started) * 1000
+            
+            self._last_success = time.monotonic()
+            self._snapshot = {
+                "rabbitmq": "connected",
+                "checked_at": checked_at,
+                "last_success_at": checked_at,
+                "latency_ms": round(latency_ms, 3),
+                "queue_depth": result.method.message_count,
+                "consumers": result.method.consumer_count,
+                "error": None
+            }
+        except Exception as e:
+            logger.warning(f"RabbitMQ health check failed: {e}")
+            self._close()
+            self._snapshot = {
+                "rabbitmq": "disconnected",
+                "checked_at": checked_at,
+                "last_success_at": self._snapshot.get("last_success_at"),
+                "latency_ms": None,
+                "queue_depth": None,
+                "consumers": None,
+                "error": f"{type(e).__name__}: {e}"
+            }
+    
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self.probe()
+            self._stop_event.wait(self.interval)
+    
+    def _close(self) -> None:
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception as e:
+            logger.debug(f"Error closing health check connection: {e}")
+        self._connection = None
+        self._channel = None
@@ -0,0 +1,120 @@
+import os
+from typing import Dict, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+# Метрики пишутся в mmap-файлы этого каталога, если API запущен в нескольких
+# процессах (gunicorn); /metrics тогда агрегирует файлы всех процессов
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# Границы бакетов фиксированы: запись — поиск бакета и инкремент, без аллокаций
+_LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+_SIZE_BUCKETS = (
+    128, 512, 1024, 4096, 16384, 65536, 262144,
+    1048576, 4194304, 16777216
+)
+
+REQUESTS = Counter(
+    'ingestion_api_requests_total',
+    'HTTP requests by endpoint and status code',
+    ['endpoint', 'status']
+)
+REQUEST_SECONDS = Histogram(
+    'ingestion_api_request_seconds',
+    'HTTP request latency by endpoint',
+    ['endpoint'],
+    buckets=_LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    'ingestion_api_stage_seconds',
+    'Latency of event processing stages',
+    ['stage'],
+    buckets=_LATENCY_BUCKETS
+)
+PAYLOAD_BYTES = Histogram(
+    'ingestion_api_body_bytes',
+    'Decompressed request body size by endpoint',
+    ['endpoint'],
+    buckets=_SIZE_BUCKETS
+)
+DELIVERIES = Counter(
+    'ingestion_api_deliveries_total',
+    'Events handed to the broker or the spool, by outcome',
+    ['outcome']
+)
+PUBLISH_ERRORS = Counter(
+    'ingestion_api_publish_errors_total',
+    'Failed event publishes by error type',
+    ['error']
+)
+DEDUPE_LOOKUPS = Counter(
+    'ingestion_api_dedupe_lookups_total',
+    'Recent event_id cache lookups by result',
+    ['result']
+)
+THROTTLED = Counter(
+    'ingestion_api_throttled_total',
+    'Events rejected by rate limits'
+)
+
+# Дочерние метрики с метками создаются заранее, на горячем пути — только observe/inc
+STAGE_READ_BODY = STAGE_SECONDS.labels('read_body')
+STAGE_PARSE = STAGE_SECONDS.labels('parse')
+STAGE_VALIDATE = STAGE_SECONDS.labels('validate')
+STAGE_SERIALIZE = STAGE_SECONDS.labels('serialize')
+STAGE_PUBLISH = STAGE_SECONDS.labels('publish')
+
+EVENTS_PUBLISHED = DELIVERIES.labels('published')
+EVENTS_SPOOLED = DELIVERIES.labels('spooled')
+EVENTS_FAILED = DELIVERIES.labels('failed')
+
+BODY_EVENT = PAYLOAD_BYTES.labels('events')
+BODY_BATCH = PAYLOAD_BYTES.labels('events_batch')
+BODY_STREAM_LINE = PAYLOAD_BYTES.labels('events_stream_line')
+
+DEDUPE_HIT = DEDUPE_LOOKUPS.labels('hit')
+DEDUPE_MISS = DEDUPE_LOOKUPS.labels('miss')
+
+# (endpoint, status) -> Counter; заполняется при первом запросе с такой парой
+_request_counters: Dict[Tuple[str, int], Counter] = {}
+_request_timers: Dict[str, Histogram] = {}
+
+
+def observe_request(endpoint: str, status: int, seconds: float) -> None:
+    """Учёт завершённого HTTP-запроса"""
+    counter = _request_counters.get((endpoint, status))
+    if counter is None:
+        counter = _request_counters.setdefault((endpoint, status), REQUESTS.labels(endpoint, str(status)))
+    counter.inc()
+    
+    timer = _request_timers.get(endpoint)
+    if timer is None:
+        timer = _request_timers.setdefault(endpoint, REQUEST_SECONDS.labels(endpoint))
+    timer.observe(seconds)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """
+    Текущие значения метрик в текстовом формате Prometheus
+    
+    Returns:
+        (тело ответа, Content-Type)
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
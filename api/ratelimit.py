@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# (скорость в событиях/с, ёмкость корзины)
+Limit = Tuple[float, float]
+
+
+def parse_limits(spec: str) -> Dict[str, Limit]:
+    """
+    Разбор переопределений лимитов вида "mobile_app=100:200,web_backend=50"
+    
+    Ёмкость корзины (после двоеточия) необязательна и по умолчанию равна
+    скорости, но не меньше одного токена: иначе при дробной скорости
+    ("slow=0.5") корзина никогда не накопит токен на событие. Скорость 0
+    закрывает ключ полностью.
+    
+    Raises:
+        ValueError: неверный формат
+    """
+    limits = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        key, _, value = item.rpartition('=')
+        if not key:
+            raise ValueError(f"Invalid rate limit '{item}', expected name=rate[:burst]")
+        rate, _, burst = value.partition(':')
+        rate, capacity = float(rate), float(burst or rate)
+        limits[key.strip()] = (rate, max(1.0, capacity) if rate > 0 else capacity)
+    return limits
+
+
+# Сколько ключей с наибольшим числом отказов показывает stats()
+_TOP_THROTTLED = 10
+
+
+class TokenBucket:
+    """Корзина токенов с ленивым пополнением: O(1) на проверку"""
+    
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+    
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+    
+    def wait_time(self, now: float) -> float:
+        """
+        Пополнение корзины и проверка токена (без списания)
+        
+        Returns:
+            0, если токен есть, иначе сколько секунд ждать следующего
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        
+        if self.tokens >= 1:
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Ограничение приёма событий по source и event_type
+    
+    Для каждого source заводится своя корзина (лимит по умолчанию или
+    переопределение), для перечисленных event_type — общая корзина на тип.
+    Событие принимается, только если токен есть в обеих корзинах, и
+    только тогда токены списываются. Корзины хранятся в LRU не больше
+    max_keys штук, чтобы поток событий с уникальными source не раздувал
+    память.
+    """
+    
+    def __init__(self,
+                 source_limit: Optional[Limit],
+                 source_overrides: Optional[Dict[str, Limit]] = None,
+                 event_type_limits: Optional[Dict[str, Limit]] = None,
+                 max_keys: int = 10000):
+        """
+        Инициализация ограничителя
+        
+        Args:
+            source_limit: Лимит для любого source (None — без лимита)
+            source_overrides: Лимиты для отдельных source
+            event_type_limits: Лимиты для отдельных event_type
+            max_keys: Максимум хранимых корзин
+        """
+        self.source_limit = source_limit
+        self.source_overrides = source_overrides or {}
+        self.event_type_limits = event_type_limits or {}
+        self.max_keys = max_keys
+        
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        # Приближённый топ ключей по отказам (Space-Saving): не больше _TOP_THROTTLED записей
+        self._top_throttled: Dict[str, int] = {}
+        
+        self.allowed = 0
+        self.throttled = 0
+    
+    def check(self, source: Any, event_type: Any) -> float:
+        """
+        Проверка лимитов для одного события
+        
+        Значения, не являющиеся строками, пропускаются: такое событие всё
+        равно не пройдёт валидацию.
+        
+        Returns:
+            0, если событие можно принять, иначе Retry-After в секундах
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            if isinstance(source, str):
+                limit = self.source_overrides.get(source, self.source_limit)
+                if limit is not None:
+                    buckets.append((f"source:{source}", self._bucket(('source', source), limit, now)))
+            if isinstance(event_type, str):
+                limit = self.event_type_limits.get(event_type)
+                if limit is not None:
+                    buckets.append((f"event_type:{event_type}", self._bucket(('event_type', event_type), limit, now)))
+            
+            # Сначала проверяем все корзины: отклонённое событие не тратит токены
+            retry_after = 0.0
+            for name, bucket in buckets:
+                wait = bucket.wait_time(now)
+                if wait:
+                    retry_after = max(retry_after, wait)
+                    self._count_throttled(name)
+            
+            if retry_after:
+                self.throttled += 1
+                return retry_after
+            
+            for _, bucket in buckets:
+                bucket.tokens -= 1
+            self.allowed += 1
+            return 0.0
+    
+    def _bucket(self, key: Tuple[str, str], limit: Limit, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(limit[0], limit[1], now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+    
+    def _count_throttled(self, name: str) -> None:
+        """Учёт отказа по ключу (под self._lock)"""
+        top = self._top_throttled
+        if name in top:
+            top[name] += 1
+        elif len(top) < _TOP_THROTTLED:
+            top[name] = 1
+        else:
+            # Новый ключ вытесняет самый редкий и наследует его счётчик (оценка сверху)
+            rarest = min(top, key=top.get)
+            top[name] = top.pop(rarest) + 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики для мониторинга; под блокировкой — только копия топа"""
+        with self._lock:
+            allowed, throttled, buckets = self.allowed, self.throttled, len(self._buckets)
+            top = list(self._top_throttled.items())
+        top.sort(key=lambda item: item[1], reverse=True)
+        return {
+            "allowed": allowed,
+            "throttled": throttled,
+            "buckets": buckets,
+            "throttled_by_key": dict(top)
+        }
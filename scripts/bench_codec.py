@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Сравнение форматов сообщений API -> воркер: JSON и MessagePack
+
+Для событий разного размера печатает размер тела сообщения и время
+кодирования (как в API) и декодирования (как в воркере) на одно событие.
+
+Запуск: python scripts/bench_codec.py [--iterations N]
+"""
+
+import sys
+import os
+import argparse
+import timeit
+import uuid
+from datetime import datetime, timezone
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.codec import CONTENT_TYPE_JSON, CONTENT_TYPE_MSGPACK, decode_message, encode_message, msgpack
+from shared.jsonutil import orjson
+
+
+def make_event(payload: dict) -> dict:
+    """Событие в том виде, в каком его отдаёт IncomingEvent.dict_for_rabbitmq"""
+    return {
+        "event_id": str(uuid.uuid4()),
+        "schema_version": 1,
+        "event_type": "order_created",
+        "source": "web_backend",
+        "occurred_at": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+        "payload": payload
+    }
+
+
+SAMPLES = {
+    "small": make_event({"user_id": 42, "plan": "pro"}),
+    "medium": make_event({
+        "order_id": "A-100500",
+        "customer": {"id": 7, "email": "user@example.com", "tags": ["vip", "b2b"]},
+        "items": [
+            {"sku": f"SKU-{i}", "qty": i % 3 + 1, "price": 9.99 * i, "gift": i % 2 == 0}
+            for i in range(10)
+        ]
+    }),
+    "large": make_event({
+        "series": [{"ts": 1700000000 + i, "value": i * 0.5, "ok": True} for i in range(300)]
+    })
+}
+
+
+def bench(iterations: int) -> None:
+    content_types = [CONTENT_TYPE_JSON]
+    if msgpack is not None:
+        content_types.append(CONTENT_TYPE_MSGPACK)
+    else:
+        print("⚠️  msgpack не установлен, сравнивается только JSON")
+    
+    print(f"JSON backend: {'orjson' if orjson is not None else 'json'}, iterations: {iterations}")
+    print()
+    print(f"{'event':<8} {'format':<22} {'bytes':>8} {'encode µs':>10} {'decode µs':>10}")
+    
+    for name, event in SAMPLES.items():
+        baseline = None
+        for content_type in content_types:
+            body = encode_message(event, content_type)
+            assert decode_message(body, content_type) == event
+            
+            encode_us = timeit.timeit(lambda: encode_message(event, content_type), number=iterations) / iterations * 1e6
+            decode_us = timeit.timeit(lambda: decode_message(body, content_type), number=iterations) / iterations * 1e6
+            
+            line = f"{name:<8} {content_type:<22} {len(body):>8} {encode_us:>10.2f} {decode_us:>10.2f}"
+            if baseline is None:
+                baseline = (len(body), encode_us + decode_us)
+            else:
+                size_saved = 100 * (1 - len(body) / baseline[0])
+                cpu_saved = 100 * (1 - (encode_us + decode_us) / baseline[1])
+                line += f"   ({size_saved:.0f}% fewer bytes, {cpu_saved:.0f}% less CPU)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON vs MessagePack message bodies")
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+    bench(args.iterations)
+
+
+if __name__ == '__main__':
+    main()
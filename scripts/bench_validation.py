@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Сравнение быстрой валидации (shared.validation) с IncomingEvent(**data)
+
+Печатает время валидации одного события для pydantic и validate_event
+(в том числе с общим на пачку "сейчас", как в /events/batch), а также
+проверяет, что на наборе некорректных событий ошибки совпадают.
+
+Запуск: python scripts/bench_validation.py [--events N] [--rounds R]
+"""
+
+import sys
+import os
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import ValidationError
+
+from shared.models import IncomingEvent
+from shared.validation import validate_event
+
+
+def validate_batch(items: list) -> list:
+    """Валидация пачки с одним "сейчас", как в /events/batch"""
+    now = datetime.now(timezone.utc)
+    return [validate_event(raw_data, now) for raw_data in items]
+
+
+def make_events(count: int) -> list:
+    """События в том виде, в каком они приходят в API"""
+    started = datetime.now(timezone.utc) - timedelta(hours=1)
+    return [
+        {
+            "event_id": str(uuid.uuid4()),
+            "schema_version": 1,
+            "event_type": "page_view",
+            "source": "web_frontend",
+            "occurred_at": (started + timedelta(milliseconds=i)).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            "payload": {"url": f"/products/{i}", "referrer": None, "duration_ms": i % 5000}
+        }
+        for i in range(count)
+    ]
+
+
+INVALID_EVENTS = [
+    {},
+    {"schema_version": 0, "event_type": "", "source": "x" * 101, "occurred_at": "yesterday"},
+    {"schema_version": "2", "event_type": "t", "source": "s", "occurred_at": "2024-01-01T00:00:00Z"},
+    {"schema_version": 1, "event_type": 5, "source": "s", "occurred_at": 1700000000, "payload": []},
+    {"schema_version": 1, "event_type": "t", "source": "s", "occurred_at": "2999-01-01T00:00:00Z"},
+    {"schema_version": None, "event_type": "t", "source": None, "occurred_at": None},
+]
+
+
+def check_parity() -> None:
+    """Ошибки и результаты совпадают с pydantic"""
+    for raw_data in INVALID_EVENTS:
+        try:
+            expected = IncomingEvent(**raw_data).dict(exclude={'event_id'})
+        except ValidationError as e:
+            expected = (e.errors(), str(e))
+        try:
+            actual = validate_event(raw_data).dict(exclude={'event_id'})
+        except ValidationError as e:
+            actual = (e.errors(), str(e))
+        assert actual == expected, f"mismatch for {raw_data}:\n{expected}\n{actual}"
+    print(f"✅ {len(INVALID_EVENTS)} edge cases: results and errors match pydantic")
+
+
+def timed(label: str, func, events: list, rounds: int, baseline: float = None) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func(events)
+        best = min(best, time.perf_counter() - started)
+    
+    per_event_us = best / len(events) * 1e6
+    line = f"{label:<28} {per_event_us:>8.2f} µs/event"
+    if baseline:
+        line += f"   x{baseline / per_event_us:.1f}"
+    print(line)
+    return per_event_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fast event validation against pydantic")
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+    
+    check_parity()
+    events = make_events(args.events)
+    print()
+    
+    baseline = timed("pydantic IncomingEvent(**d)", lambda items: [IncomingEvent(**d) for d in items], events, args.rounds)
+    timed("validate_event", lambda items: [validate_event(d) for d in items], events, args.rounds, baseline)
+    timed("validate_event (shared now)", validate_batch, events, args.rounds, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Сравнение движков воркера: sync (pika + psycopg2) и asyncio (aio-pika + asyncpg)
+
+Для каждого движка публикует N синтетических событий в очередь events,
+запускает python -m worker.worker с WORKER_ENGINE=<движок> и ждёт, пока
+все события появятся в PostgreSQL. Пропускная способность считается от
+первой до последней записанной строки, без времени запуска процесса.
+Нужны запущенные RabbitMQ, PostgreSQL (и MySQL, если задан MYSQL_URL);
+в очереди events не должно быть чужих сообщений.
+
+Запуск: python scripts/bench_worker.py [--events N] [--engines sync,asyncio] [--concurrency K]
+"""
+
+import sys
+import os
+import argparse
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone
+
+import psycopg2
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.config import Config
+from shared.codec import encode_message
+from shared.rabbit import RabbitMQProducer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def publish_events(count: int, source: str) -> None:
+    """Публикация count событий с общим source, по которому их потом считаем"""
+    producer = RabbitMQProducer(Config.RABBIT_URL)
+    try:
+        batch = []
+        for i in range(count):
+            event = {
+                "event_id": str(uuid.uuid4()),
+                "schema_version": 1,
+                "event_type": "bench_event",
+                "source": source,
+                "occurred_at": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+                "payload": {"n": i, "items": [{"sku": f"SKU-{j}", "qty": j} for j in range(5)]}
+            }
+            batch.append((encode_message(event), {"correlation_id": f"{source}-{i}"}))
+            if len(batch) == 1000:
+                producer.publish_batch(Config.RABBIT_QUEUE_EVENTS, batch)
+                batch = []
+        producer.publish_batch(Config.RABBIT_QUEUE_EVENTS, batch)
+    finally:
+        producer.close()
+
+
+def count_stored(cursor, source: str) -> int:
+    cursor.execute("SELECT count(*) FROM events WHERE source = %s", (source,))
+    return cursor.fetchone()[0]
+
+
+def bench_engine(engine: str, count: int, concurrency: int, timeout: float) -> None:
+    source = f"bench-{engine}-{uuid.uuid4().hex[:8]}"
+    publish_events(count, source)
+    
+    env = dict(os.environ, WORKER_ENGINE=engine, WORKER_ASYNC_CONCURRENCY=str(concurrency), LOG_LEVEL="WARNING")
+    worker = subprocess.Popen(
+        [sys.executable, '-m', 'worker.worker'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL
+    )
+    
+    conn = psycopg2.connect(Config.POSTGRES_URL)
+    conn.autocommit = True
+    first_at = None
+    stored = 0
+    try:
+        with conn.cursor() as cursor:
+            deadline = time.monotonic() + timeout
+            while stored < count and time.monotonic() < deadline:
+                if worker.poll() is not None:
+                    print(f"{engine:<8} worker exited with code {worker.returncode}")
+                    return
+                stored = count_stored(cursor, source)
+                if stored and first_at is None:
+                    first_at = time.monotonic()
+                time.sleep(0.05)
+            finished_at = time.monotonic()
+    finally:
+        conn.close()
+        worker.terminate()
+        worker.wait()
+    
+    if stored < count:
+        print(f"{engine:<8} timed out: {stored}/{count} events stored")
+        return
+    
+    elapsed = max(finished_at - first_at, 1e-6)
+    print(f"{engine:<8} {count:>8} {elapsed:>10.2f} {(count - 1) / elapsed:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs asyncio worker engines")
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--engines', default='sync,asyncio')
+    parser.add_argument('--concurrency', type=int, default=Config.WORKER_ASYNC_CONCURRENCY,
+                        help="WORKER_ASYNC_CONCURRENCY for the asyncio engine")
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+    
+    print(f"{'engine':<8} {'events':>8} {'seconds':>10} {'events/s':>12}")
+    for engine in args.engines.split(','):
+        bench_engine(engine.strip(), args.events, args.concurrency, args.timeout)
+
+
+if __name__ == '__main__':
+    main()
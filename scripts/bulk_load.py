@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Массовая загрузка событий из NDJSON-файлов в PostgreSQL через COPY
+
+Одна строка файла — одно событие в том же виде, что принимает API.
+Файлы *.gz читаются как gzip. Строки читаются порциями (--chunk-lines),
+порции валидируются в параллельных процессах (validate_event) и
+превращаются в текст формата COPY. Главный процесс загружает каждую
+порцию через COPY во временную таблицу и переносит её в events одним
+INSERT ... SELECT ... ON CONFLICT (event_id) DO NOTHING: уже
+существующие события пропускаются, внутри порции побеждает первое
+вхождение event_id.
+
+После каждой порции смещение (в несжатом потоке) записывается в файл
+контрольной точки <файл>.checkpoint, и повторный запуск продолжает с
+него. Порция и её перенос в events выполняются в одной транзакции,
+поэтому после сбоя порция просто загружается заново.
+
+Невалидные строки не останавливают загрузку; они пишутся в --rejects
+(NDJSON со смещением, ошибкой и исходной строкой). Проекция в MySQL
+не обновляется.
+
+Запуск: python scripts/bulk_load.py events-2023.ndjson.gz [...] [--workers N] [--chunk-lines N]
+                                    [--rejects rejects.ndjson] [--restart] [--dry-run]
+"""
+
+import sys
+import os
+import argparse
+import gzip
+import io
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.config import Config
+from shared.jsonutil import dumps, loads
+from shared.validation import validate_event
+
+# Ограничения колонок events, которых нет в IncomingEvent
+_MAX_EVENT_ID_LENGTH = 255
+
+# Временная таблица живёт до конца сессии, строки — до конца транзакции
+_STAGING_SQL = """
+CREATE TEMP TABLE events_staging (
+    seq BIGSERIAL,
+    event_id VARCHAR(255),
+    schema_version INTEGER,
+    event_type VARCHAR(100),
+    source VARCHAR(100),
+    occurred_at TIMESTAMPTZ,
+    payload JSONB
+) ON COMMIT DELETE ROWS;
+"""
+
+_COPY_SQL = """
+COPY events_staging (event_id, schema_version, event_type, source, occurred_at, payload)
+FROM STDIN
+"""
+
+# DISTINCT ON по (event_id, seq) оставляет первое вхождение event_id в порции
+_MERGE_SQL = """
+INSERT INTO events (event_id, schema_version, event_type, source, occurred_at, payload)
+SELECT DISTINCT ON (event_id) event_id, schema_version, event_type, source, occurred_at, payload
+FROM events_staging
+ORDER BY event_id, seq
+ON CONFLICT (event_id) DO NOTHING;
+"""
+
+# Экранирование для текстового формата COPY
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+class Chunk:
+    """Порция строк файла: [start, end) в несжатом потоке"""
+    
+    __slots__ = ('start', 'end', 'lines')
+    
+    def __init__(self, start: int, end: int, lines: List[bytes]):
+        self.start = start
+        self.end = end
+        self.lines = lines
+
+
+def _copy_text(value: str) -> str:
+    if '\x00' in value:
+        raise ValueError("NUL character is not allowed")
+    return value.translate(_COPY_ESCAPES)
+
+
+def _copy_row(raw_data: Any, now: datetime) -> str:
+    """
+    Строка COPY для одного события
+    
+    Raises:
+        ValidationError / TypeError / ValueError: событие не прошло валидацию
+    """
+    event = validate_event(raw_data, now)
+    
+    if event.event_id is None:
+        raise ValueError("event_id must not be null")
+    if len(event.event_id) > _MAX_EVENT_ID_LENGTH:
+        raise ValueError(f"event_id is longer than {_MAX_EVENT_ID_LENGTH} characters")
+    
+    payload = dumps(event.payload).decode('utf-8')
+    # JSONB не хранит \u0000
+    if '\\u0000' in payload:
+        raise ValueError("payload contains \\u0000")
+    
+    occurred_at = event.occurred_at
+    if occurred_at.tzinfo is None:
+        occurred_at = occurred_at.replace(tzinfo=timezone.utc)
+    
+    return '\t'.join((
+        _copy_text(event.event_id),
+        str(event.schema_version),
+        _copy_text(event.event_type),
+        _copy_text(event.source),
+        occurred_at.isoformat(),
+        _copy_text(payload)
+    )) + '\n'
+
+
+def prepare_chunk(chunk: Chunk) -> Tuple[int, bytes, int, List[Dict[str, Any]]]:
+    """
+    Валидация порции в процессе пула
+    
+    Returns:
+        (конец порции, данные для COPY, число строк COPY, отклонённые строки)
+    """
+    now = datetime.now(timezone.utc)
+    rows = []
+    rejects = []
+    offset = chunk.start
+    
+    for line in chunk.lines:
+        line_offset = offset
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            raw_data = loads(line)
+        except ValueError as e:
+            rejects.append({'offset': line_offset, 'reason': 'invalid_json', 'error': str(e), 'line': line})
+            continue
+        try:
+            rows.append(_copy_row(raw_data, now))
+        except (ValueError, TypeError) as e:
+            # ValidationError — подкласс ValueError
+            rejects.append({'offset': line_offset, 'reason': 'validation_error', 'error': str(e), 'line': line})
+    
+    return chunk.end, ''.join(rows).encode('utf-8'), len(rows), rejects
+
+
+def open_input(path: str):
+    """Бинарный поток файла; *.gz распаковывается на лету"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb', buffering=1024 * 1024)
+
+
+def read_chunks(stream, start: int, chunk_lines: int) -> Iterator[Chunk]:
+    """Порции по chunk_lines строк, начиная со смещения start"""
+    # У gzip seek вперёд — это распаковка до нужного места
+    stream.seek(start)
+    offset = start
+    lines: List[bytes] = []
+    chunk_start = offset
+    for line in stream:
+        lines.append(line)
+        offset += len(line)
+        if len(lines) >= chunk_lines:
+            yield Chunk(chunk_start, offset, lines)
+            lines = []
+            chunk_start = offset
+    if lines:
+        yield Chunk(chunk_start, offset, lines)
+
+
+def load_checkpoint(path: str, input_path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {'input': input_path, 'offset': 0, 'inserted': 0, 'copied': 0, 'rejected': 0}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('input') != input_path:
+        raise SystemExit(f"❌ Checkpoint {path} belongs to {checkpoint.get('input')}, not {input_path}")
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    """Атомарная запись контрольной точки"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def iter_prepared(chunks: Iterator[Chunk], workers: int) -> Iterator[Tuple[int, bytes, int, List[Dict[str, Any]]]]:
+    """
+    Подготовленные порции в порядке файла
+    
+    В работе не больше 2 × workers порций, поэтому файл не читается в
+    память целиком, а пул не простаивает, пока идёт COPY.
+    """
+    if workers <= 0:
+        for chunk in chunks:
+            yield prepare_chunk(chunk)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(prepare_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def copy_chunk(conn, data: bytes) -> int:
+    """
+    COPY порции во временную таблицу и перенос в events одной транзакцией
+    
+    Returns:
+        int: число новых событий
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(_COPY_SQL, io.BytesIO(data))
+            cur.execute(_MERGE_SQL)
+            inserted = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return inserted
+
+
+def load_file(input_path: str, conn, args, rejects_file) -> Dict[str, Any]:
+    checkpoint_path = f"{input_path}.checkpoint"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = load_checkpoint(checkpoint_path, input_path)
+    
+    if checkpoint['offset']:
+        print(f"↪️  {input_path}: resuming from byte {checkpoint['offset']}")
+    
+    started = time.monotonic()
+    last_report = started
+    start_offset = checkpoint['offset']
+    copied_now = 0
+    
+    with open_input(input_path) as stream:
+        chunks = read_chunks(stream, start_offset, args.chunk_lines)
+        for end, data, row_count, rejects in iter_prepared(chunks, args.workers):
+            inserted = 0
+            if row_count and conn is not None:
+                try:
+                    inserted = copy_chunk(conn, data)
+                except psycopg2.Error as e:
+                    raise SystemExit(
+                        f"❌ {input_path}: COPY failed after byte {checkpoint['offset']}: {e}\n"
+                        f"   Fix the data or the database and rerun to resume."
+                    )
+            
+            for reject in rejects:
+                reject['file'] = input_path
+                reject['line'] = reject['line'].decode('utf-8', errors='replace').rstrip('\n')
+                rejects_file.write(json.dumps(reject, ensure_ascii=False) + '\n')
+            rejects_file.flush()
+            
+            checkpoint['offset'] = end
+            checkpoint['copied'] += row_count
+            checkpoint['inserted'] += inserted
+            checkpoint['rejected'] += len(rejects)
+            if conn is not None:
+                save_checkpoint(checkpoint_path, checkpoint)
+            copied_now += row_count
+            
+            now = time.monotonic()
+            if now - last_report >= args.report_interval:
+                last_report = now
+                elapsed = now - started
+                print(
+                    f"   {input_path}: {checkpoint['copied']} rows, {checkpoint['inserted']} new, "
+                    f"{checkpoint['rejected']} rejected, {copied_now / elapsed:.0f} rows/s, "
+                    f"{(end - start_offset) / elapsed / 1e6:.1f} MB/s"
+                )
+    
+    elapsed = max(time.monotonic() - started, 1e-6)
+    if conn is None:
+        print(f"✅ {input_path}: {copied_now} valid rows, {checkpoint['rejected']} rejected, {copied_now / elapsed:.0f} rows/s")
+        return {'rows': copied_now, 'seconds': elapsed}
+    print(
+        f"✅ {input_path}: {checkpoint['copied']} rows ({checkpoint['inserted']} new, "
+        f"{checkpoint['copied'] - checkpoint['inserted']} already existed), {checkpoint['rejected']} rejected, "
+        f"{copied_now / elapsed:.0f} rows/s"
+    )
+    return {'rows': copied_now, 'seconds': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load NDJSON events into PostgreSQL via COPY")
+    parser.add_argument('inputs', nargs='+', help="NDJSON files (*.gz is read as gzip)")
+    parser.add_argument('--postgres-url', default=Config.POSTGRES_URL)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Validation processes (0 — validate in the main process)")
+    parser.add_argument('--chunk-lines', type=int, default=20000, help="Lines per COPY transaction")
+    parser.add_argument('--rejects', default='bulk_load.rejects.ndjson', help="Where to write invalid lines")
+    parser.add_argument('--restart', action='store_true', help="Ignore existing checkpoints")
+    parser.add_argument('--dry-run', action='store_true', help="Only validate, do not touch the database")
+    parser.add_argument('--report-interval', type=float, default=5.0)
+    args = parser.parse_args()
+    
+    conn: Optional[Any] = None
+    if not args.dry_run:
+        conn = psycopg2.connect(args.postgres_url)
+        with conn.cursor() as cur:
+            cur.execute(_STAGING_SQL)
+        conn.commit()
+    
+    total_rows = 0
+    started = time.monotonic()
+    try:
+        with open(args.rejects, 'a', encoding='utf-8') as rejects_file:
+            for input_path in args.inputs:
+                result = load_file(os.path.abspath(input_path), conn, args, rejects_file)
+                total_rows += result['rows']
+    finally:
+        if conn is not None:
+            conn.close()
+    
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"Total: {total_rows} rows in {elapsed:.1f}s, {total_rows / elapsed:.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
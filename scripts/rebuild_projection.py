@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Пересборка проекции events_projection в MySQL из PostgreSQL
+
+Диапазон id таблицы events (на момент запуска) делится на --workers
+поддиапазонов, каждый обрабатывает свой процесс. Процесс читает события
+порциями по --chunk-size в порядке id (keyset: WHERE id > последний id),
+каждую порцию — серверным курсором в короткой транзакции, чтобы не
+держать снимок часами и не мешать VACUUM. Строки пишутся в MySQL
+многострочными upsert по --batch-size (тот же UPSERT_PROJECTION_SQL,
+что у живой проекции), поэтому повторная запись безопасна.
+
+Прогресс каждого поддиапазона сохраняется в --checkpoint, повторный
+запуск продолжает с последнего записанного id. --max-rows-per-sec
+ограничивает общую скорость, чтобы пересборка не мешала приёму событий.
+События, записанные после запуска, проецирует воркер.
+
+Запуск: python scripts/rebuild_projection.py [--workers N] [--chunk-size N] [--batch-size N]
+                                             [--max-rows-per-sec R] [--restart] [--truncate]
+"""
+
+import sys
+import os
+import argparse
+import json
+import multiprocessing
+import queue
+import time
+from typing import Any, Dict, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.config import Config
+from shared.db_mysql import MySQLClient
+
+_SELECT_CHUNK_SQL = """
+SELECT id, event_id, event_type, source, occurred_at, payload
+FROM events
+WHERE id > %s AND id <= %s
+ORDER BY id
+LIMIT %s
+"""
+
+# Повторы пачки upsert в MySQL перед остановкой процесса
+_UPSERT_ATTEMPTS = 5
+
+
+def split_range(min_id: int, max_id: int, parts: int) -> List[Dict[str, int]]:
+    """
+    Деление (min_id - 1, max_id] на parts поддиапазонов
+    
+    Returns:
+        Поддиапазоны {'start', 'end', 'last_id'}: строки с start < id <= end,
+        last_id — последний записанный id
+    """
+    first = min_id - 1
+    step = max(1, -(-(max_id - first) // parts))
+    ranges = []
+    start = first
+    while start < max_id:
+        end = min(start + step, max_id)
+        ranges.append({'start': start, 'end': end, 'last_id': start})
+        start = end
+    return ranges
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    """Атомарная запись контрольной точки"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def upsert_batch(mysql_client: MySQLClient, events: List[Dict[str, Any]]) -> None:
+    """Многострочный upsert с повторами; RuntimeError — MySQL так и не принял пачку"""
+    for attempt in range(1, _UPSERT_ATTEMPTS + 1):
+        if mysql_client.upsert_projections(events):
+            return
+        if attempt < _UPSERT_ATTEMPTS:
+            time.sleep(min(2 ** attempt, 30))
+    raise RuntimeError(f"MySQL upsert of {len(events)} rows failed {_UPSERT_ATTEMPTS} times")
+
+
+def rebuild_range(index: int, id_range: Dict[str, int], args, progress) -> None:
+    """
+    Пересборка одного поддиапазона (в отдельном процессе)
+    
+    После каждой записанной порции отправляет в progress
+    ('progress', index, последний id, строк).
+    """
+    pg_conn = psycopg2.connect(args.postgres_url, cursor_factory=RealDictCursor)
+    mysql_client = MySQLClient(args.mysql_url, pool_size=1)
+    last_id = id_range['last_id']
+    # Доля общего лимита скорости на этот процесс
+    rate = args.max_rows_per_sec / args.workers if args.max_rows_per_sec else 0
+    paced_until = time.monotonic()
+    
+    try:
+        mysql_client.connect()
+        while last_id < id_range['end']:
+            rows = 0
+            chunk_last_id = last_id
+            batch: List[Dict[str, Any]] = []
+            # Порция — отдельная короткая транзакция с серверным курсором
+            with pg_conn:
+                with pg_conn.cursor(name=f'rebuild_projection_{index}') as cur:
+                    cur.itersize = args.batch_size
+                    cur.execute(_SELECT_CHUNK_SQL, (last_id, id_range['end'], args.chunk_size))
+                    for row in cur:
+                        batch.append(row)
+                        chunk_last_id = row['id']
+                        if len(batch) >= args.batch_size:
+                            upsert_batch(mysql_client, batch)
+                            rows += len(batch)
+                            batch = []
+            if batch:
+                upsert_batch(mysql_client, batch)
+                rows += len(batch)
+            
+            if not rows:
+                # Дыра в id до конца поддиапазона
+                last_id = id_range['end']
+            else:
+                last_id = chunk_last_id
+            progress.put(('progress', index, last_id, rows))
+            
+            if rate and rows:
+                paced_until = max(paced_until, time.monotonic() - 1.0) + rows / rate
+                time.sleep(max(0.0, paced_until - time.monotonic()))
+        progress.put(('done', index, last_id, 0))
+    except Exception as e:
+        progress.put(('error', index, last_id, f"{type(e).__name__}: {e}"))
+    finally:
+        pg_conn.close()
+        mysql_client.close()
+
+
+def prepare_checkpoint(args) -> Dict[str, Any]:
+    """Контрольная точка из файла или новая разбивка id-диапазона"""
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    if os.path.exists(args.checkpoint):
+        checkpoint = load_checkpoint(args.checkpoint)
+        print(
+            f"↪️  Resuming from {args.checkpoint}: ids {checkpoint['min_id']}..{checkpoint['max_id']}, "
+            f"{checkpoint['rows']} rows already written, {len(checkpoint['ranges'])} ranges"
+        )
+        return checkpoint
+    
+    with psycopg2.connect(args.postgres_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT min(id), max(id) FROM events")
+            min_id, max_id = cur.fetchone()
+    conn.close()
+    if min_id is None:
+        raise SystemExit("events is empty, nothing to rebuild")
+    
+    if args.truncate:
+        mysql_client = MySQLClient(args.mysql_url, pool_size=1)
+        with mysql_client.get_connection() as mysql_conn:
+            cursor = mysql_conn.cursor()
+            cursor.execute("TRUNCATE TABLE events_projection")
+            cursor.close()
+        mysql_client.close()
+        print("🧹 events_projection truncated")
+    
+    checkpoint = {
+        'min_id': min_id,
+        'max_id': max_id,
+        'rows': 0,
+        'ranges': split_range(min_id, max_id, args.workers)
+    }
+    save_checkpoint(args.checkpoint, checkpoint)
+    print(f"Rebuilding ids {min_id}..{max_id} in {len(checkpoint['ranges'])} ranges")
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the MySQL events_projection from PostgreSQL")
+    parser.add_argument('--postgres-url', default=Config.POSTGRES_URL)
+    parser.add_argument('--mysql-url', default=Config.MYSQL_URL)
+    parser.add_argument('--workers', type=int, default=4, help="Parallel processes (id ranges)")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="Rows per PostgreSQL keyset query")
+    parser.add_argument('--batch-size', type=int, default=500, help="Rows per MySQL upsert")
+    parser.add_argument('--max-rows-per-sec', type=float, default=0, help="Total throughput limit (0 — unlimited)")
+    parser.add_argument('--checkpoint', default='rebuild_projection.checkpoint.json')
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    parser.add_argument('--truncate', action='store_true', help="Truncate events_projection before a fresh rebuild")
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    args = parser.parse_args()
+    
+    if not args.mysql_url:
+        raise SystemExit("MYSQL_URL is not set")
+    
+    checkpoint = prepare_checkpoint(args)
+    ranges = checkpoint['ranges']
+    args.workers = max(1, len([r for r in ranges if r['last_id'] < r['end']]))
+    
+    progress = multiprocessing.Queue()
+    processes = {}
+    for index, id_range in enumerate(ranges):
+        if id_range['last_id'] >= id_range['end']:
+            continue
+        process = multiprocessing.Process(
+            target=rebuild_range, args=(index, id_range, args, progress),
+            name=f'rebuild-{index}', daemon=True
+        )
+        process.start()
+        processes[index] = process
+    
+    started = time.monotonic()
+    last_report = started
+    rows_now = 0
+    failed = []
+    try:
+        while processes:
+            try:
+                kind, index, last_id, value = progress.get(timeout=1.0)
+            except queue.Empty:
+                # Процесс мог упасть, не успев сообщить об ошибке (код 0 — сообщение ещё в очереди)
+                for index, process in list(processes.items()):
+                    if not process.is_alive() and process.exitcode != 0:
+                        failed.append((index, f"exited with code {process.exitcode}"))
+                        del processes[index]
+                continue
+            
+            ranges[index]['last_id'] = last_id
+            if kind == 'progress':
+                checkpoint['rows'] += value
+                rows_now += value
+            else:
+                if kind == 'error':
+                    failed.append((index, value))
+                process = processes.pop(index, None)
+                if process is not None:
+                    process.join()
+            save_checkpoint(args.checkpoint, checkpoint)
+            
+            now = time.monotonic()
+            if now - last_report >= args.report_interval:
+                last_report = now
+                remaining = sum(r['end'] - r['last_id'] for r in ranges)
+                print(
+                    f"   {checkpoint['rows']} rows written, {rows_now / (now - started):.0f} rows/s, "
+                    f"~{remaining} ids left, {len(processes)} ranges running"
+                )
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        save_checkpoint(args.checkpoint, checkpoint)
+        raise SystemExit(f"Interrupted, progress saved to {args.checkpoint}")
+    
+    elapsed = max(time.monotonic() - started, 1e-6)
+    for index, error in failed:
+        print(f"❌ Range {ranges[index]['start']}..{ranges[index]['end']} stopped at id {ranges[index]['last_id']}: {error}")
+    if failed:
+        raise SystemExit(f"Rebuild incomplete, rerun to resume from {args.checkpoint}")
+    
+    print(f"✅ Projection rebuilt: {rows_now} rows in {elapsed:.1f}s, {rows_now / elapsed:.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
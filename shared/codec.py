@@ -0,0 +1,106 @@
+import logging
+from typing import Any, Dict, Optional
+
+# MessagePack — опциональный компактный формат сообщений; JSON остаётся запасным
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from shared.jsonutil import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_MSGPACK = 'application/msgpack'
+
+# Синонимы, которые встречаются у других клиентов
+_MSGPACK_CONTENT_TYPES = (CONTENT_TYPE_MSGPACK, 'application/x-msgpack', 'application/vnd.msgpack')
+
+_FORMATS = {
+    'json': CONTENT_TYPE_JSON,
+    'msgpack': CONTENT_TYPE_MSGPACK
+}
+
+
+class MessageDecodeError(ValueError):
+    """Тело сообщения не удалось декодировать"""
+    
+    def __init__(self, message: str, content_type: str):
+        super().__init__(message)
+        self.content_type = content_type
+    
+    @property
+    def reason(self) -> str:
+        """Причина для DLQ: invalid_json / invalid_msgpack / unsupported_content_type"""
+        if is_msgpack(self.content_type):
+            return 'invalid_msgpack' if msgpack is not None else 'unsupported_content_type'
+        return 'invalid_json'
+
+
+def media_type(content_type: Optional[str]) -> str:
+    """Тип без параметров и в нижнем регистре: 'application/json; charset=utf-8' -> 'application/json'"""
+    return (content_type or '').split(';', 1)[0].strip().lower()
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return media_type(content_type) in _MSGPACK_CONTENT_TYPES
+
+
+def resolve_content_type(message_format: str) -> str:
+    """
+    Content-Type сообщений для настройки MESSAGE_FORMAT ('json' или 'msgpack')
+    
+    Если msgpack не установлен, используется JSON.
+    
+    Raises:
+        ValueError: неизвестный формат
+    """
+    content_type = _FORMATS.get(message_format.lower())
+    if content_type is None:
+        raise ValueError(f"Unknown message format: {message_format}")
+    
+    if content_type == CONTENT_TYPE_MSGPACK and msgpack is None:
+        logger.warning("MESSAGE_FORMAT=msgpack but msgpack is not installed, falling back to JSON")
+        return CONTENT_TYPE_JSON
+    return content_type
+
+
+def encode_message(data: Dict[str, Any], content_type: str = CONTENT_TYPE_JSON) -> bytes:
+    """
+    Кодирование тела сообщения
+    
+    Args:
+        data: Данные события (только JSON-совместимые типы)
+        content_type: CONTENT_TYPE_JSON или CONTENT_TYPE_MSGPACK
+    """
+    if is_msgpack(content_type):
+        return msgpack.packb(data, use_bin_type=True)
+    return dumps(data)
+
+
+def decode_message(body: bytes, content_type: Optional[str] = None) -> Any:
+    """
+    Декодирование тела сообщения по AMQP content_type
+    
+    MessagePack разбирается только для msgpack-типов; всё остальное
+    (без content_type, с параметрами вроде charset, text/plain от старых
+    продюсеров) считается JSON — так публиковали старые версии.
+    
+    Raises:
+        MessageDecodeError: повреждённое тело или неподдерживаемый формат
+    """
+    content_type = content_type or CONTENT_TYPE_JSON
+    
+    if is_msgpack(content_type):
+        if msgpack is None:
+            raise MessageDecodeError("msgpack is not installed", content_type)
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except (ValueError, TypeError, msgpack.exceptions.UnpackException) as e:
+            raise MessageDecodeError(f"Invalid MessagePack: {e}", content_type) from e
+    
+    try:
+        return loads(body)
+    except ValueError as e:
+        raise MessageDecodeError(str(e), content_type) from e
@@ -1,17 +1,109 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
-from typing import Optional, Dict, Any
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from typing import Optional, Dict, Any, Iterator, List
 import logging
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# Ошибки соединения и временные ошибки сервера: повтор имеет смысл, данные ни при чём
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# Канал LISTEN/NOTIFY, которым запись в events_outbox будит проектор
+OUTBOX_CHANNEL = 'events_outbox'
+
+# Таблица outbox для баз, созданных до её появления (init.sql выполняется
+# только на пустом томе). Advisory-блокировка: одновременный CREATE TABLE
+# IF NOT EXISTS из нескольких процессов может упасть на pg_type
+OUTBOX_SCHEMA_SQL = """
+SELECT pg_advisory_xact_lock(hashtext('events_outbox'));
+CREATE TABLE IF NOT EXISTS events_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    event_id VARCHAR(255) NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+
+def ensure_outbox(conn) -> None:
+    """Создание events_outbox, если её нет (psycopg2, транзакция коммитится)"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(OUTBOX_SCHEMA_SQL)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def with_outbox(insert_sql: str, returning: str) -> str:
+    """
+    INSERT в events, который в той же транзакции ставит новые события в outbox
+    
+    Уже существующие события (ON CONFLICT DO NOTHING) в outbox не попадают.
+    pg_notify вызывается на каждую новую строку, но одинаковые уведомления
+    одной транзакции PostgreSQL доставляет один раз, при COMMIT.
+    
+    Args:
+        insert_sql: INSERT INTO events ... ON CONFLICT ... RETURNING ..., event_id
+        returning: Колонки результата (из RETURNING)
+    """
+    return f"""
+        WITH inserted AS (
+            {insert_sql.strip().rstrip(';')}
+        ), queued AS (
+            INSERT INTO events_outbox (event_id)
+            SELECT event_id FROM inserted
+        )
+        SELECT {returning}, pg_notify('{OUTBOX_CHANNEL}', '') FROM inserted;
+        """
+
+
+def insert_events_sql(values: str, returning: str) -> str:
+    """
+    INSERT в events с идемпотентностью по event_id
+    
+    Общий текст для PostgresClient и асинхронного воркера: различаются
+    только плейсхолдеры драйвера.
+    
+    Args:
+        values: Строки VALUES ('(%(event_id)s, ...)', '%s' для execute_values, '($1, ...)' для asyncpg)
+        returning: Колонки RETURNING
+    """
+    return f"""
+        INSERT INTO events
+            (event_id, schema_version, event_type, source, occurred_at, payload)
+        VALUES {values}
+        ON CONFLICT (event_id)
+        DO NOTHING
+        RETURNING {returning};
+        """
+
+
+def _occurred_at_str(occurred_at: Any) -> str:
+    """occurred_at в виде ISO-строки UTC без временной зоны"""
+    if isinstance(occurred_at, datetime):
+        # Если есть временная зона, конвертируем в UTC и затем убираем временную зону
+        if occurred_at.tzinfo is not None:
+            occurred_at = occurred_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return occurred_at.isoformat()
+    # Если это строка, убираем 'Z' если есть
+    return str(occurred_at).rstrip('Z')
+
 
 class PostgresClient:
     """Клиент для работы с PostgreSQL с поддержкой идемпотентности"""
     
-    def __init__(self, connection_url: str):
+    def __init__(self, connection_url: str, outbox: bool = False):
+        """
+        Args:
+            connection_url: URL подключения
+            outbox: Ставить новые события в events_outbox в той же транзакции
+                (проекцию в MySQL тогда пишет worker.projector)
+        """
         self.connection_url = connection_url
+        self.outbox = outbox
         self.conn = None
     
     def connect(self):
@@ -22,6 +114,9 @@ class PostgresClient:
                     self.connection_url,
                     cursor_factory=RealDictCursor
                 )
+                # До первой вставки: INSERT с outbox без таблицы падал бы на каждом событии
+                if self.outbox:
+                    ensure_outbox(self.conn)
                 logger.info("Connected to PostgreSQL")
             except Exception as e:
                 logger.error(f"Failed to connect to PostgreSQL: {e}")
@@ -41,30 +136,17 @@ class PostgresClient:
         self.connect()
         
         # Обрабатываем occurred_at
-        occurred_at = event_data.get('occurred_at')
-        
-        if isinstance(occurred_at, datetime):
-            # Если есть временная зона, конвертируем в UTC и затем убираем временную зону
-            if occurred_at.tzinfo is not None:
-                occurred_at = occurred_at.astimezone(timezone.utc).replace(tzinfo=None)
-            occurred_at_str = occurred_at.isoformat()
-        else:
-            # Если это строка, убираем 'Z' если есть
-            occurred_at_str = str(occurred_at).rstrip('Z')
+        occurred_at_str = _occurred_at_str(event_data.get('occurred_at'))
         
         # Для поля payload используем Json адаптер
         payload = event_data.get('payload', {})
         
-        query = """
-        INSERT INTO events 
-            (event_id, schema_version, event_type, source, occurred_at, payload)
-        VALUES 
-            (%(event_id)s, %(schema_version)s, %(event_type)s, %(source)s, 
-             %(occurred_at)s, %(payload)s)
-        ON CONFLICT (event_id) 
-        DO NOTHING
-        RETURNING id;
-        """
+        query = insert_events_sql(
+            "(%(event_id)s, %(schema_version)s, %(event_type)s, %(source)s, %(occurred_at)s, %(payload)s)",
+            'id, event_id'
+        )
+        if self.outbox:
+            query = with_outbox(query, 'id')
         
         params = {
             'event_id': event_data.get('event_id'),
@@ -93,6 +175,130 @@ class PostgresClient:
             self.conn.rollback()
             raise
     
+    def insert_events(self, events: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Вставка пачки событий одним INSERT в одной транзакции
+        
+        Идемпотентность та же, что у insert_event: ON CONFLICT (event_id)
+        DO NOTHING. Если event_id повторяется внутри пачки, новым считается
+        только первое вхождение.
+        
+        Args:
+            events: Список словарей с данными событий
+        
+        Returns:
+            List[bool]: для каждого события True, если оно вставлено, False если уже существовало
+        
+        Raises:
+            Exception: ошибка вставки; транзакция откатывается целиком
+        """
+        if not events:
+            return []
+        
+        self.connect()
+        
+        query = insert_events_sql('%s', 'event_id')
+        if self.outbox:
+            query = with_outbox(query, 'event_id')
+        
+        rows = [
+            (
+                event_data.get('event_id'),
+                event_data.get('schema_version'),
+                event_data.get('event_type'),
+                event_data.get('source'),
+                _occurred_at_str(event_data.get('occurred_at')),
+                Json(event_data.get('payload', {}))
+            )
+            for event_data in events
+        ]
+        
+        try:
+            with self.conn.cursor() as cur:
+                # page_size = размер пачки: один оператор, один round-trip
+                returned = execute_values(cur, query, rows, page_size=len(rows), fetch=True)
+                self.conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to insert batch of {len(events)} events: {e}")
+            self.conn.rollback()
+            raise
+        
+        new_ids = {row['event_id'] for row in returned}
+        inserted = []
+        for event_data in events:
+            event_id = event_data.get('event_id')
+            inserted.append(event_id in new_ids)
+            new_ids.discard(event_id)
+        
+        logger.info(f"Batch inserted: {sum(inserted)} new of {len(events)} events")
+        return inserted
+    
+    def get_events(self, event_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Сохранённые события по списку event_id одним запросом
+        
+        Args:
+            event_ids: Идентификаторы событий
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: event_id -> строка events (только найденные)
+        """
+        if not event_ids:
+            return {}
+        
+        self.connect()
+        
+        query = """
+        SELECT event_id, schema_version, event_type, source, occurred_at, payload
+        FROM events
+        WHERE event_id = ANY(%s);
+        """
+        
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(query, (list(event_ids),))
+                rows = cur.fetchall()
+            # Не оставляем соединение в открытой транзакции
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to look up {len(event_ids)} events: {e}")
+            self.conn.rollback()
+            raise
+        
+        return {row['event_id']: dict(row) for row in rows}
+    
+    def iter_recent_event_ids(self, window_seconds: float, chunk_size: int = 10000) -> Iterator[str]:
+        """
+        event_id событий, записанных за последние window_seconds секунд
+        
+        Строки читаются серверным курсором порциями по chunk_size, поэтому
+        большое окно не загружается в память целиком.
+        
+        Args:
+            window_seconds: Окно по created_at (секунды)
+            chunk_size: Строк за один round-trip
+        """
+        self.connect()
+        
+        query = """
+        SELECT event_id
+        FROM events
+        WHERE created_at >= NOW() - %s * INTERVAL '1 second';
+        """
+        
+        try:
+            with self.conn.cursor(name='recent_event_ids') as cur:
+                cur.itersize = chunk_size
+                cur.execute(query, (window_seconds,))
+                for row in cur:
+                    yield row['event_id']
+            self.conn.commit()
+        except BaseException:
+            # В том числе GeneratorExit, если чтение прервали
+            if not self.conn.closed:
+                self.conn.rollback()
+            raise
+    
     def close(self):
         """Закрытие соединения с PostgreSQL"""
         if self.conn and not self.conn.closed:
@@ -0,0 +1,165 @@
+import json
+import re
+from json.decoder import JSONDecodeError, scanstring
+from typing import Any, List, Optional, Tuple, Union
+
+# Опциональный быстрый JSON-бэкенд
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_decoder = json.JSONDecoder()
+_scan_once = _decoder.scan_once
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+PAYLOAD_FIELD = 'payload'
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Разбор JSON через orjson, если он установлен, иначе через json"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson строже json (NaN, большие целые) — повторяем стандартным парсером
+            pass
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """Сериализация в компактный JSON (bytes) через orjson, если он установлен"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except orjson.JSONEncodeError:
+            # Целые больше 64 бит, нестроковые ключи — сериализуем стандартным модулем
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _skip_ws(text: str, idx: int) -> int:
+    return _WHITESPACE.match(text, idx).end()
+
+
+def _scan_event(text: str, idx: int) -> Tuple[Any, Optional[str], int]:
+    """
+    Разбор одного значения начиная с позиции idx
+    
+    Если значение — JSON-объект, возвращает словарь его полей и исходный
+    текст поля payload. Каждое значение разбирается C-сканером модуля json
+    ровно один раз.
+    
+    Returns:
+        (значение, исходный текст payload или None, позиция после значения)
+    """
+    if text[idx:idx + 1] != '{':
+        try:
+            value, end = _scan_once(text, idx)
+        except StopIteration as err:
+            raise JSONDecodeError("Expecting value", text, err.value) from None
+        return value, None, end
+    
+    fields = {}
+    payload_json = None
+    
+    idx = _skip_ws(text, idx + 1)
+    if text[idx:idx + 1] == '}':
+        return fields, None, idx + 1
+    
+    while True:
+        if text[idx:idx + 1] != '"':
+            raise JSONDecodeError("Expecting property name enclosed in double quotes", text, idx)
+        key, idx = scanstring(text, idx + 1)
+        
+        idx = _skip_ws(text, idx)
+        if text[idx:idx + 1] != ':':
+            raise JSONDecodeError("Expecting ':' delimiter", text, idx)
+        idx = _skip_ws(text, idx + 1)
+        
+        value_start = idx
+        try:
+            value, idx = _scan_once(text, idx)
+        except StopIteration as err:
+            raise JSONDecodeError("Expecting value", text, err.value) from None
+        
+        fields[key] = value
+        if key == PAYLOAD_FIELD:
+            payload_json = text[value_start:idx]
+        
+        idx = _skip_ws(text, idx)
+        delimiter = text[idx:idx + 1]
+        idx += 1
+        if delimiter == '}':
+            return fields, payload_json, idx
+        if delimiter != ',':
+            raise JSONDecodeError("Expecting ',' delimiter", text, idx - 1)
+        idx = _skip_ws(text, idx)
+
+
+def _as_text(data: Union[bytes, str]) -> str:
+    if isinstance(data, (bytes, bytearray)):
+        return data.decode('utf-8')
+    return data
+
+
+def split_event(data: Union[bytes, str]) -> Tuple[Any, Optional[str]]:
+    """
+    Разбор тела одного события с сохранением исходного текста payload
+    
+    Args:
+        data: JSON-документ
+    
+    Returns:
+        (разобранное значение, исходный текст поля payload или None)
+    """
+    text = _as_text(data)
+    idx = _skip_ws(text, 0)
+    value, payload_json, idx = _scan_event(text, idx)
+    
+    idx = _skip_ws(text, idx)
+    if idx != len(text):
+        raise JSONDecodeError("Extra data", text, idx)
+    return value, payload_json
+
+
+def split_event_array(data: Union[bytes, str]) -> Optional[List[Tuple[Any, Optional[str]]]]:
+    """
+    Разбор JSON-массива событий с сохранением исходного текста payload каждого
+    
+    Args:
+        data: JSON-документ
+    
+    Returns:
+        Список пар (значение, исходный текст payload) или None,
+        если документ не является массивом
+    """
+    text = _as_text(data)
+    idx = _skip_ws(text, 0)
+    if text[idx:idx + 1] != '[':
+        return None
+    
+    items = []
+    idx = _skip_ws(text, idx + 1)
+    if text[idx:idx + 1] == ']':
+        idx += 1
+    else:
+        while True:
+            value, payload_json, idx = _scan_event(text, idx)
+            items.append((value, payload_json))
+            
+            idx = _skip_ws(text, idx)
+            delimiter = text[idx:idx + 1]
+            idx += 1
+            if delimiter == ']':
+                break
+            if delimiter != ',':
+                raise JSONDecodeError("Expecting ',' delimiter", text, idx - 1)
+            idx = _skip_ws(text, idx)
+    
+    idx = _skip_ws(text, idx)
+    if idx != len(text):
+        raise JSONDecodeError("Extra data", text, idx)
+    return items
@@ -3,10 +3,11 @@ import sys
 import json
 from datetime import datetime
 from typing import Any, Dict
-import threading
+from contextvars import ContextVar
 
-# Thread-local storage for correlation_id
-_context = threading.local()
+# correlation_id текущего контекста: в потоках ведёт себя как thread-local,
+# в asyncio у каждой задачи своя копия
+_correlation_id: ContextVar = ContextVar('correlation_id', default=None)
 
 
 class JSONFormatter(logging.Formatter):
@@ -44,19 +45,18 @@ class JSONFormatter(logging.Formatter):
 
 
 def set_correlation_id(cid: str) -> None:
-    """Установка correlation_id для текущего потока"""
-    _context.correlation_id = cid
+    """Установка correlation_id для текущего потока (задачи asyncio)"""
+    _correlation_id.set(cid)
 
 
 def get_correlation_id() -> str:
-    """Получение correlation_id из текущего потока"""
-    return getattr(_context, 'correlation_id', None)
+    """Получение correlation_id из текущего потока (задачи asyncio)"""
+    return _correlation_id.get()
 
 
 def clear_correlation_id() -> None:
-    """Очистка correlation_id для текущего потока"""
-    if hasattr(_context, 'correlation_id'):
-        delattr(_context, 'correlation_id')
+    """Очистка correlation_id для текущего потока (задачи asyncio)"""
+    _correlation_id.set(None)
 
 
 def setup_logging(name: str, level: str = "INFO", json_format: bool = False) -> logging.Logger:
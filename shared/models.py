@@ -83,6 +83,17 @@ class IncomingEvent(BaseModel):
     def serialize_to_json(self) -> bytes:
         """Сериализация события в JSON bytes для отправки в RabbitMQ"""
         return json.dumps(self.dict_for_rabbitmq()).encode('utf-8')
+    
+    def serialize_with_payload_json(self, payload_json: str) -> bytes:
+        """
+        Сериализация для RabbitMQ с готовым JSON-текстом payload
+        
+        Перекодируются только поля конверта, payload вставляется как есть.
+        """
+        data = self.dict_for_rabbitmq()
+        data.pop('payload', None)
+        envelope = json.dumps(data)
+        return f'{envelope[:-1]}, "payload": {payload_json}}}'.encode('utf-8')
 
     class Config:
         json_encoders = {
@@ -0,0 +1,390 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from typing import Deque, List, Optional, Set, Tuple
+
+import pika
+from pika.spec import Basic, BasicProperties
+
+from shared.codec import CONTENT_TYPE_JSON
+from shared.rabbit import topology
+
+logger = logging.getLogger(__name__)
+
+
+class PublishError(Exception):
+    """Брокер не подтвердил публикацию сообщения"""
+
+
+class ConfirmTimeout(PublishError):
+    """Сообщение уже отправлено в канал, но подтверждение не пришло вовремя: исход неизвестен"""
+
+
+# (queue_name, body, headers, content_type, future)
+PendingMessage = Tuple[str, bytes, Optional[dict], str, Future]
+
+
+def _fail(future: Future, error: Exception) -> None:
+    """Завершить Future ошибкой, если вызывающий его ещё не отменил"""
+    try:
+        future.set_exception(error)
+    except InvalidStateError:
+        pass
+
+
+def wait_confirm(future: Future, timeout: float) -> None:
+    """
+    Ожидание подтверждения из submit()
+    
+    Raises:
+        ConfirmTimeout: сообщение отправлено, но подтверждения нет за timeout
+            секунд (брокер ещё может его принять — повторно не публиковать)
+        PublishError: сообщение не опубликовано или брокер отказал
+    """
+    try:
+        future.result(timeout=timeout)
+    except PublishError:
+        raise
+    except FutureTimeoutError:
+        # Отменить можно только сообщение, которое ещё ждёт в очереди публикатора
+        if future.cancel():
+            raise PublishError(f"Not published within {timeout}s")
+        if future.done():
+            # Подтверждение пришло сразу после таймаута
+            future.result()
+            return
+        raise ConfirmTimeout(f"No broker confirm within {timeout}s")
+
+
+class ConfirmingPublisher:
+    """
+    Фоновый публикатор с коалесцированием и publisher confirms
+    
+    Потоки-обработчики отдают сообщения через submit() и получают Future.
+    Отдельный поток с собственным SelectConnection собирает сообщения в пачки
+    (max_batch штук или linger_ms миллисекунд), публикует их в канал с
+    включёнными подтверждениями и завершает Future, когда брокер
+    подтвердил конкретный delivery tag.
+    """
+    
+    def __init__(self,
+                 rabbit_url: str,
+                 max_batch: int = 500,
+                 linger_ms: float = 2.0,
+                 max_pending: int = 100000,
+                 reconnect_delay: float = 1.0,
+                 confirm_timeout: float = 5.0):
+        """
+        Инициализация публикатора
+        
+        Args:
+            rabbit_url: URL подключения к RabbitMQ
+            max_batch: Максимальный размер пачки
+            linger_ms: Сколько ждать добора пачки (миллисекунды)
+            max_pending: Максимум сообщений, ожидающих публикации
+            reconnect_delay: Пауза перед переподключением (секунды)
+            confirm_timeout: Сколько ждать подтверждения в publish() (секунды)
+        """
+        self.rabbit_url = rabbit_url
+        self.max_batch = max_batch
+        self.linger = linger_ms / 1000.0
+        self.max_pending = max_pending
+        self.reconnect_delay = reconnect_delay
+        self.confirm_timeout = confirm_timeout
+        
+        self._lock = threading.Lock()
+        self._pending: Deque[PendingMessage] = deque()
+        self._flush_scheduled = False
+        self._ready = False
+        self._stopping = False
+        
+        # Состояние, которым владеет только поток ioloop
+        self._connection: Optional[pika.SelectConnection] = None
+        self._channel = None
+        self._delivery_tag = 0
+        self._outstanding: "OrderedDict[int, Future]" = OrderedDict()
+        self._returned: Set[int] = set()
+        
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> None:
+        """Запуск фонового потока публикации"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="confirming-publisher", daemon=True)
+        self._thread.start()
+    
+    def submit(self,
+               queue_name: str,
+               message_body: bytes,
+               headers: Optional[dict] = None,
+               content_type: str = CONTENT_TYPE_JSON) -> Future:
+        """
+        Поставить сообщение в очередь на публикацию
+        
+        Args:
+            queue_name: Имя очереди
+            message_body: Тело сообщения в bytes
+            headers: Дополнительные заголовки сообщения
+            content_type: Формат тела (см. shared.codec)
+        
+        Returns:
+            Future, который завершится после подтверждения брокером
+        """
+        future: Future = Future()
+        
+        with self._lock:
+            if self._stopping:
+                _fail(future, PublishError("Publisher is stopped"))
+                return future
+            if len(self._pending) >= self.max_pending:
+                _fail(future, PublishError("Publisher backlog is full"))
+                return future
+            
+            self._pending.append((queue_name, message_body, headers, content_type, future))
+            
+            # Будим ioloop только при переходе из пустого состояния
+            wake = self._ready and not self._flush_scheduled
+            if wake:
+                self._flush_scheduled = True
+            connection = self._connection
+        
+        if wake:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._schedule_flush)
+            except Exception as e:
+                # Соединение закрывается — сообщение опубликуют после переподключения
+                logger.debug(f"Failed to wake publisher ioloop: {e}")
+        
+        return future
+    
+    def publish(self,
+                queue_name: str,
+                message_body: bytes,
+                headers: Optional[dict] = None,
+                content_type: str = CONTENT_TYPE_JSON) -> None:
+        """
+        Публикация с ожиданием подтверждения (не дольше confirm_timeout)
+        
+        Raises:
+            PublishError: брокер не подтвердил сообщение
+        """
+        future = self.submit(queue_name, message_body, headers, content_type)
+        wait_confirm(future, self.confirm_timeout)
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """Остановка публикатора; неопубликованные сообщения завершаются ошибкой"""
+        with self._lock:
+            self._stopping = True
+            connection = self._connection
+        
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._close_connection)
+            except Exception as e:
+                logger.debug(f"Failed to schedule publisher shutdown: {e}")
+        
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        for *_, future in pending:
+            _fail(future, PublishError("Publisher stopped before publishing"))
+        
+        logger.info("Confirming publisher stopped")
+    
+    # --- Поток ioloop ---
+    
+    def _run(self) -> None:
+        """Основной цикл: соединение, ioloop, переподключение"""
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+            
+            try:
+                connection = pika.SelectConnection(
+                    pika.URLParameters(self.rabbit_url),
+                    on_open_callback=self._on_connection_open,
+                    on_open_error_callback=self._on_connection_open_error,
+                    on_close_callback=self._on_connection_closed
+                )
+                with self._lock:
+                    self._connection = connection
+                connection.ioloop.start()
+            except Exception as e:
+                logger.error(f"Confirming publisher ioloop failed: {e}")
+            
+            with self._lock:
+                self._connection = None
+                if self._stopping:
+                    return
+            
+            logger.info(f"Confirming publisher reconnecting in {self.reconnect_delay}s...")
+            time.sleep(self.reconnect_delay)
+    
+    def _on_connection_open(self, connection) -> None:
+        logger.info("Confirming publisher connected to RabbitMQ")
+        connection.channel(on_open_callback=self._on_channel_open)
+    
+    def _on_connection_open_error(self, connection, error) -> None:
+        logger.error(f"Confirming publisher failed to connect to RabbitMQ: {error}")
+        connection.ioloop.stop()
+    
+    def _on_connection_closed(self, connection, reason) -> None:
+        logger.warning(f"Confirming publisher connection closed: {reason}")
+        self._on_disconnect(reason)
+        connection.ioloop.stop()
+    
+    def _on_channel_open(self, channel) -> None:
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.add_on_return_callback(self._on_return)
+        
+        # Та же топология, что и в declare_topology
+        self._declare_queues(channel, topology())
+    
+    def _declare_queues(self, channel, queues: List[Tuple[str, dict]]) -> None:
+        """Объявление очередей по одной: следующая — в колбэке предыдущей"""
+        if not queues:
+            self._on_topology_ready(None)
+            return
+        (queue_name, arguments), rest = queues[0], queues[1:]
+        channel.queue_declare(
+            queue=queue_name,
+            durable=True,
+            arguments=arguments or None,
+            callback=lambda _frame: self._declare_queues(channel, rest)
+        )
+    
+    def _on_topology_ready(self, _frame) -> None:
+        self._channel.confirm_delivery(
+            ack_nack_callback=self._on_confirm,
+            callback=self._on_confirm_selected
+        )
+    
+    def _on_confirm_selected(self, _frame) -> None:
+        self._delivery_tag = 0
+        with self._lock:
+            self._ready = True
+            self._flush_scheduled = True
+        logger.info("Confirming publisher ready (publisher confirms enabled)")
+        self._schedule_flush()
+    
+    def _on_channel_closed(self, channel, reason) -> None:
+        logger.warning(f"Confirming publisher channel closed: {reason}")
+        self._on_disconnect(reason)
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+    
+    def _on_disconnect(self, reason) -> None:
+        """Неподтверждённые сообщения завершаются ошибкой: брокер мог их не сохранить"""
+        with self._lock:
+            self._ready = False
+            self._flush_scheduled = False
+        self._channel = None
+        
+        outstanding = list(self._outstanding.values())
+        self._outstanding.clear()
+        self._returned.clear()
+        for future in outstanding:
+            _fail(future, PublishError(f"Connection lost before confirm: {reason}"))
+    
+    def _close_connection(self) -> None:
+        if self._connection is not None and not self._connection.is_closed:
+            self._connection.close()
+    
+    def _schedule_flush(self) -> None:
+        """Публикуем сразу, если пачка набрана, иначе ждём linger"""
+        with self._lock:
+            full = len(self._pending) >= self.max_batch
+        
+        if full or self.linger <= 0:
+            self._flush()
+        else:
+            self._connection.ioloop.call_later(self.linger, self._flush)
+    
+    def _flush(self) -> None:
+        """Публикация одной пачки в канал"""
+        with self._lock:
+            if not self._ready or self._channel is None:
+                self._flush_scheduled = False
+                return
+            count = min(self.max_batch, len(self._pending))
+            batch = [self._pending.popleft() for _ in range(count)]
+            more = bool(self._pending)
+            self._flush_scheduled = more
+        
+        for queue_name, message_body, headers, content_type, future in batch:
+            # Вызывающий уже отменил сообщение — не публикуем; после этого отмена невозможна
+            if not future.set_running_or_notify_cancel():
+                continue
+            
+            self._delivery_tag += 1
+            delivery_tag = self._delivery_tag
+            try:
+                self._channel.basic_publish(
+                    exchange='',
+                    routing_key=queue_name,
+                    body=message_body,
+                    properties=BasicProperties(
+                        delivery_mode=2,
+                        content_type=content_type,
+                        headers=headers or {},
+                        message_id=str(delivery_tag)
+                    ),
+                    mandatory=True
+                )
+            except Exception as e:
+                logger.error(f"Failed to publish message to RabbitMQ: {e}")
+                _fail(future, PublishError(str(e)))
+                continue
+            self._outstanding[delivery_tag] = future
+        
+        if batch:
+            logger.debug(f"Published batch of {len(batch)} messages, awaiting confirms")
+        
+        if more:
+            self._connection.ioloop.call_later(0, self._schedule_flush)
+    
+    def _on_return(self, channel, method, properties, body) -> None:
+        """basic.return приходит раньше basic.ack для того же сообщения"""
+        logger.error(f"Message returned by broker: {method.reply_text} (routing_key={method.routing_key})")
+        if properties.message_id:
+            self._returned.add(int(properties.message_id))
+    
+    def _on_confirm(self, frame) -> None:
+        """Обработка basic.ack / basic.nack (в том числе multiple=True)"""
+        method = frame.method
+        acked = isinstance(method, Basic.Ack)
+        
+        if method.multiple:
+            while self._outstanding:
+                delivery_tag = next(iter(self._outstanding))
+                if delivery_tag > method.delivery_tag:
+                    break
+                self._resolve(delivery_tag, acked)
+        else:
+            self._resolve(method.delivery_tag, acked)
+    
+    def _resolve(self, delivery_tag: int, acked: bool) -> None:
+        future = self._outstanding.pop(delivery_tag, None)
+        returned = delivery_tag in self._returned
+        self._returned.discard(delivery_tag)
+        if future is None:
+            return
+        
+        if not acked:
+            _fail(future, PublishError("Message nacked by broker"))
+        elif returned:
+            _fail(future, PublishError("Message returned by broker as unroutable"))
+        else:
+            try:
+                future.set_result(True)
+            except InvalidStateError:
+                pass
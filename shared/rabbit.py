@@ -1,13 +1,111 @@
 import pika
 import json
 import logging
-from typing import Optional, Callable
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Optional, Callable, Iterator, List, Sequence, Tuple
 from pika.adapters.blocking_connection import BlockingChannel
 from pika.spec import BasicProperties
 from datetime import datetime
 
+from shared.codec import CONTENT_TYPE_JSON
+
 logger = logging.getLogger(__name__)
 
+EVENTS_QUEUE = 'events'
+DLQ_QUEUE = 'events.dlq'
+
+# Номер попытки обработки сообщения (нет заголовка — первая)
+ATTEMPT_HEADER = 'x-attempt'
+
+# Заголовки, которые брокер добавляет при dead-lettering; в копию для повтора не переносим
+_DEATH_HEADERS = ('x-death', 'x-first-death-exchange', 'x-first-death-queue', 'x-first-death-reason',
+                  'x-last-death-exchange', 'x-last-death-queue', 'x-last-death-reason')
+
+
+def retry_queue_name(delay_ms: int) -> str:
+    """Очередь отложенного повтора с задержкой delay_ms"""
+    return f"{EVENTS_QUEUE}.retry.{delay_ms}"
+
+
+def topology(retry_delays_ms: Sequence[int] = ()) -> List[Tuple[str, dict]]:
+    """
+    Очереди конвейера и их аргументы
+    
+    - events: при reject/nack без requeue сообщение уходит в events.dlq;
+    - events.dlq: сообщения, которые не удалось обработать;
+    - events.retry.<мс>: по одной на задержку повтора; сообщение лежит
+      там TTL миллисекунд и возвращается в events.
+    
+    Returns:
+        Список (имя очереди, arguments для queue_declare)
+    """
+    queues = [
+        (EVENTS_QUEUE, {
+            'x-dead-letter-exchange': '',  # Используем default exchange для DLQ
+            'x-dead-letter-routing-key': DLQ_QUEUE
+        }),
+        (DLQ_QUEUE, {})
+    ]
+    for delay_ms in retry_delays_ms:
+        queues.append((retry_queue_name(delay_ms), {
+            'x-message-ttl': int(delay_ms),
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': EVENTS_QUEUE
+        }))
+    return queues
+
+
+def declare_topology(channel: BlockingChannel, retry_delays_ms: Sequence[int] = ()) -> None:
+    """Объявление очередей конвейера (durable) на блокирующем канале"""
+    for queue_name, arguments in topology(retry_delays_ms):
+        channel.queue_declare(queue=queue_name, durable=True, arguments=arguments or None)
+
+
+class RetryPolicy:
+    """
+    Отложенные повторы через очереди брокера
+    
+    Сообщение с временной ошибкой публикуется заново в очередь
+    events.retry.<мс> с увеличенным x-attempt и подтверждается; брокер
+    вернёт его в events по истечении TTL. Пока сообщение ждёт, оно не
+    занимает слот консьюмера. После max_attempts попыток сообщение
+    уходит в DLQ.
+    """
+    
+    def __init__(self, delays_ms: Sequence[int], max_attempts: int):
+        """
+        Args:
+            delays_ms: Задержки по номерам попыток (последняя — для всех следующих)
+            max_attempts: Всего попыток обработки, включая первую
+        """
+        if not delays_ms:
+            raise ValueError("RetryPolicy requires at least one delay")
+        self.delays_ms = [int(delay_ms) for delay_ms in delays_ms]
+        self.max_attempts = max(1, max_attempts)
+    
+    @staticmethod
+    def attempt(headers: Optional[dict]) -> int:
+        """Номер текущей попытки по заголовку x-attempt"""
+        try:
+            return max(1, int((headers or {}).get(ATTEMPT_HEADER, 1)))
+        except (TypeError, ValueError):
+            return 1
+    
+    def delay_ms(self, attempt: int) -> Optional[int]:
+        """Задержка перед следующей попыткой; None — попытки исчерпаны"""
+        if attempt >= self.max_attempts:
+            return None
+        return self.delays_ms[min(attempt, len(self.delays_ms)) - 1]
+    
+    @staticmethod
+    def retry_headers(headers: Optional[dict], attempt: int) -> dict:
+        """Заголовки копии для следующей попытки"""
+        retry_headers = {key: value for key, value in (headers or {}).items() if key not in _DEATH_HEADERS}
+        retry_headers[ATTEMPT_HEADER] = attempt + 1
+        return retry_headers
+
 
 def get_connection(url: str) -> pika.BlockingConnection:
     """
@@ -56,28 +154,16 @@ class RabbitMQProducer:
         if self.channel is None:
             raise RuntimeError("Channel not initialized")
         
-        # Объявляем основную очередь с DLQ
-        self.channel.queue_declare(
-            queue='events',
-            durable=True,  # Сохранять сообщения при перезагрузке RabbitMQ
-            arguments={
-                'x-dead-letter-exchange': '',  # Используем default exchange для DLQ
-                'x-dead-letter-routing-key': 'events.dlq'
-            }
-        )
-        
-        # Объявляем DLQ очередь
-        self.channel.queue_declare(
-            queue='events.dlq',
-            durable=True
-        )
+        # Основная очередь с DLQ и сама DLQ (durable: переживают перезагрузку RabbitMQ)
+        declare_topology(self.channel)
         
         logger.info("RabbitMQ infrastructure setup complete")
     
     def publish(self, 
                 queue_name: str, 
                 message_body: bytes, 
-                headers: Optional[dict] = None) -> None:
+                headers: Optional[dict] = None,
+                content_type: str = CONTENT_TYPE_JSON) -> None:
         """
         Публикация сообщения в очередь
         
@@ -85,6 +171,7 @@ class RabbitMQProducer:
             queue_name: Имя очереди
             message_body: Тело сообщения в bytes
             headers: Дополнительные заголовки сообщения
+            content_type: Формат тела (см. shared.codec)
         """
         self.connect()
         
@@ -94,7 +181,7 @@ class RabbitMQProducer:
         # Свойства сообщения
         properties = BasicProperties(
             delivery_mode=2,  # Persistent (сохранять на диске)
-            content_type='application/json',
+            content_type=content_type,
             headers=headers or {}
         )
         
@@ -111,6 +198,44 @@ class RabbitMQProducer:
             logger.error(f"Failed to publish message to RabbitMQ: {e}")
             raise
     
+    def publish_batch(self,
+                      queue_name: str,
+                      messages: List[Tuple[bytes, Optional[dict]]],
+                      content_type: str = CONTENT_TYPE_JSON) -> None:
+        """
+        Публикация пачки сообщений за один проход по каналу
+        
+        Args:
+            queue_name: Имя очереди
+            messages: Список пар (тело сообщения, заголовки)
+            content_type: Формат тел сообщений (см. shared.codec)
+        """
+        if not messages:
+            return
+        
+        self.connect()
+        
+        if self.channel is None:
+            raise RuntimeError("Channel not initialized")
+        
+        try:
+            for message_body, headers in messages:
+                self.channel.basic_publish(
+                    exchange='',
+                    routing_key=queue_name,
+                    body=message_body,
+                    properties=BasicProperties(
+                        delivery_mode=2,
+                        content_type=content_type,
+                        headers=headers or {}
+                    ),
+                    mandatory=True
+                )
+            logger.info(f"Batch of {len(messages)} messages published to queue '{queue_name}'")
+        except Exception as e:
+            logger.error(f"Failed to publish batch to RabbitMQ: {e}")
+            raise
+    
     def close(self) -> None:
         """Закрытие соединения с RabbitMQ"""
         if self.connection and self.connection.is_open:
@@ -125,15 +250,133 @@ class RabbitMQProducer:
         self.close()
 
 
-def publish_to_dlq(rabbit_url: str, original_message: bytes, error_info: dict, queue_name: str = "events.dlq"):
+class RabbitMQProducerPool:
     """
-    Публикация сообщения в Dead Letter Queue
+    Потокобезопасный пул долгоживущих продюсеров
+    
+    Каждый продюсер владеет своим соединением и каналом и в каждый момент
+    выдаётся только одному потоку. Топология объявляется один раз на
+    соединение (в RabbitMQProducer.connect), соединения переживают запросы.
+    """
+    
+    # Ошибки, после которых соединение считается мёртвым
+    CONNECTION_ERRORS = (
+        pika.exceptions.AMQPConnectionError,
+        pika.exceptions.AMQPChannelError,
+    )
+    
+    def __init__(self, rabbit_url: str, size: int = 8, acquire_timeout: float = 5.0):
+        """
+        Инициализация пула
+        
+        Args:
+            rabbit_url: URL подключения к RabbitMQ
+            size: Максимальное количество соединений
+            acquire_timeout: Сколько ждать свободного продюсера (секунды)
+        """
+        self.rabbit_url = rabbit_url
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._idle: "queue.LifoQueue[RabbitMQProducer]" = queue.LifoQueue()
+        self._all: List[RabbitMQProducer] = []
+        self._lock = threading.Lock()
+    
+    def _checkout(self) -> RabbitMQProducer:
+        """Взять свободного продюсера или создать новый, если пул не заполнен"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            if len(self._all) < self.size:
+                producer = RabbitMQProducer(self.rabbit_url)
+                self._all.append(producer)
+                return producer
+        
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise RuntimeError(
+                f"RabbitMQ producer pool exhausted ({self.size} connections busy)"
+            )
+    
+    @contextmanager
+    def acquire(self) -> Iterator[RabbitMQProducer]:
+        """Выдать продюсера в монопольное пользование текущему потоку"""
+        producer = self._checkout()
+        try:
+            yield producer
+        except self.CONNECTION_ERRORS:
+            # Соединение сломано — закрываем, следующий connect() переподключится
+            self._discard_connection(producer)
+            raise
+        finally:
+            self._idle.put(producer)
+    
+    def _discard_connection(self, producer: RabbitMQProducer) -> None:
+        """Закрытие сломанного соединения без выброса исключений"""
+        try:
+            producer.close()
+        except Exception as e:
+            logger.debug(f"Error while closing broken RabbitMQ connection: {e}")
+        producer.connection = None
+        producer.channel = None
+    
+    def connect(self) -> None:
+        """Проверка, что пул может выдать рабочее соединение"""
+        with self.acquire() as producer:
+            producer.connect()
+    
+    def publish(self,
+                queue_name: str,
+                message_body: bytes,
+                headers: Optional[dict] = None,
+                content_type: str = CONTENT_TYPE_JSON) -> None:
+        """Публикация сообщения; при обрыве соединения — одна повторная попытка"""
+        try:
+            with self.acquire() as producer:
+                producer.publish(queue_name, message_body, headers, content_type)
+        except self.CONNECTION_ERRORS as e:
+            logger.warning(f"RabbitMQ connection lost ({type(e).__name__}), reconnecting and retrying publish")
+            with self.acquire() as producer:
+                producer.publish(queue_name, message_body, headers, content_type)
+    
+    def publish_batch(self,
+                      queue_name: str,
+                      messages: List[Tuple[bytes, Optional[dict]]],
+                      content_type: str = CONTENT_TYPE_JSON) -> None:
+        """Публикация пачки сообщений; при обрыве соединения — одна повторная попытка"""
+        try:
+            with self.acquire() as producer:
+                producer.publish_batch(queue_name, messages, content_type)
+        except self.CONNECTION_ERRORS as e:
+            logger.warning(f"RabbitMQ connection lost ({type(e).__name__}), reconnecting and retrying batch")
+            with self.acquire() as producer:
+                producer.publish_batch(queue_name, messages, content_type)
+    
+    def close(self) -> None:
+        """Закрытие всех соединений пула"""
+        with self._lock:
+            producers = list(self._all)
+        for producer in producers:
+            try:
+                producer.close()
+            except Exception as e:
+                logger.warning(f"Error closing pooled RabbitMQ connection: {e}")
+
+
+def build_dlq_message(original_message: bytes, error_info: dict, source_queue: str = "events") -> Tuple[bytes, dict]:
+    """
+    Тело и заголовки сообщения для Dead Letter Queue
     
     Args:
-        rabbit_url: URL RabbitMQ
         original_message: Оригинальное сообщение (bytes)
         error_info: Информация об ошибке (dict)
-        queue_name: Имя DLQ (по умолчанию 'events.dlq')
+        source_queue: Очередь, из которой пришло сообщение
+    
+    Returns:
+        (тело сообщения, заголовки)
     """
     # Делаем безопасный decode
     try:
@@ -147,31 +390,72 @@ def publish_to_dlq(rabbit_url: str, original_message: bytes, error_info: dict, q
         "original_message": original_decoded,
         "error_info": error_info,
         "timestamp": datetime.utcnow().isoformat(),
-        "queue": "events"
+        "queue": source_queue
     }
     
     # Получаем correlation_id из error_info
     correlation_id = error_info.get('correlation_id')
     
+    headers = {
+        "x-death-reason": error_info.get("reason", "unknown"),
+        "x-original-queue": source_queue,
+        "correlation_id": correlation_id if correlation_id else "unknown"
+    }
+    return json.dumps(dlq_message).encode('utf-8'), headers
+
+
+def publish_to_dlq(rabbit_url: str, original_message: bytes, error_info: dict, queue_name: str = "events.dlq"):
+    """
+    Публикация сообщения в Dead Letter Queue
+    
+    Args:
+        rabbit_url: URL RabbitMQ
+        original_message: Оригинальное сообщение (bytes)
+        error_info: Информация об ошибке (dict)
+        queue_name: Имя DLQ (по умолчанию 'events.dlq')
+    """
+    message_body, headers = build_dlq_message(original_message, error_info)
+    
     # Публикуем в DLQ
     producer = RabbitMQProducer(rabbit_url)
     producer.publish(
         queue_name=queue_name,
-        message_body=json.dumps(dlq_message).encode('utf-8'),
-        headers={
-            "x-death-reason": error_info.get("reason", "unknown"),
-            "x-original-queue": "events",
-            "correlation_id": correlation_id if correlation_id else "unknown"
-        }
+        message_body=message_body,
+        headers=headers
     )
     producer.close()
 
 
+def publish_to_retry(rabbit_url: str, original_message: bytes, headers: dict,
+                     content_type: Optional[str], delay_ms: int):
+    """
+    Публикация копии сообщения в очередь отложенного повтора
+    
+    Args:
+        rabbit_url: URL RabbitMQ
+        original_message: Тело сообщения (без изменений)
+        headers: Заголовки копии (см. RetryPolicy.retry_headers)
+        content_type: Формат тела исходного сообщения
+        delay_ms: Задержка; очередь events.retry.<delay_ms> должна быть объявлена
+    """
+    producer = RabbitMQProducer(rabbit_url)
+    try:
+        producer.publish(
+            queue_name=retry_queue_name(delay_ms),
+            message_body=original_message,
+            headers=headers,
+            content_type=content_type or CONTENT_TYPE_JSON
+        )
+    finally:
+        producer.close()
+
+
 class RabbitMQConsumer:
     """Консьюмер для чтения сообщений из RabbitMQ"""
     
-    def __init__(self, rabbit_url: str):
+    def __init__(self, rabbit_url: str, retry_delays_ms: Sequence[int] = ()):
         self.rabbit_url = rabbit_url
+        self.retry_delays_ms = retry_delays_ms
         self.connection: Optional[pika.BlockingConnection] = None
         self.channel: Optional[BlockingChannel] = None
     
@@ -181,21 +465,8 @@ class RabbitMQConsumer:
             self.connection = get_connection(self.rabbit_url)
             self.channel = self.connection.channel()
             
-            # Объявляем очередь, если не объявлена
-            self.channel.queue_declare(
-                queue='events',
-                durable=True,
-                arguments={
-                    'x-dead-letter-exchange': '',
-                    'x-dead-letter-routing-key': 'events.dlq'
-                }
-            )
-            
-            # Объявляем DLQ
-            self.channel.queue_declare(
-                queue='events.dlq',
-                durable=True
-            )
+            # Объявляем очереди, если не объявлены (включая очереди повторов)
+            declare_topology(self.channel, self.retry_delays_ms)
             
             logger.info("RabbitMQ consumer connected and queues declared")
     
@@ -0,0 +1,418 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Проверка значения; при ошибке бросает PayloadSchemaError
+Validator = Callable[[Any], None]
+SchemaKey = Tuple[str, int]
+
+# Имя типа JSON Schema -> допустимые типы Python (bool не считается числом)
+_TYPES = {
+    'object': (dict,),
+    'array': (list,),
+    'string': (str,),
+    'integer': (int,),
+    'number': (int, float),
+    'boolean': (bool,),
+    'null': (type(None),)
+}
+
+# Ключевые слова-аннотации, не влияющие на проверку
+_ANNOTATIONS = frozenset(('$schema', '$id', '$comment', 'title', 'description', 'default', 'examples'))
+
+_KEYWORDS = frozenset((
+    'type', 'enum',
+    'minLength', 'maxLength', 'pattern',
+    'minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum',
+    'items', 'minItems', 'maxItems',
+    'properties', 'required', 'additionalProperties'
+)) | _ANNOTATIONS
+
+_CONTAINERS = (dict, list)
+
+
+class PayloadSchemaError(ValueError):
+    """Payload не соответствует схеме своего event_type / schema_version"""
+    
+    def __init__(self, message: str, path: Optional[List[Any]] = None):
+        self.message = message
+        # Путь от корня payload: ключи объектов и индексы массивов
+        self.path = path if path is not None else []
+        super().__init__(message)
+    
+    @property
+    def location(self) -> str:
+        """Путь в виде payload.items[0].sku"""
+        location = 'payload'
+        for part in self.path:
+            location += f'[{part}]' if isinstance(part, int) else f'.{part}'
+        return location
+    
+    def __str__(self) -> str:
+        return f"{self.location}: {self.message}"
+
+
+def _check_limits(payload: Any, max_depth: int, max_nodes: int) -> None:
+    """
+    Ограничение вложенности и числа значений payload
+    
+    Обход прерывается, как только лимит превышен, поэтому стоимость
+    ограничена max_nodes даже для огромного payload.
+    """
+    # Считаются все значения, в стек попадают только контейнеры
+    nodes = 1
+    stack = [(payload, 1)] if type(payload) in _CONTAINERS else []
+    while stack:
+        value, depth = stack.pop()
+        if depth > max_depth:
+            raise PayloadSchemaError(f"payload is nested deeper than {max_depth} levels")
+        children = value.values() if type(value) is dict else value
+        nodes += len(children)
+        if nodes > max_nodes:
+            raise PayloadSchemaError(f"payload has more than {max_nodes} values")
+        for child in children:
+            if type(child) in _CONTAINERS:
+                stack.append((child, depth + 1))
+
+
+def compile_schema(spec: Dict[str, Any]) -> Validator:
+    """
+    Компиляция схемы (подмножество JSON Schema) в функцию проверки
+    
+    Схема разбирается один раз: на каждое ключевое слово создаётся
+    замыкание, и при проверке события остаются только сравнения типов
+    и значений. Путь к ошибке собирается только при ошибке.
+    
+    Поддерживаются type, enum, minLength, maxLength, pattern, minimum,
+    maximum, exclusiveMinimum, exclusiveMaximum, items, minItems, maxItems,
+    properties, required, additionalProperties.
+    
+    Raises:
+        ValueError: схема некорректна или использует неподдерживаемые ключевые слова
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Schema must be an object, got {type(spec).__name__}")
+    
+    unknown = set(spec) - _KEYWORDS
+    if unknown:
+        raise ValueError(f"Unsupported schema keywords: {', '.join(sorted(unknown))}")
+    
+    checks: List[Validator] = []
+    
+    if 'type' in spec:
+        names = spec['type'] if isinstance(spec['type'], list) else [spec['type']]
+        for name in names:
+            if name not in _TYPES:
+                raise ValueError(f"Unknown schema type: {name}")
+        checks.append(_type_check(names))
+    
+    if 'enum' in spec:
+        checks.append(_enum_check(spec['enum']))
+    
+    if 'minLength' in spec or 'maxLength' in spec or 'pattern' in spec:
+        checks.append(_string_check(spec.get('minLength'), spec.get('maxLength'), spec.get('pattern')))
+    
+    if any(key in spec for key in ('minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum')):
+        checks.append(_number_check(
+            spec.get('minimum'), spec.get('maximum'),
+            spec.get('exclusiveMinimum'), spec.get('exclusiveMaximum')
+        ))
+    
+    if 'items' in spec or 'minItems' in spec or 'maxItems' in spec:
+        items = compile_schema(spec['items']) if 'items' in spec else None
+        checks.append(_array_check(items, spec.get('minItems'), spec.get('maxItems')))
+    
+    if 'properties' in spec or 'required' in spec or 'additionalProperties' in spec:
+        properties = {name: compile_schema(item) for name, item in spec.get('properties', {}).items()}
+        additional = spec.get('additionalProperties', True)
+        if isinstance(additional, dict):
+            additional = compile_schema(additional)
+        elif not isinstance(additional, bool):
+            raise ValueError("additionalProperties must be a boolean or a schema")
+        checks.append(_object_check(properties, tuple(spec.get('required', ())), additional))
+    
+    if not checks:
+        return _accept_any
+    if len(checks) == 1:
+        return checks[0]
+    
+    def check_all(value: Any) -> None:
+        for check in checks:
+            check(value)
+    return check_all
+
+
+def _accept_any(value: Any) -> None:
+    pass
+
+
+def _type_check(names: List[str]) -> Validator:
+    allowed = frozenset(python_type for name in names for python_type in _TYPES[name])
+    expected = ' or '.join(names)
+    
+    def check_type(value: Any) -> None:
+        if type(value) not in allowed:
+            raise PayloadSchemaError(f"expected {expected}, got {_json_type(value)}")
+    return check_type
+
+
+def _enum_check(options: List[Any]) -> Validator:
+    if not isinstance(options, list) or not options:
+        raise ValueError("enum must be a non-empty list")
+    # Сравнение с учётом типа: в JSON true и 1 — разные значения
+    allowed = [(type(option), option) for option in options]
+    try:
+        allowed = frozenset(allowed)
+    except TypeError:
+        pass
+    
+    def check_enum(value: Any) -> None:
+        try:
+            found = (type(value), value) in allowed
+        except TypeError:
+            found = False
+        if not found:
+            raise PayloadSchemaError(f"value is not one of {options}")
+    return check_enum
+
+
+def _string_check(min_length: Optional[int], max_length: Optional[int], pattern: Optional[str]) -> Validator:
+    regex = re.compile(pattern) if pattern is not None else None
+    
+    def check_string(value: Any) -> None:
+        if type(value) is not str:
+            return
+        if min_length is not None and len(value) < min_length:
+            raise PayloadSchemaError(f"string is shorter than {min_length} characters")
+        if max_length is not None and len(value) > max_length:
+            raise PayloadSchemaError(f"string is longer than {max_length} characters")
+        if regex is not None and regex.search(value) is None:
+            raise PayloadSchemaError(f"string does not match pattern {pattern}")
+    return check_string
+
+
+def _number_check(minimum, maximum, exclusive_minimum, exclusive_maximum) -> Validator:
+    def check_number(value: Any) -> None:
+        if type(value) is not int and type(value) is not float:
+            return
+        if minimum is not None and value < minimum:
+            raise PayloadSchemaError(f"value is less than {minimum}")
+        if maximum is not None and value > maximum:
+            raise PayloadSchemaError(f"value is greater than {maximum}")
+        if exclusive_minimum is not None and value <= exclusive_minimum:
+            raise PayloadSchemaError(f"value must be greater than {exclusive_minimum}")
+        if exclusive_maximum is not None and value >= exclusive_maximum:
+            raise PayloadSchemaError(f"value must be less than {exclusive_maximum}")
+    return check_number
+
+
+def _array_check(items: Optional[Validator], min_items: Optional[int], max_items: Optional[int]) -> Validator:
+    def check_array(value: Any) -> None:
+        if type(value) is not list:
+            return
+        if min_items is not None and len(value) < min_items:
+            raise PayloadSchemaError(f"array has fewer than {min_items} items")
+        if max_items is not None and len(value) > max_items:
+            raise PayloadSchemaError(f"array has more than {max_items} items")
+        if items is None or items is _accept_any:
+            return
+        for index, item in enumerate(value):
+            try:
+                items(item)
+            except PayloadSchemaError as e:
+                e.path.insert(0, index)
+                raise
+    return check_array
+
+
+def _object_check(properties: Dict[str, Validator], required: Tuple[str, ...], additional) -> Validator:
+    def check_object(value: Any) -> None:
+        if type(value) is not dict:
+            return
+        for name in required:
+            if name not in value:
+                raise PayloadSchemaError("field is required", [name])
+        for name, item in value.items():
+            check = properties.get(name)
+            if check is None:
+                if additional is True:
+                    continue
+                if additional is False:
+                    raise PayloadSchemaError("additional field is not allowed", [name])
+                check = additional
+            try:
+                check(item)
+            except PayloadSchemaError as e:
+                e.path.insert(0, name)
+                raise
+    return check_object
+
+
+def _json_type(value: Any) -> str:
+    for name, python_types in _TYPES.items():
+        if type(value) in python_types:
+            return name
+    return type(value).__name__
+
+
+class SchemaRegistry:
+    """
+    Реестр схем payload по (event_type, schema_version)
+    
+    Схемы читаются из *.json файлов каталога, каждая компилируется один раз
+    (см. compile_schema). Каталог перечитывается не чаще раза в
+    reload_interval секунд и только если файлы изменились; при ошибке в
+    новых файлах продолжают работать прежние схемы. События неизвестных
+    типов и версий проходят без проверки.
+    
+    Формат файла:
+        {"event_type": "order_created", "schema_version": 1,
+         "max_depth": 8, "max_nodes": 1000,   (необязательно)
+         "payload": {"type": "object", "required": ["order_id"], ...}}
+    """
+    
+    def __init__(self,
+                 schema_dir: str,
+                 reload_interval: float = 5.0,
+                 max_depth: int = 32,
+                 max_nodes: int = 10000):
+        """
+        Инициализация реестра
+        
+        Args:
+            schema_dir: Каталог с файлами схем
+            reload_interval: Как часто проверять изменения файлов (секунды, 0 — никогда)
+            max_depth: Максимальная вложенность payload по умолчанию
+            max_nodes: Максимальное число значений в payload по умолчанию
+        
+        Raises:
+            ValueError: файлы схем некорректны
+        """
+        self.schema_dir = schema_dir
+        self.reload_interval = reload_interval
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        
+        self._lock = threading.Lock()
+        # Словарь целиком заменяется при перезагрузке: чтение без блокировки
+        self._validators: Dict[SchemaKey, Validator] = {}
+        self._signature: Optional[Tuple] = None
+        self._next_check = 0.0
+        
+        self.reloads = 0
+        self.reload_errors = 0
+        self.checked = 0
+        self.rejected = 0
+        
+        self.reload()
+    
+    def validate(self, event_type: str, schema_version: int, payload: Any) -> None:
+        """
+        Проверка payload события по схеме его типа и версии
+        
+        Raises:
+            PayloadSchemaError: payload не соответствует схеме или лимитам
+        """
+        if self.reload_interval > 0 and time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        
+        validator = self._validators.get((event_type, schema_version))
+        if validator is None:
+            return
+        
+        self.checked += 1
+        try:
+            validator(payload)
+        except PayloadSchemaError:
+            self.rejected += 1
+            raise
+    
+    def reload(self) -> bool:
+        """
+        Перечитать каталог схем, если файлы изменились
+        
+        Returns:
+            True, если схемы были перезагружены
+        
+        Raises:
+            ValueError: файлы схем некорректны (прежние схемы сохраняются)
+        """
+        with self._lock:
+            return self._reload_locked()
+    
+    def _maybe_reload(self) -> None:
+        # Проверку делает один поток, остальные не ждут
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._reload_locked()
+        except (OSError, ValueError) as e:
+            self.reload_errors += 1
+            logger.error(f"Failed to reload payload schemas from {self.schema_dir}: {e}")
+        finally:
+            self._lock.release()
+    
+    def _reload_locked(self) -> bool:
+        self._next_check = time.monotonic() + self.reload_interval
+        
+        signature = []
+        for name in sorted(os.listdir(self.schema_dir)):
+            if name.endswith('.json'):
+                path = os.path.join(self.schema_dir, name)
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+        signature = tuple(signature)
+        if signature == self._signature:
+            return False
+        
+        validators = {}
+        for path, _, _ in signature:
+            key, validator = self._load_file(path)
+            if key in validators:
+                raise ValueError(f"Duplicate schema for {key[0]} v{key[1]} in {path}")
+            validators[key] = validator
+        
+        self._validators = validators
+        self._signature = signature
+        self.reloads += 1
+        logger.info(f"Loaded {len(validators)} payload schemas from {self.schema_dir}")
+        return True
+    
+    def _load_file(self, path: str) -> Tuple[SchemaKey, Validator]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+            
+            event_type = document['event_type']
+            schema_version = document['schema_version']
+            if not isinstance(event_type, str) or type(schema_version) is not int:
+                raise ValueError("event_type must be a string and schema_version an integer")
+            
+            payload_check = compile_schema(document.get('payload', {}))
+        except (KeyError, TypeError, ValueError, re.error) as e:
+            raise ValueError(f"Invalid schema file {path}: {e}") from e
+        
+        max_depth = document.get('max_depth', self.max_depth)
+        max_nodes = document.get('max_nodes', self.max_nodes)
+        
+        def validate_payload(payload: Any) -> None:
+            _check_limits(payload, max_depth, max_nodes)
+            payload_check(payload)
+        
+        return (event_type, schema_version), validate_payload
+    
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики для мониторинга"""
+        return {
+            "schemas": len(self._validators),
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors
+        }
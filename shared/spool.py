@@ -0,0 +1,508 @@
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Заголовок записи: длина данных и их crc32
+_RECORD_HEADER = struct.Struct('>II')
+# Внутри записи: длина JSON с content_type и заголовками сообщения
+_META_LENGTH = struct.Struct('>I')
+
+_SEGMENT_PREFIX = 'segment-'
+_SEGMENT_SUFFIX = '.seg'
+_CURSOR_FILE = 'cursor.json'
+_LOCK_FILE = 'lock'
+
+FSYNC_ALWAYS = 'always'
+FSYNC_INTERVAL = 'interval'
+FSYNC_NEVER = 'never'
+
+# (тело сообщения, заголовки, content_type)
+SpoolRecord = Tuple[bytes, dict, str]
+# (номер сегмента, смещение после записи)
+SpoolPosition = Tuple[int, int]
+
+
+class SpoolFullError(Exception):
+    """Спул достиг максимального размера"""
+
+
+class Spool:
+    """
+    Дисковый append-only спул сообщений
+    
+    Сообщения дописываются в сегментные файлы, дренажный поток читает их
+    по порядку с позиции курсора и после публикации сдвигает курсор;
+    полностью вычитанные сегменты удаляются. Каждый процесс занимает
+    свой слот (подкаталог с flock), поэтому после перезапуска новый
+    процесс подхватывает недоотправленные сообщения. Слоты, которые
+    никто не занял (процессов стало меньше), перекладываются в свой
+    спул при старте и периодически из дренажа (adopt_orphans()).
+    """
+    
+    def __init__(self,
+                 base_dir: str,
+                 segment_bytes: int = 64 * 1024 * 1024,
+                 max_bytes: int = 1024 * 1024 * 1024,
+                 fsync: str = FSYNC_INTERVAL,
+                 fsync_interval: float = 1.0,
+                 max_slots: int = 64):
+        """
+        Инициализация спула
+        
+        Args:
+            base_dir: Базовый каталог спула
+            segment_bytes: Размер сегмента, после которого открывается новый
+            max_bytes: Максимальный суммарный размер сегментов
+            fsync: Политика fsync: 'always', 'interval' или 'never'
+            fsync_interval: Период fsync для политики 'interval' (секунды)
+            max_slots: Максимум процессов, использующих один base_dir
+        """
+        if fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown spool fsync policy: {fsync}")
+        
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        
+        self.base_dir = base_dir
+        self.max_slots = max_slots
+        
+        self._lock = threading.Lock()
+        self.directory, self._lock_fd = self._acquire_slot(base_dir, max_slots)
+        
+        segments = self._list_segments()
+        self._total_bytes = sum(os.path.getsize(self._segment_path(seq)) for seq in segments)
+        self._cursor: SpoolPosition = self._load_cursor(self.directory, segments)
+        
+        # Всегда пишем в новый сегмент: хвост старого мог оборваться при падении
+        self._active_seq = (segments[-1] + 1) if segments else 1
+        self._active_fd: Optional[int] = None
+        self._active_size = 0
+        self._last_fsync = time.monotonic()
+        self._open_active_segment()
+        
+        # Сегменты, вычитанные до падения, но не успевшие удалиться
+        with self._lock:
+            self._drop_segments_before(self._cursor[0])
+        
+        self.adopt_orphans()
+        if self.pending_bytes():
+            logger.warning(f"Spool {self.directory} has {self.pending_bytes()} bytes left from a previous run")
+    
+    # --- Слоты и файлы ---
+    
+    @staticmethod
+    def _acquire_slot(base_dir: str, max_slots: int) -> Tuple[str, int]:
+        """Занять первый свободный слот каталога спула"""
+        for slot in range(max_slots):
+            directory = os.path.join(base_dir, f"slot-{slot}")
+            os.makedirs(directory, exist_ok=True)
+            fd = os.open(os.path.join(directory, _LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return directory, fd
+        raise RuntimeError(f"No free spool slots in {base_dir} (max {max_slots})")
+    
+    def _segment_path(self, seq: int, directory: Optional[str] = None) -> str:
+        return os.path.join(directory or self.directory, f"{_SEGMENT_PREFIX}{seq:012d}{_SEGMENT_SUFFIX}")
+    
+    def _list_segments(self, directory: Optional[str] = None) -> List[int]:
+        segments = []
+        for name in os.listdir(directory or self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                segments.append(int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]))
+        return sorted(segments)
+    
+    @staticmethod
+    def _load_cursor(directory: str, segments: List[int]) -> SpoolPosition:
+        try:
+            with open(os.path.join(directory, _CURSOR_FILE)) as f:
+                data = json.load(f)
+            cursor = (int(data['segment']), int(data['offset']))
+        except (OSError, ValueError, KeyError):
+            cursor = (0, 0)
+        
+        # Курсор указывает на удалённый сегмент — начинаем с самого старого
+        if segments and cursor[0] < segments[0]:
+            cursor = (segments[0], 0)
+        return cursor
+    
+    def _save_cursor(self, cursor: SpoolPosition) -> None:
+        path = os.path.join(self.directory, _CURSOR_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'segment': cursor[0], 'offset': cursor[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def _open_active_segment(self) -> None:
+        self._active_fd = os.open(
+            self._segment_path(self._active_seq),
+            os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+            0o644
+        )
+        self._active_size = 0
+    
+    def _rotate(self) -> None:
+        """Закрыть текущий сегмент и начать новый (под self._lock)"""
+        if self.fsync != FSYNC_NEVER:
+            os.fsync(self._active_fd)
+        os.close(self._active_fd)
+        self._active_seq += 1
+        self._open_active_segment()
+    
+    # --- Запись ---
+    
+    def append(self, body: bytes, headers: Optional[dict], content_type: str) -> None:
+        """
+        Дописать сообщение в спул
+        
+        Args:
+            body: Тело сообщения
+            headers: Заголовки сообщения
+            content_type: Формат тела, с которым сообщение будет опубликовано
+        
+        Raises:
+            SpoolFullError: спул заполнен
+        """
+        record = self._encode(body, headers, content_type)
+        with self._lock:
+            if self._total_bytes + len(record) > self.max_bytes:
+                raise SpoolFullError(f"Spool is full ({self._total_bytes} bytes)")
+            self._write(record)
+    
+    @staticmethod
+    def _encode(body: bytes, headers: Optional[dict], content_type: str) -> bytes:
+        meta_json = json.dumps({'content_type': content_type, 'headers': headers or {}}).encode('utf-8')
+        data = _META_LENGTH.pack(len(meta_json)) + meta_json + body
+        return _RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+    
+    def _write(self, record: bytes) -> None:
+        """Запись готовой записи в активный сегмент (под self._lock)"""
+        if self._active_size >= self.segment_bytes:
+            self._rotate()
+        
+        # Одна запись одним write: читатель не увидит половину записи
+        os.write(self._active_fd, record)
+        self._active_size += len(record)
+        self._total_bytes += len(record)
+        
+        now = time.monotonic()
+        if self.fsync == FSYNC_ALWAYS or (
+            self.fsync == FSYNC_INTERVAL and now - self._last_fsync >= self.fsync_interval
+        ):
+            os.fsync(self._active_fd)
+            self._last_fsync = now
+    
+    def pending_bytes(self) -> int:
+        """Сколько байт ещё не вычитано"""
+        with self._lock:
+            # Сегмент курсора — самый старый из оставшихся на диске
+            return max(self._total_bytes - self._cursor[1], 0)
+    
+    # --- Осиротевшие слоты ---
+    
+    def adopt_orphans(self) -> int:
+        """
+        Переложить в свой спул сообщения из слотов, которые никто не занял
+        
+        После уменьшения числа процессов их слоты больше никто не дренирует.
+        Свободный слот (flock удаётся взять) с недоотправленными сообщениями
+        дописывается в конец своего спула без учёта max_bytes, после чего
+        его сегменты и курсор удаляются. При падении посреди переноса
+        сообщения будут опубликованы повторно, но не потеряны.
+        
+        Returns:
+            Сколько сообщений перенесено
+        """
+        adopted = 0
+        for slot in range(self.max_slots):
+            directory = os.path.join(self.base_dir, f"slot-{slot}")
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            fd = os.open(os.path.join(directory, _LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Слот занят живым процессом
+                os.close(fd)
+                continue
+            try:
+                adopted += self._adopt_slot(directory)
+            except OSError as e:
+                logger.error(f"Failed to adopt spool slot {directory}: {e}")
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+        return adopted
+    
+    def _adopt_slot(self, directory: str) -> int:
+        """Перенос недоотправленных сообщений слота directory (его flock уже взят)"""
+        segments = self._list_segments(directory)
+        if not segments:
+            return 0
+        
+        cursor_seq, cursor_offset = self._load_cursor(directory, segments)
+        adopted = 0
+        for seq in segments:
+            if seq < cursor_seq:
+                continue
+            path = self._segment_path(seq, directory)
+            offset = cursor_offset if seq == cursor_seq else 0
+            end = os.path.getsize(path)
+            while offset < end:
+                records: List[SpoolRecord] = []
+                offset = self._read_segment(path, seq, offset, end, 1000, records, [])
+                with self._lock:
+                    for body, headers, content_type in records:
+                        self._write(self._encode(body, headers, content_type))
+                adopted += len(records)
+        
+        if adopted:
+            # Перенесённое должно лечь на диск раньше, чем исчезнет оригинал
+            with self._lock:
+                if self.fsync != FSYNC_NEVER:
+                    os.fsync(self._active_fd)
+            logger.warning(f"Adopted {adopted} messages from orphaned spool slot {directory}")
+        
+        for seq in segments:
+            os.remove(self._segment_path(seq, directory))
+        cursor_path = os.path.join(directory, _CURSOR_FILE)
+        if os.path.exists(cursor_path):
+            os.remove(cursor_path)
+        return adopted
+    
+    # --- Чтение ---
+    
+    def read(self, max_records: int) -> Tuple[List[SpoolRecord], List[SpoolPosition]]:
+        """
+        Прочитать до max_records сообщений начиная с курсора
+        
+        Returns:
+            (сообщения, позиция после каждого сообщения для commit())
+        """
+        records: List[SpoolRecord] = []
+        positions: List[SpoolPosition] = []
+        seq, offset = self._cursor
+        
+        while len(records) < max_records:
+            with self._lock:
+                active_seq, active_size = self._active_seq, self._active_size
+            
+            path = self._segment_path(seq)
+            if seq < active_seq:
+                if not os.path.exists(path):
+                    seq, offset = seq + 1, 0
+                    continue
+                end = os.path.getsize(path)
+            else:
+                # Активный сегмент читаем только до уже записанных байт
+                end = active_size
+            
+            if offset < end:
+                offset = self._read_segment(path, seq, offset, end, max_records - len(records),
+                                            records, positions)
+            
+            if offset < end or seq >= active_seq:
+                break
+            
+            # Сегмент вычитан полностью — commit() переведёт курсор в следующий
+            seq, offset = seq + 1, 0
+            if positions:
+                positions[-1] = (seq, 0)
+            else:
+                self._commit_position((seq, 0))
+        
+        return records, positions
+    
+    def _read_segment(self, path: str, seq: int, offset: int, end: int, limit: int,
+                      records: List[SpoolRecord], positions: List[SpoolPosition]) -> int:
+        """Чтение до limit записей сегмента из [offset, end), возвращает новое смещение"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for _ in range(limit):
+                if offset >= end:
+                    break
+                
+                header = f.read(_RECORD_HEADER.size)
+                length, crc = _RECORD_HEADER.unpack(header) if len(header) == _RECORD_HEADER.size else (0, 0)
+                data = f.read(length)
+                if not length or len(data) < length or zlib.crc32(data) != crc:
+                    # Хвост, оборванный при падении процесса: пропускаем до конца сегмента
+                    logger.error(f"Corrupted spool record in {path} at offset {offset}, skipping segment tail")
+                    if positions:
+                        positions[-1] = (seq, end)
+                    return end
+                
+                meta_end = _META_LENGTH.size + _META_LENGTH.unpack_from(data)[0]
+                meta = json.loads(data[_META_LENGTH.size:meta_end].decode('utf-8'))
+                records.append((data[meta_end:], meta['headers'], meta['content_type']))
+                
+                offset += _RECORD_HEADER.size + length
+                positions.append((seq, offset))
+        return offset
+    
+    def commit(self, position: SpoolPosition) -> None:
+        """Сдвинуть курсор: всё до position опубликовано"""
+        self._commit_position(position)
+    
+    def _commit_position(self, position: SpoolPosition) -> None:
+        with self._lock:
+            self._cursor = position
+            
+            # Активный сегмент вычитан до конца — ротируем, чтобы его можно было удалить
+            if position == (self._active_seq, self._active_size) and self._active_size:
+                self._rotate()
+                self._cursor = (self._active_seq, 0)
+            
+            self._save_cursor(self._cursor)
+            self._drop_segments_before(self._cursor[0])
+    
+    def _drop_segments_before(self, seq: int) -> None:
+        """Удалить сегменты, полностью вычитанные курсором (под self._lock)"""
+        for old_seq in self._list_segments():
+            if old_seq >= seq:
+                break
+            path = self._segment_path(old_seq)
+            self._total_bytes -= os.path.getsize(path)
+            os.remove(path)
+    
+    def close(self) -> None:
+        """Сброс на диск и освобождение слота"""
+        with self._lock:
+            if self._active_fd is not None:
+                if self.fsync != FSYNC_NEVER:
+                    os.fsync(self._active_fd)
+                os.close(self._active_fd)
+                self._active_fd = None
+        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        os.close(self._lock_fd)
+
+
+class SpoolDrainer:
+    """
+    Фоновая републикация сообщений из спула
+    
+    Сообщения читаются пачками по порядку записи; курсор сдвигается только
+    до первого неопубликованного сообщения, так что порядок сохраняется,
+    а при сбое пачка повторяется (возможны дубликаты, их поглощает
+    идемпотентность по event_id).
+    """
+    
+    def __init__(self,
+                 spool: Spool,
+                 publish: Callable[[List[SpoolRecord]], List[Optional[Exception]]],
+                 batch_size: int = 500,
+                 interval: float = 1.0,
+                 max_backoff: float = 30.0,
+                 adopt_interval: float = 30.0):
+        """
+        Инициализация дренажа
+        
+        Args:
+            spool: Спул
+            publish: Публикация пачки, возвращает ошибку по каждому сообщению
+            batch_size: Размер читаемой пачки
+            interval: Пауза, когда спул пуст (секунды)
+            max_backoff: Максимальная пауза после неудачной публикации (секунды)
+            adopt_interval: Как часто искать осиротевшие слоты, пока спул пуст (секунды)
+        """
+        self.spool = spool
+        self.publish = publish
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.adopt_interval = adopt_interval
+        
+        self._next_adopt = time.monotonic() + adopt_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> None:
+        """Запуск фонового потока дренажа"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="spool-drainer", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Остановка дренажа; недоотправленное остаётся на диске"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.max_backoff)
+            self._thread = None
+    
+    def drain_once(self) -> Tuple[int, bool]:
+        """
+        Публикация одной пачки из спула
+        
+        Returns:
+            (сколько сообщений опубликовано, была ли ошибка)
+        """
+        records, positions = self.spool.read(self.batch_size)
+        if not records:
+            return 0, False
+        
+        try:
+            errors = self.publish(records)
+        except Exception as e:
+            errors = [e] * len(records)
+        
+        published = 0
+        for error in errors:
+            if error is not None:
+                break
+            published += 1
+        
+        if published:
+            self.spool.commit(positions[published - 1])
+        if published < len(records):
+            logger.warning(f"Spool drain stopped after {published}/{len(records)} messages: {errors[published]}")
+            return published, True
+        return published, False
+    
+    def _run(self) -> None:
+        backoff = self.interval
+        while not self._stop_event.is_set():
+            try:
+                published, failed = self.drain_once()
+            except Exception as e:
+                logger.error(f"Spool drain failed: {e}")
+                published, failed = 0, True
+            
+            if published:
+                logger.info(f"Drained {published} messages from spool, {self.spool.pending_bytes()} bytes left")
+            
+            if failed:
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            
+            backoff = self.interval
+            if not published:
+                self._maybe_adopt()
+                self._stop_event.wait(self.interval)
+    
+    def _maybe_adopt(self) -> None:
+        """Периодический поиск слотов процессов, которых больше нет"""
+        now = time.monotonic()
+        if now < self._next_adopt:
+            return
+        self._next_adopt = now + self.adopt_interval
+        try:
+            self.spool.adopt_orphans()
+        except Exception as e:
+            logger.error(f"Spool orphan adoption failed: {e}")
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from shared.models import IncomingEvent
+
+# Те же ограничения, что в полях IncomingEvent
+_MAX_TEXT_LENGTH = 100
+_MAX_FUTURE_SECONDS = 300
+
+_FIELDS = frozenset(IncomingEvent.__fields__)
+
+
+class _Fallback(Exception):
+    """Значение не в каноничном виде — решение за pydantic"""
+
+
+def _text(value: Any) -> str:
+    if type(value) is not str or not 1 <= len(value) <= _MAX_TEXT_LENGTH:
+        raise _Fallback()
+    return value
+
+
+def _occurred_at(value: Any, now: datetime) -> datetime:
+    """Повторяет validate_occurred_at_format + check_occurred_at_not_in_future"""
+    if type(value) is str:
+        try:
+            value = datetime.fromisoformat(value.rstrip('Z'))
+        except ValueError:
+            raise _Fallback()
+    elif type(value) is not datetime:
+        raise _Fallback()
+    
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    else:
+        value = value.astimezone(timezone.utc)
+    
+    if value > now and (value - now).total_seconds() > _MAX_FUTURE_SECONDS:
+        raise _Fallback()
+    return value
+
+
+def _fast_values(raw_data: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """Провалидированные значения полей или _Fallback"""
+    values = {}
+    
+    if 'event_id' in raw_data:
+        event_id = raw_data['event_id']
+        if event_id is not None and type(event_id) is not str:
+            raise _Fallback()
+        values['event_id'] = event_id
+    
+    schema_version = raw_data.get('schema_version')
+    if type(schema_version) is not int or schema_version < 1:
+        raise _Fallback()
+    values['schema_version'] = schema_version
+    
+    values['event_type'] = _text(raw_data.get('event_type'))
+    values['source'] = _text(raw_data.get('source'))
+    values['occurred_at'] = _occurred_at(raw_data.get('occurred_at'), now)
+    
+    if 'payload' in raw_data:
+        payload = raw_data['payload']
+        if type(payload) is not dict:
+            raise _Fallback()
+        for key in payload:
+            if type(key) is not str:
+                raise _Fallback()
+        values['payload'] = dict(payload)
+    
+    return values
+
+
+def validate_event(raw_data: Dict[str, Any], now: Optional[datetime] = None) -> IncomingEvent:
+    """
+    Валидация конверта события без построения модели через pydantic
+    
+    Каноничные значения (строки, int, ISO-время, payload-объект) проверяются
+    напрямую и модель собирается через IncomingEvent.construct(). Всё
+    остальное — приведения типов и любые ошибки — передаётся в
+    IncomingEvent(**raw_data), поэтому результат и ValidationError
+    совпадают с pydantic.
+    
+    Args:
+        raw_data: Разобранное тело события
+        now: Текущее время (UTC) для проверки occurred_at; общее на пачку
+    
+    Returns:
+        IncomingEvent
+    
+    Raises:
+        ValidationError: событие не прошло валидацию
+    """
+    if type(raw_data) is not dict:
+        return IncomingEvent(**raw_data)
+    if now is None:
+        now = datetime.now(timezone.utc)
+    
+    try:
+        values = _fast_values(raw_data, now)
+    except _Fallback:
+        return IncomingEvent(**raw_data)
+    
+    return IncomingEvent.construct(_fields_set=_FIELDS.intersection(raw_data), **values)
+
@@ -26,4 +26,17 @@ COMMENT ON COLUMN events.source IS 'Источник события (напри
 COMMENT ON COLUMN events.occurred_at IS 'Время возникновения события в системе-источнике';
 COMMENT ON COLUMN events.payload IS 'Тело события в формате JSONB';
 COMMENT ON COLUMN events.created_at IS 'Время создания записи в БД';
-COMMENT ON COLUMN events.updated_at IS 'Время последнего обновления записи';
\ No newline at end of file
+COMMENT ON COLUMN events.updated_at IS 'Время последнего обновления записи';
+
+-- Outbox проекции в MySQL: новые события ставятся сюда в той же транзакции,
+-- что и INSERT в events (OUTBOX_ENABLED=true), проектор (python -m worker.projector)
+-- переносит их в MySQL и удаляет
+CREATE TABLE IF NOT EXISTS events_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    event_id VARCHAR(255) NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE events_outbox IS 'Очередь событий для проекции в MySQL';
+COMMENT ON COLUMN events_outbox.attempts IS 'Неудачные попытки проекции';
\ No newline at end of file
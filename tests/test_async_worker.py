@@ -0,0 +1,129 @@
+"""Тесты асинхронного воркера: каналы, пул PostgreSQL и aio-pika подменены"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import worker.async_worker as async_worker
+from shared.rabbit import ATTEMPT_HEADER, RetryPolicy
+from worker.async_worker import AsyncEventWorker
+
+EVENT = {
+    'event_id': '00000000-0000-0000-0000-000000000001',
+    'schema_version': 1,
+    'event_type': 'purchase',
+    'source': 'web',
+    'occurred_at': '2024-01-01T00:00:00Z',
+    'payload': {'amount': 1}
+}
+
+
+class FakeMessage:
+    def __init__(self, body, headers=None, content_type='application/json'):
+        self.body = body
+        self.headers = headers or {}
+        self.content_type = content_type
+        self.delivery_tag = 1
+        self.settled = []
+    
+    async def ack(self):
+        self.settled.append('ack')
+    
+    async def reject(self, requeue=False):
+        self.settled.append(('reject', requeue))
+
+
+class FakeExchange:
+    def __init__(self):
+        self.published = []
+    
+    async def publish(self, message, routing_key):
+        self.published.append((routing_key, message))
+
+
+class FakePool:
+    def __init__(self, result=1, error=None):
+        self.result = result
+        self.error = error
+        self.calls = []
+    
+    async def fetchval(self, sql, *args):
+        self.calls.append((sql, args))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def fake_aio_pika(monkeypatch):
+    monkeypatch.setattr(async_worker, 'aio_pika', SimpleNamespace(
+        Message=lambda **kwargs: SimpleNamespace(**kwargs),
+        DeliveryMode=SimpleNamespace(PERSISTENT=2)
+    ))
+
+
+def make_worker(pool, retry=None):
+    worker = AsyncEventWorker()
+    worker.pg_pool = pool
+    worker.channel = SimpleNamespace(default_exchange=FakeExchange())
+    worker.retry = retry
+    return worker
+
+
+def process(worker, message):
+    asyncio.run(worker.process_message(message))
+    return worker.channel.default_exchange.published
+
+
+def test_valid_event_is_inserted_and_acked():
+    worker = make_worker(FakePool(result=42))
+    message = FakeMessage(json.dumps(EVENT).encode('utf-8'))
+    
+    assert process(worker, message) == []
+    assert message.settled == ['ack']
+    sql, args = worker.pg_pool.calls[0]
+    assert 'ON CONFLICT (event_id)' in sql
+    assert args[0] == EVENT['event_id']
+    assert json.loads(args[5]) == EVENT['payload']
+
+
+def test_invalid_event_goes_to_dlq_and_is_rejected():
+    worker = make_worker(FakePool())
+    message = FakeMessage(b'{not json', headers={'correlation_id': 'corr-1'})
+    
+    published = process(worker, message)
+    
+    assert message.settled == [('reject', False)]
+    assert worker.pg_pool.calls == []
+    routing_key, dlq_message = published[0]
+    assert routing_key == worker.config.RABBIT_QUEUE_DLQ
+    assert json.loads(dlq_message.body)['error_info']['correlation_id'] == 'corr-1'
+
+
+def test_transient_error_is_scheduled_for_retry():
+    worker = make_worker(FakePool(error=ConnectionRefusedError("pg down")), RetryPolicy([1000, 5000], 3))
+    message = FakeMessage(json.dumps(EVENT).encode('utf-8'), content_type='application/json; charset=utf-8')
+    
+    published = process(worker, message)
+    
+    assert message.settled == ['ack']
+    routing_key, retry_message = published[0]
+    assert routing_key == 'events.retry.1000'
+    assert retry_message.headers[ATTEMPT_HEADER] == 2
+    assert retry_message.content_type == 'application/json; charset=utf-8'
+
+
+def test_exhausted_retries_go_to_dlq():
+    worker = make_worker(FakePool(error=ConnectionRefusedError("pg down")), RetryPolicy([1000], 2))
+    message = FakeMessage(json.dumps(EVENT).encode('utf-8'), headers={ATTEMPT_HEADER: 2})
+    
+    published = process(worker, message)
+    
+    assert message.settled == [('reject', False)]
+    routing_key, dlq_message = published[0]
+    assert routing_key == worker.config.RABBIT_QUEUE_DLQ
+    error_info = json.loads(dlq_message.body)['error_info']
+    assert error_info['reason'] == 'max_attempts_exceeded'
+    assert error_info['attempts'] == 2
@@ -0,0 +1,69 @@
+"""Тесты построчного чтения тела потокового приёма"""
+
+import io
+import threading
+import time
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+from api.body import NO_LINE, TimedLineReader, iter_lines
+
+
+def test_iter_lines_replaces_long_line_with_none():
+    stream = io.BytesIO(b'{"a": 1}\n' + b'x' * 100 + b'\n{"b": 2}\n')
+    
+    assert list(iter_lines(stream, 20)) == [b'{"a": 1}\n', None, b'{"b": 2}\n']
+
+
+def test_reader_reports_idle_client_within_timeout():
+    release = threading.Event()
+    
+    def slow_lines():
+        yield b'first\n'
+        # Клиент молчит, пока тест не разрешит прислать следующую строку
+        release.wait(5)
+        yield b'second\n'
+    
+    reader = TimedLineReader(slow_lines())
+    received = []
+    started = time.monotonic()
+    for line in reader.lines(lambda: 0.05):
+        received.append(line)
+        if line is NO_LINE:
+            idle_after = time.monotonic() - started
+            release.set()
+    reader.close()
+    
+    assert received[:2] == [b'first\n', NO_LINE]
+    assert received[-1] == b'second\n'
+    assert idle_after < 1.0
+
+
+def test_reader_without_timeout_waits_for_lines():
+    reader = TimedLineReader(iter([b'a\n', None, b'b\n']))
+    
+    assert list(reader.lines(lambda: None)) == [b'a\n', None, b'b\n']
+
+
+def test_reader_reraises_stream_errors():
+    def broken_lines():
+        yield b'a\n'
+        raise BadRequest("Invalid compressed body")
+    
+    reader = TimedLineReader(broken_lines())
+    lines = reader.lines(lambda: None)
+    
+    assert next(lines) == b'a\n'
+    with pytest.raises(BadRequest):
+        next(lines)
+
+
+def test_closed_reader_stops_background_thread():
+    reader = TimedLineReader(iter([b'%d\n' % i for i in range(100)]), max_buffered=1)
+    lines = reader.lines(lambda: None)
+    next(lines)
+    reader.close()
+    
+    reader._thread.join(1.0)
+    assert not reader._thread.is_alive()
@@ -0,0 +1,147 @@
+"""Тесты загрузчика COPY: подготовка порций, перенос в events, контрольные точки"""
+
+import io
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import psycopg2
+import pytest
+
+from scripts.bulk_load import Chunk, _copy_row, load_file, prepare_chunk
+
+NOW = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+
+def event_line(event_id, **overrides):
+    data = {
+        'event_id': event_id,
+        'schema_version': 1,
+        'event_type': 'purchase',
+        'source': 'web',
+        'occurred_at': '2024-01-01T00:00:00Z',
+        'payload': {'amount': 1}
+    }
+    data.update(overrides)
+    return json.dumps(data).encode('utf-8') + b'\n'
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def copy_expert(self, sql, stream):
+        if self.conn.fail_on_copy == len(self.conn.copies):
+            raise psycopg2.OperationalError("server closed the connection")
+        self.conn.staging = [line.split('\t')[0] for line in stream.read().decode('utf-8').splitlines()]
+        self.conn.copies.append(list(self.conn.staging))
+    
+    def execute(self, sql):
+        # INSERT ... SELECT DISTINCT ON (event_id) ... ON CONFLICT DO NOTHING
+        new_ids = set(self.conn.staging) - self.conn.events
+        self.conn.events |= new_ids
+        self.rowcount = len(new_ids)
+
+
+class FakeConn:
+    def __init__(self, events=(), fail_on_copy=None):
+        self.events = set(events)
+        self.fail_on_copy = fail_on_copy
+        self.staging = []
+        self.copies = []
+        self.commits = 0
+        self.rollbacks = 0
+    
+    def cursor(self):
+        return FakeCursor(self)
+    
+    def commit(self):
+        self.commits += 1
+    
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def run(path, conn, restart=False):
+    args = SimpleNamespace(restart=restart, chunk_lines=2, workers=0, report_interval=3600)
+    return load_file(str(path), conn, args, io.StringIO())
+
+
+def test_copy_row_escapes_text_format():
+    row = _copy_row({
+        'event_id': 'e1',
+        'schema_version': 1,
+        'event_type': 'purchase',
+        'source': 'tab\there',
+        'occurred_at': '2024-01-01T00:00:00Z',
+        'payload': {'note': 'back\\slash'}
+    }, NOW)
+    
+    columns = row.rstrip('\n').split('\t')
+    assert columns[:4] == ['e1', '1', 'purchase', 'tab\\there']
+    assert columns[4] == '2024-01-01T00:00:00+00:00'
+    assert json.loads(columns[5].replace('\\\\', '\\')) == {'note': 'back\\slash'}
+
+
+def test_prepare_chunk_collects_rejects_with_offsets():
+    lines = [event_line('e1'), b'\n', b'{broken\n', event_line(None), event_line('e2', schema_version=0)]
+    
+    end, data, row_count, rejects = prepare_chunk(Chunk(100, 100 + sum(map(len, lines)), lines))
+    
+    assert end == 100 + sum(map(len, lines))
+    assert row_count == 1
+    assert data.startswith(b'e1\t1\t')
+    assert [(reject['offset'], reject['reason']) for reject in rejects] == [
+        (100 + len(lines[0]) + 1, 'invalid_json'),
+        (100 + sum(map(len, lines[:3])), 'validation_error'),
+        (100 + sum(map(len, lines[:4])), 'validation_error'),
+    ]
+
+
+def test_existing_events_are_not_counted_as_new(tmp_path):
+    path = tmp_path / 'events.ndjson'
+    path.write_bytes(event_line('e1') + event_line('e2') + event_line('e2') + event_line('e3'))
+    conn = FakeConn(events={'e1'})
+    
+    run(path, conn)
+    
+    checkpoint = json.loads((tmp_path / 'events.ndjson.checkpoint').read_text())
+    assert checkpoint['copied'] == 4
+    assert checkpoint['inserted'] == 2
+    assert conn.events == {'e1', 'e2', 'e3'}
+
+
+def test_resume_from_checkpoint_after_failed_copy(tmp_path):
+    path = tmp_path / 'events.ndjson'
+    lines = [event_line(f'e{i}') for i in range(5)]
+    path.write_bytes(b''.join(lines))
+    
+    failing = FakeConn(fail_on_copy=1)
+    with pytest.raises(SystemExit):
+        run(path, failing)
+    assert failing.rollbacks == 1
+    
+    checkpoint = json.loads((tmp_path / 'events.ndjson.checkpoint').read_text())
+    assert checkpoint['offset'] == len(lines[0]) + len(lines[1])
+    assert checkpoint['inserted'] == 2
+    
+    # Повторный запуск продолжает с порции, на которой упал COPY
+    conn = FakeConn(events=failing.events)
+    run(path, conn)
+    assert conn.copies == [['e2', 'e3'], ['e4']]
+    
+    checkpoint = json.loads((tmp_path / 'events.ndjson.checkpoint').read_text())
+    assert checkpoint['offset'] == path.stat().st_size
+    assert checkpoint['inserted'] == 5
+    
+    # --restart начинает файл заново
+    conn = FakeConn(events=conn.events)
+    run(path, conn, restart=True)
+    assert len(conn.copies) == 3
@@ -0,0 +1,68 @@
+"""Тесты кодирования тел сообщений"""
+
+import pytest
+
+from shared.codec import (
+    CONTENT_TYPE_JSON,
+    CONTENT_TYPE_MSGPACK,
+    MessageDecodeError,
+    decode_message,
+    encode_message,
+    msgpack,
+)
+
+EVENT = {
+    'event_id': '00000000-0000-0000-0000-000000000001',
+    'event_type': 'purchase',
+    'payload': {'amount': 10.5, 'items': [1, 2], 'note': 'привет'},
+}
+
+
+def test_json_is_compact_and_round_trips():
+    body = encode_message(EVENT, CONTENT_TYPE_JSON)
+    
+    assert b', ' not in body and b': ' not in body
+    assert decode_message(body, CONTENT_TYPE_JSON) == EVENT
+
+
+def test_json_falls_back_for_values_orjson_rejects():
+    data = {'payload': {'big': 2 ** 70}}
+    
+    assert decode_message(encode_message(data)) == data
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+def test_msgpack_round_trips():
+    body = encode_message(EVENT, CONTENT_TYPE_MSGPACK)
+    
+    assert decode_message(body, CONTENT_TYPE_MSGPACK) == EVENT
+
+
+def test_invalid_body_reason():
+    with pytest.raises(MessageDecodeError) as error:
+        decode_message(b'{not json', CONTENT_TYPE_JSON)
+    assert error.value.reason == 'invalid_json'
+
+
+@pytest.mark.parametrize('content_type', [
+    'application/json; charset=utf-8',
+    'Application/JSON',
+    'text/plain',
+    'application/octet-stream',
+    None,
+])
+def test_non_msgpack_types_decode_as_json(content_type):
+    assert decode_message(b'{"a": 1}', content_type) == {'a': 1}
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+def test_parameterised_msgpack_type():
+    body = encode_message(EVENT, CONTENT_TYPE_MSGPACK)
+    
+    assert decode_message(body, 'application/x-msgpack; v=1') == EVENT
+
+
+def test_unknown_type_with_bad_body_is_invalid_json():
+    with pytest.raises(MessageDecodeError) as error:
+        decode_message(b'\x81\xa1a', 'text/plain')
+    assert error.value.reason == 'invalid_json'
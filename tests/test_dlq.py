@@ -0,0 +1,57 @@
+"""Тесты копий в DLQ через постоянный публикатор с подтверждениями"""
+
+import json
+from concurrent.futures import Future
+
+from shared.rabbit import DLQ_QUEUE
+from worker.handlers import handle_event_batch, handle_event_with_dlq
+
+
+class DeferredPublisher:
+    """Подтверждает копии, только когда отправлены все expected штук"""
+    
+    confirm_timeout = 0.2
+    
+    def __init__(self, expected):
+        self.expected = expected
+        self.submitted = []
+    
+    def submit(self, queue_name, body, headers=None, content_type=None):
+        future = Future()
+        self.submitted.append((queue_name, body, headers, future))
+        if len(self.submitted) == self.expected:
+            for *_, pending in self.submitted:
+                pending.set_running_or_notify_cancel()
+                pending.set_result(True)
+        return future
+
+
+def test_invalid_message_goes_to_dlq_through_publisher():
+    publisher = DeferredPublisher(expected=1)
+    
+    assert handle_event_with_dlq(b'{not json', pg_client=None, publisher=publisher) is False
+    
+    queue_name, body, _, future = publisher.submitted[0]
+    assert queue_name == DLQ_QUEUE
+    assert json.loads(body)['original_message'] == '{not json'
+    assert future.result(timeout=0) is True
+
+
+def test_batch_submits_all_dlq_copies_before_waiting():
+    publisher = DeferredPublisher(expected=3)
+    messages = [(b'{bad %d' % i, 'application/json', f'corr-{i}', {}) for i in range(3)]
+    
+    results = handle_event_batch(messages, pg_client=None, publisher=publisher)
+    
+    assert results == [False, False, False]
+    assert [queue_name for queue_name, *_ in publisher.submitted] == [DLQ_QUEUE] * 3
+    assert [json.loads(body)['error_info']['correlation_id'] for _, body, _, _ in publisher.submitted] == [
+        'corr-0', 'corr-1', 'corr-2'
+    ]
+
+
+def test_unconfirmed_dlq_copy_still_rejects_message():
+    publisher = DeferredPublisher(expected=99)
+    
+    assert handle_event_with_dlq(b'{not json', pg_client=None, publisher=publisher) is False
+    assert len(publisher.submitted) == 1
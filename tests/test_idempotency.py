@@ -0,0 +1,92 @@
+"""Тесты фильтра недавно записанных event_id (worker.seen_filter)"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import worker.seen_filter as seen_filter
+from worker.seen_filter import SeenIdsFilter
+
+
+@pytest.fixture
+def filter_path(tmp_path):
+    return str(tmp_path / 'seen.bf')
+
+
+def test_added_ids_are_always_found(filter_path):
+    seen = SeenIdsFilter(filter_path, capacity=1000)
+    ids = [f'event-{i}' for i in range(500)]
+    
+    assert seen.add_many(ids) == 500
+    assert all(seen.might_contain(event_id) for event_id in ids)
+    assert not seen.might_contain(None)
+    seen.close()
+
+
+def test_rotation_by_size_keeps_previous_generation(filter_path):
+    seen = SeenIdsFilter(filter_path, capacity=2, rotate_after=3600)
+    seen.add_many(['a', 'b'])
+    
+    # Текущее поколение заполнено: c открывает новое, a и b ещё помнятся
+    seen.add('c')
+    assert seen.current == 1
+    assert seen.might_contain('a') and seen.might_contain('c')
+    
+    # Следующая ротация очищает поколение с a и b
+    seen.add_many(['d', 'e'])
+    assert seen.current == 0
+    assert seen.counts == [1, 2]
+    assert seen.might_contain('c') and seen.might_contain('e')
+    seen.close()
+
+
+def test_rotation_by_age(filter_path, monkeypatch):
+    seen = SeenIdsFilter(filter_path, capacity=1000, rotate_after=60)
+    seen.add('a')
+    
+    later = time.time() + 61
+    monkeypatch.setattr(seen_filter, 'time', SimpleNamespace(time=lambda: later, monotonic=time.monotonic))
+    seen.add('b')
+    
+    assert seen.current == 1
+    assert seen.counts == [1, 1]
+    seen.close()
+
+
+def test_bits_survive_reopen(filter_path):
+    seen = SeenIdsFilter(filter_path, capacity=1000)
+    seen.add_many(['a', 'b'])
+    seen.close()
+    
+    reopened = SeenIdsFilter(filter_path, capacity=1000)
+    assert not reopened.fresh
+    assert reopened.might_contain('a') and reopened.might_contain('b')
+    assert reopened.stats()['ids'] == 2
+    reopened.close()
+
+
+def test_changed_size_recreates_file(filter_path):
+    seen = SeenIdsFilter(filter_path, capacity=1000)
+    seen.add('a')
+    seen.close()
+    
+    resized = SeenIdsFilter(filter_path, capacity=5000)
+    assert resized.fresh
+    assert resized.stats()['ids'] == 0
+    resized.close()
+
+
+def test_second_process_takes_next_slot(filter_path):
+    first = SeenIdsFilter(filter_path, capacity=1000)
+    second = SeenIdsFilter(filter_path, capacity=1000)
+    
+    assert first.path == filter_path
+    assert second.path == filter_path + '.1'
+    
+    second.close()
+    first.close()
+    # Освобождённый слот снова берёт первый по порядку
+    again = SeenIdsFilter(filter_path, capacity=1000)
+    assert again.path == filter_path
+    again.close()
@@ -0,0 +1,83 @@
+"""Тесты пула продюсеров RabbitMQ без брокера"""
+
+import threading
+
+import pika
+import pytest
+
+import shared.rabbit as rabbit
+from shared.rabbit import RabbitMQProducerPool
+
+
+class FakeProducer:
+    created = []
+    
+    def __init__(self, rabbit_url):
+        self.connection = object()
+        self.channel = object()
+        self.published = []
+        self.failures = 0
+        self.closed = 0
+        FakeProducer.created.append(self)
+    
+    def publish(self, queue_name, message_body, headers=None, content_type=None):
+        if self.failures:
+            self.failures -= 1
+            raise pika.exceptions.AMQPConnectionError("connection reset")
+        self.published.append(message_body)
+    
+    def close(self):
+        self.closed += 1
+
+
+@pytest.fixture(autouse=True)
+def fake_producer(monkeypatch):
+    FakeProducer.created = []
+    monkeypatch.setattr(rabbit, 'RabbitMQProducer', FakeProducer)
+
+
+def test_idle_producer_is_reused():
+    pool = RabbitMQProducerPool('amqp://unused', size=4)
+    
+    pool.publish('events', b'1')
+    pool.publish('events', b'2')
+    
+    assert len(FakeProducer.created) == 1
+    assert FakeProducer.created[0].published == [b'1', b'2']
+
+
+def test_pool_is_bounded():
+    pool = RabbitMQProducerPool('amqp://unused', size=2, acquire_timeout=0.05)
+    release = threading.Event()
+    acquired = threading.Barrier(3)
+    
+    def hold():
+        with pool.acquire():
+            acquired.wait()
+            release.wait(5)
+    
+    holders = [threading.Thread(target=hold) for _ in range(2)]
+    for thread in holders:
+        thread.start()
+    acquired.wait()
+    
+    with pytest.raises(RuntimeError, match="pool exhausted"):
+        pool.publish('events', b'x')
+    
+    release.set()
+    for thread in holders:
+        thread.join()
+    pool.publish('events', b'y')
+    assert len(FakeProducer.created) == 2
+
+
+def test_broken_connection_is_dropped_and_publish_retried():
+    pool = RabbitMQProducerPool('amqp://unused', size=1)
+    with pool.acquire() as producer:
+        producer.failures = 1
+    
+    pool.publish('events', b'1')
+    
+    assert producer.closed == 1
+    assert producer.connection is None and producer.channel is None
+    assert producer.published == [b'1']
@@ -0,0 +1,149 @@
+"""Тесты разбора outbox проектором (worker.projector) на подменённом соединении"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import shared.db_postgres as db_postgres
+from shared.db_postgres import OUTBOX_SCHEMA_SQL, PostgresClient
+from worker.projector import _CLAIM_SQL, _DELETE_SQL, _FAILED_SQL, OutboxProjector
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def execute(self, sql, params=None):
+        if sql == self.conn.fail_on:
+            raise RuntimeError("statement failed")
+        self.conn.executed.append((sql, params))
+    
+    def fetchall(self):
+        return self.conn.rows
+
+
+class FakeConn:
+    def __init__(self, rows, fail_on=None):
+        self.rows = rows
+        self.fail_on = fail_on
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+    
+    def cursor(self):
+        return FakeCursor(self)
+    
+    def commit(self):
+        self.commits += 1
+    
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeSink:
+    def __init__(self, failing=(), error=None):
+        self.failing = set(failing)
+        self.error = error
+        self.written = []
+    
+    def write(self, events):
+        self.written.append([event_data['event_id'] for event_data in events])
+        if self.error is not None:
+            raise self.error
+        return [event_data for event_data in events if event_data['event_id'] in self.failing]
+
+
+def outbox_row(outbox_id, event_id, attempts=0, stored=True):
+    return {
+        'outbox_id': outbox_id,
+        'attempts': attempts,
+        'queued_at': datetime.now(timezone.utc) - timedelta(seconds=5),
+        'event_id': event_id,
+        'event_pk': outbox_id * 10 if stored else None,
+        'event_type': 'purchase',
+        'source': 'web',
+        'occurred_at': datetime(2024, 1, 1, tzinfo=timezone.utc),
+        'payload': {}
+    }
+
+
+def make_projector(rows, sink, **conn_kwargs):
+    projector = OutboxProjector(SimpleNamespace(OUTBOX_BATCH_SIZE=100, OUTBOX_MAX_ATTEMPTS=3))
+    projector.conn = FakeConn(rows, **conn_kwargs)
+    projector.sink = sink
+    return projector
+
+
+def test_batch_deletes_projected_and_counts_failures():
+    rows = [
+        outbox_row(1, 'ok'),
+        outbox_row(2, 'orphan', stored=False),
+        outbox_row(3, 'retry', attempts=0),
+        outbox_row(4, 'give-up', attempts=2),
+    ]
+    projector = make_projector(rows, FakeSink(failing={'retry', 'give-up'}))
+    
+    assert projector.project_batch() == (4, 2)
+    
+    assert projector.sink.written == [['ok', 'retry', 'give-up']]
+    assert projector.conn.executed == [
+        (_CLAIM_SQL, (100,)),
+        (_DELETE_SQL, ([2, 1, 4],)),
+        (_FAILED_SQL, ([3],)),
+    ]
+    assert projector.conn.commits == 1
+    assert (projector.projected, projector.retried, projector.dropped) == (1, 1, 1)
+
+
+def test_sink_error_keeps_rows_for_retry():
+    projector = make_projector([outbox_row(1, 'a'), outbox_row(2, 'b')], FakeSink(error=ConnectionError("mysql down")))
+    
+    assert projector.project_batch() == (2, 2)
+    assert projector.conn.executed[1:] == [(_DELETE_SQL, ([],)), (_FAILED_SQL, ([1, 2],))]
+    assert projector.conn.commits == 1
+
+
+def test_empty_outbox_commits_claim():
+    projector = make_projector([], FakeSink())
+    
+    assert projector.project_batch() == (0, 0)
+    assert projector.sink.written == []
+    assert projector.conn.commits == 1
+
+
+def test_failed_delete_rolls_back_claim():
+    projector = make_projector([outbox_row(1, 'a')], FakeSink(), fail_on=_DELETE_SQL)
+    
+    with pytest.raises(RuntimeError):
+        projector.project_batch()
+    assert projector.conn.commits == 0
+    assert projector.conn.rollbacks == 1
+    assert projector.projected == 0
+
+
+def test_outbox_table_is_created_on_connect(monkeypatch):
+    conn = FakeConn([])
+    monkeypatch.setattr(db_postgres.psycopg2, 'connect', lambda *args, **kwargs: conn)
+    
+    PostgresClient('postgresql://unused', outbox=True).connect()
+    
+    assert conn.executed == [(OUTBOX_SCHEMA_SQL, None)]
+    assert 'CREATE TABLE IF NOT EXISTS events_outbox' in OUTBOX_SCHEMA_SQL
+    assert conn.commits == 1
+
+
+def test_plain_client_does_not_touch_outbox(monkeypatch):
+    conn = FakeConn([])
+    monkeypatch.setattr(db_postgres.psycopg2, 'connect', lambda *args, **kwargs: conn)
+    
+    PostgresClient('postgresql://unused').connect()
+    
+    assert conn.executed == []
@@ -0,0 +1,123 @@
+"""Тесты ConfirmingPublisher без брокера: канал и ioloop подменены"""
+
+from types import SimpleNamespace
+
+import pytest
+from pika.spec import Basic
+
+from shared.publisher import ConfirmingPublisher, ConfirmTimeout, PublishError, wait_confirm
+
+
+class FakeIOLoop:
+    def __init__(self):
+        self.callbacks = []
+    
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.append(callback)
+    
+    def call_later(self, delay, callback):
+        self.callbacks.append(callback)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.published = []
+    
+    def basic_publish(self, exchange, routing_key, body, properties, mandatory):
+        self.published.append((routing_key, body, properties))
+
+
+def make_publisher(**kwargs):
+    """Публикатор в состоянии "канал открыт, confirms включены" """
+    publisher = ConfirmingPublisher('amqp://unused', linger_ms=0, **kwargs)
+    publisher._connection = SimpleNamespace(ioloop=FakeIOLoop())
+    publisher._channel = FakeChannel()
+    publisher._ready = True
+    return publisher
+
+
+def confirm(publisher, delivery_tag, acked=True, multiple=False):
+    method_class = Basic.Ack if acked else Basic.Nack
+    publisher._on_confirm(SimpleNamespace(method=method_class(delivery_tag=delivery_tag, multiple=multiple)))
+
+
+def test_confirm_resolves_future():
+    publisher = make_publisher()
+    future = publisher.submit('events', b'{}')
+    publisher._flush()
+    
+    assert len(publisher._channel.published) == 1
+    assert publisher._channel.published[0][2].message_id == '1'
+    confirm(publisher, 1)
+    assert future.result(timeout=0) is True
+
+
+def test_multiple_ack_and_nack():
+    publisher = make_publisher()
+    futures = [publisher.submit('events', b'%d' % i) for i in range(3)]
+    publisher._flush()
+    
+    confirm(publisher, 2, multiple=True)
+    confirm(publisher, 3, acked=False)
+    assert futures[0].result(timeout=0) and futures[1].result(timeout=0)
+    with pytest.raises(PublishError, match="nacked"):
+        futures[2].result(timeout=0)
+    assert not publisher._outstanding
+
+
+def test_returned_message_fails():
+    publisher = make_publisher()
+    future = publisher.submit('missing', b'{}')
+    publisher._flush()
+    
+    publisher._on_return(None, SimpleNamespace(reply_text='NO_ROUTE', routing_key='missing'),
+                         SimpleNamespace(message_id='1'), b'{}')
+    confirm(publisher, 1)
+    with pytest.raises(PublishError, match="unroutable"):
+        future.result(timeout=0)
+
+
+def test_timeout_before_flush_cancels_message():
+    publisher = make_publisher()
+    future = publisher.submit('events', b'{}')
+    
+    with pytest.raises(PublishError) as error:
+        wait_confirm(future, 0.01)
+    assert not isinstance(error.value, ConfirmTimeout)
+    assert future.cancelled()
+    
+    publisher._flush()
+    assert publisher._channel.published == []
+
+
+def test_late_confirm_after_timeout_is_not_lost():
+    publisher = make_publisher()
+    future = publisher.submit('events', b'{}')
+    publisher._flush()
+    
+    # Сообщение уже в канале: отменить его нельзя, исход неизвестен
+    with pytest.raises(ConfirmTimeout):
+        wait_confirm(future, 0.01)
+    assert not future.cancelled()
+    assert not future.cancel()
+    
+    confirm(publisher, 1)
+    assert future.result(timeout=0) is True
+
+
+def test_disconnect_fails_outstanding():
+    publisher = make_publisher()
+    future = publisher.submit('events', b'{}')
+    publisher._flush()
+    
+    publisher._on_disconnect('connection reset')
+    with pytest.raises(PublishError, match="Connection lost"):
+        future.result(timeout=0)
+
+
+def test_backlog_limit():
+    publisher = make_publisher(max_pending=1)
+    publisher.submit('events', b'1')
+    future = publisher.submit('events', b'2')
+    with pytest.raises(PublishError, match="backlog is full"):
+        future.result(timeout=0)
@@ -0,0 +1,81 @@
+"""Тесты ограничителя приёма по source и event_type"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import api.ratelimit as ratelimit
+from api.ratelimit import RateLimiter, parse_limits
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_parse_limits():
+    assert parse_limits("mobile_app=100:200, web=50,") == {'mobile_app': (100.0, 200.0), 'web': (50.0, 50.0)}
+    with pytest.raises(ValueError):
+        parse_limits("100")
+
+
+def test_fractional_rate_gets_at_least_one_token(clock):
+    limits = parse_limits("slow=0.5,tiny=0.5:0.2,off=0")
+    assert limits == {'slow': (0.5, 1.0), 'tiny': (0.5, 1.0), 'off': (0.0, 0.0)}
+    limiter = RateLimiter(None, source_overrides=limits)
+    
+    assert limiter.check('slow', 't') == 0
+    assert limiter.check('slow', 't') == pytest.approx(2.0)
+    
+    clock.now += 2.0
+    assert limiter.check('slow', 't') == 0
+    assert limiter.check('off', 't') > 0
+
+
+def test_source_bucket_refills(clock):
+    limiter = RateLimiter((1, 2))
+    
+    assert limiter.check('app', 't') == 0
+    assert limiter.check('app', 't') == 0
+    assert limiter.check('app', 't') == pytest.approx(1.0)
+    
+    clock.now += 1.0
+    assert limiter.check('app', 't') == 0
+
+
+def test_event_type_throttle_keeps_source_token(clock):
+    limiter = RateLimiter((1, 2), event_type_limits={'rare': (0.001, 1)})
+    
+    assert limiter.check('app', 'rare') == 0
+    # event_type исчерпан: токен source не списывается
+    assert limiter.check('app', 'rare') > 0
+    assert limiter.check('app', 'rare') > 0
+    assert limiter.check('app', 'common') == 0
+    assert limiter.check('app', 'common') > 0
+
+
+def test_stats_top_throttled_keys(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, '_TOP_THROTTLED', 2)
+    limiter = RateLimiter(None, source_overrides={'a': (0, 0), 'b': (0, 0), 'c': (0, 0)})
+    
+    for source, times in (('a', 5), ('b', 3), ('c', 1)):
+        for _ in range(times):
+            limiter.check(source, 't')
+    
+    stats = limiter.stats()
+    assert stats['throttled'] == 9
+    assert stats['allowed'] == 0
+    assert stats['buckets'] == 3
+    # c вытесняет самый редкий ключ b и наследует его счётчик
+    assert stats['throttled_by_key'] == {'source:a': 5, 'source:c': 4}
+    assert list(stats['throttled_by_key']) == ['source:a', 'source:c']
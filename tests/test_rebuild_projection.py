@@ -0,0 +1,203 @@
+"""Тесты пересборки проекции: разбивка id-диапазона, порции и продолжение по контрольной точке"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import rebuild_projection
+from scripts.rebuild_projection import (
+    load_checkpoint,
+    prepare_checkpoint,
+    rebuild_range,
+    save_checkpoint,
+    split_range,
+)
+
+
+def covered_ids(ranges):
+    ids = []
+    for id_range in ranges:
+        ids.extend(range(id_range['start'] + 1, id_range['end'] + 1))
+    return ids
+
+
+@pytest.mark.parametrize('min_id, max_id, parts', [(1, 10, 3), (1, 10, 4), (5, 13, 4), (1, 1000, 7)])
+def test_uneven_split_covers_range_once(min_id, max_id, parts):
+    ranges = split_range(min_id, max_id, parts)
+    
+    assert len(ranges) <= parts
+    assert covered_ids(ranges) == list(range(min_id, max_id + 1))
+    assert all(r['last_id'] == r['start'] for r in ranges)
+
+
+def test_more_parts_than_ids():
+    ranges = split_range(7, 9, 8)
+    
+    assert [(r['start'], r['end']) for r in ranges] == [(6, 7), (7, 8), (8, 9)]
+
+
+def test_single_id():
+    assert split_range(42, 42, 4) == [{'start': 41, 'end': 42, 'last_id': 41}]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.itersize = None
+        self.rows = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def execute(self, sql, params):
+        last_id, end, limit = params
+        self.conn.queries.append(params)
+        self.rows = [{'id': i} for i in self.conn.ids if last_id < i <= end][:limit]
+    
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakePgConn:
+    def __init__(self, ids):
+        self.ids = sorted(ids)
+        self.queries = []
+        self.closed = False
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def cursor(self, name=None):
+        return FakeCursor(self)
+    
+    def close(self):
+        self.closed = True
+
+
+class FakeMySQLClient:
+    batches = []
+    
+    def __init__(self, url, pool_size=1):
+        pass
+    
+    def connect(self):
+        pass
+    
+    def upsert_projections(self, events):
+        self.batches.append([event['id'] for event in events])
+        return True
+    
+    def close(self):
+        pass
+
+
+class FakeProgress:
+    def __init__(self):
+        self.messages = []
+    
+    def put(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def pg(monkeypatch):
+    def connect(ids):
+        conn = FakePgConn(ids)
+        monkeypatch.setattr(rebuild_projection, 'psycopg2', SimpleNamespace(connect=lambda *a, **kw: conn))
+        return conn
+    
+    FakeMySQLClient.batches = []
+    monkeypatch.setattr(rebuild_projection, 'MySQLClient', FakeMySQLClient)
+    return connect
+
+
+def make_args(**overrides):
+    args = SimpleNamespace(
+        postgres_url='postgresql://test',
+        mysql_url='mysql://test',
+        workers=1,
+        chunk_size=3,
+        batch_size=2,
+        max_rows_per_sec=0,
+        checkpoint=None,
+        restart=False,
+        truncate=False,
+    )
+    for name, value in overrides.items():
+        setattr(args, name, value)
+    return args
+
+
+def test_range_is_read_in_keyset_chunks(pg):
+    conn = pg(range(1, 8))
+    progress = FakeProgress()
+    
+    rebuild_range(0, {'start': 0, 'end': 7, 'last_id': 0}, make_args(), progress)
+    
+    assert [query[0] for query in conn.queries] == [0, 3, 6]
+    assert FakeMySQLClient.batches == [[1, 2], [3], [4, 5], [6], [7]]
+    assert progress.messages == [
+        ('progress', 0, 3, 3), ('progress', 0, 6, 3), ('progress', 0, 7, 1), ('done', 0, 7, 0),
+    ]
+    assert conn.closed
+
+
+def test_sparse_range_ending_with_empty_chunk(pg):
+    # Последние id поддиапазона удалены: после двух порций запрос пустой
+    conn = pg([1, 2, 3, 50, 51])
+    progress = FakeProgress()
+    
+    rebuild_range(0, {'start': 0, 'end': 100, 'last_id': 0}, make_args(), progress)
+    
+    assert [query[0] for query in conn.queries] == [0, 3, 51]
+    assert [row_id for batch in FakeMySQLClient.batches for row_id in batch] == [1, 2, 3, 50, 51]
+    assert progress.messages[-2:] == [('progress', 0, 100, 0), ('done', 0, 100, 0)]
+
+
+def test_resume_from_partly_written_checkpoint(pg, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    ranges = split_range(1, 12, 2)
+    # Первый поддиапазон дописан до id 4, второй завершён
+    ranges[0]['last_id'] = 4
+    ranges[1]['last_id'] = ranges[1]['end']
+    save_checkpoint(path, {'min_id': 1, 'max_id': 12, 'rows': 10, 'ranges': ranges})
+    conn = pg(range(1, 13))
+    args = make_args(checkpoint=path)
+    
+    checkpoint = prepare_checkpoint(args)
+    assert checkpoint == load_checkpoint(path)
+    assert conn.queries == []
+    
+    progress = FakeProgress()
+    rebuild_range(0, checkpoint['ranges'][0], args, progress)
+    
+    assert conn.queries[0][:2] == (4, 6)
+    assert [row_id for batch in FakeMySQLClient.batches for row_id in batch] == [5, 6]
+    assert progress.messages[-1] == ('done', 0, 6, 0)
+
+
+def test_restart_ignores_checkpoint(pg, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    save_checkpoint(path, {'min_id': 1, 'max_id': 2, 'rows': 2, 'ranges': split_range(1, 2, 1)})
+    
+    class MinMaxCursor(FakeCursor):
+        def execute(self, sql, params=None):
+            self.rows = [(1, 9)]
+        
+        def fetchone(self):
+            return self.rows[0]
+    
+    conn = pg([])
+    conn.cursor = lambda name=None: MinMaxCursor(conn)
+    
+    checkpoint = prepare_checkpoint(make_args(checkpoint=path, restart=True, workers=3))
+    
+    assert (checkpoint['min_id'], checkpoint['max_id'], checkpoint['rows']) == (1, 9, 0)
+    assert checkpoint['ranges'] == split_range(1, 9, 3)
+    assert load_checkpoint(path) == checkpoint
@@ -0,0 +1,47 @@
+"""Тесты отложенных повторов пачки через публикатор с подтверждениями"""
+
+from concurrent.futures import Future
+
+import psycopg2
+
+from shared.rabbit import ATTEMPT_HEADER, RetryPolicy
+from worker.handlers import _retry_many
+
+
+class BatchConfirmingPublisher:
+    """Подтверждает копии, только когда отправлены все expected штук"""
+    
+    confirm_timeout = 0.2
+    
+    def __init__(self, expected):
+        self.expected = expected
+        self.submitted = []
+    
+    def submit(self, queue_name, body, headers=None, content_type=None):
+        future = Future()
+        self.submitted.append((queue_name, body, headers, future))
+        if len(self.submitted) == self.expected:
+            for *_, pending in self.submitted:
+                pending.set_running_or_notify_cancel()
+                pending.set_result(True)
+        return future
+
+
+def test_retry_copies_are_submitted_before_waiting():
+    publisher = BatchConfirmingPublisher(expected=3)
+    messages = [(b'%d' % i, 'application/json', f'corr-{i}', {}) for i in range(3)]
+    
+    results = _retry_many(messages, None, psycopg2.OperationalError("down"), RetryPolicy([1000, 5000], 5), publisher)
+    
+    assert results == [True, True, True]
+    assert [queue for queue, *_ in publisher.submitted] == ['events.retry.1000'] * 3
+    assert all(headers[ATTEMPT_HEADER] == 2 for _, _, headers, _ in publisher.submitted)
+
+
+def test_unconfirmed_retry_copy_is_not_acked():
+    publisher = BatchConfirmingPublisher(expected=99)
+    messages = [(b'1', 'application/json', 'corr-1', {})]
+    
+    results = _retry_many(messages, None, psycopg2.OperationalError("down"), RetryPolicy([1000], 5), publisher)
+    
+    assert results == [False]
@@ -0,0 +1,123 @@
+"""Тесты реестра схем payload (shared.schemas)"""
+
+import json
+import os
+
+import pytest
+
+from shared.schemas import PayloadSchemaError, SchemaRegistry, compile_schema
+
+ORDER_SCHEMA = {
+    'event_type': 'order_created',
+    'schema_version': 1,
+    'payload': {
+        'type': 'object',
+        'required': ['order_id', 'status'],
+        'properties': {
+            'order_id': {'type': 'string', 'minLength': 1},
+            'status': {'enum': ['new', 'paid']},
+            'items': {'type': 'array', 'items': {'type': 'object', 'properties': {'qty': {'type': 'integer'}}}}
+        }
+    }
+}
+
+
+def write_schema(directory, name, document):
+    path = directory / name
+    path.write_text(json.dumps(document), encoding='utf-8')
+    return path
+
+
+@pytest.fixture
+def registry(tmp_path):
+    write_schema(tmp_path, 'order_created.v1.json', ORDER_SCHEMA)
+    return SchemaRegistry(str(tmp_path), reload_interval=0)
+
+
+def reason(registry, payload, event_type='order_created', schema_version=1):
+    with pytest.raises(PayloadSchemaError) as error:
+        registry.validate(event_type, schema_version, payload)
+    return str(error.value)
+
+
+def test_valid_payload_passes(registry):
+    registry.validate('order_created', 1, {'order_id': 'o1', 'status': 'new', 'items': [{'qty': 2}]})
+    assert registry.stats()['checked'] == 1
+
+
+def test_type_required_and_enum_failures(registry):
+    assert reason(registry, {'order_id': 1, 'status': 'new'}) == "payload.order_id: expected string, got integer"
+    assert reason(registry, {'order_id': 'o1'}) == "payload.status: field is required"
+    assert reason(registry, {'order_id': 'o1', 'status': 'lost'}) == "payload.status: value is not one of ['new', 'paid']"
+    assert reason(registry, {'order_id': 'o1', 'status': 'new', 'items': [{'qty': 1}, {'qty': True}]}) == (
+        "payload.items[1].qty: expected integer, got boolean"
+    )
+    assert registry.stats()['rejected'] == 4
+
+
+def test_unknown_type_or_version_passes_through(registry):
+    registry.validate('order_created', 2, {'anything': 'goes'})
+    registry.validate('page_view', 1, 'not even an object')
+    assert registry.stats()['checked'] == 0
+
+
+def test_validators_are_compiled_once(registry):
+    validator = registry._validators[('order_created', 1)]
+    
+    assert registry.reload() is False
+    registry.validate('order_created', 1, {'order_id': 'o1', 'status': 'new'})
+    assert registry._validators[('order_created', 1)] is validator
+    assert registry.stats()['reloads'] == 1
+
+
+def test_reload_after_file_change(tmp_path):
+    path = write_schema(tmp_path, 'order_created.v1.json', ORDER_SCHEMA)
+    registry = SchemaRegistry(str(tmp_path), reload_interval=60)
+    registry.validate('order_created', 1, {'order_id': 'o1', 'status': 'new'})
+    
+    changed = json.loads(json.dumps(ORDER_SCHEMA))
+    changed['payload']['properties']['status']['enum'].append('refunded')
+    path.write_text(json.dumps(changed), encoding='utf-8')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    
+    # Интервал проверки не истёк — действуют прежние схемы
+    with pytest.raises(PayloadSchemaError):
+        registry.validate('order_created', 1, {'order_id': 'o1', 'status': 'refunded'})
+    
+    registry._next_check = 0
+    registry.validate('order_created', 1, {'order_id': 'o1', 'status': 'refunded'})
+    assert registry.stats()['reloads'] == 2
+
+
+def test_broken_file_keeps_previous_schemas(tmp_path):
+    write_schema(tmp_path, 'order_created.v1.json', ORDER_SCHEMA)
+    registry = SchemaRegistry(str(tmp_path), reload_interval=60)
+    
+    write_schema(tmp_path, 'broken.json', {'event_type': 'x', 'schema_version': 1, 'payload': {'oneOf': []}})
+    registry._next_check = 0
+    
+    with pytest.raises(PayloadSchemaError):
+        registry.validate('order_created', 1, {'order_id': 'o1'})
+    assert registry.stats()['reload_errors'] == 1
+
+
+def test_depth_and_size_limits(tmp_path):
+    write_schema(tmp_path, 'blob.json', {'event_type': 'blob', 'schema_version': 1, 'max_depth': 3, 'max_nodes': 10})
+    registry = SchemaRegistry(str(tmp_path), reload_interval=0)
+    
+    registry.validate('blob', 1, {'a': {'b': {'c': 1}}})
+    assert reason(registry, {'a': {'b': {'c': {'d': 1}}}}, 'blob') == "payload: payload is nested deeper than 3 levels"
+    assert reason(registry, {'a': list(range(10))}, 'blob') == "payload: payload has more than 10 values"
+
+
+def test_registry_defaults_apply_limits(tmp_path):
+    write_schema(tmp_path, 'blob.json', {'event_type': 'blob', 'schema_version': 1})
+    registry = SchemaRegistry(str(tmp_path), reload_interval=0, max_depth=2, max_nodes=100)
+    
+    assert 'nested deeper than 2' in reason(registry, [[[1]]], 'blob')
+
+
+def test_unsupported_keyword_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported schema keywords: oneOf"):
+        compile_schema({'oneOf': []})
@@ -0,0 +1,118 @@
+"""Тесты дискового спула: запись, падение, повторное открытие и дренаж"""
+
+import os
+
+from shared.codec import CONTENT_TYPE_JSON, CONTENT_TYPE_MSGPACK
+from shared.spool import FSYNC_NEVER, Spool, SpoolDrainer
+
+
+def open_spool(base_dir, **kwargs):
+    return Spool(str(base_dir), fsync=FSYNC_NEVER, **kwargs)
+
+
+def test_records_keep_headers_and_content_type(tmp_path):
+    spool = open_spool(tmp_path)
+    spool.append(b'{"a": 1}', {'event_id': 'e1'}, CONTENT_TYPE_JSON)
+    spool.append(b'\x81\xa1a\x02', {'event_id': 'e2'}, CONTENT_TYPE_MSGPACK)
+    
+    records, positions = spool.read(10)
+    
+    assert records == [
+        (b'{"a": 1}', {'event_id': 'e1'}, CONTENT_TYPE_JSON),
+        (b'\x81\xa1a\x02', {'event_id': 'e2'}, CONTENT_TYPE_MSGPACK),
+    ]
+    assert len(positions) == 2
+    spool.close()
+
+
+def test_reopen_after_crash_resumes_at_cursor(tmp_path):
+    spool = open_spool(tmp_path)
+    for i in range(5):
+        spool.append(b'%d' % i, {'n': i}, CONTENT_TYPE_JSON)
+    
+    records, positions = spool.read(2)
+    spool.commit(positions[-1])
+    # Падение: процесс не успел опубликовать остальное
+    spool.close()
+    
+    reopened = open_spool(tmp_path)
+    assert reopened.directory == spool.directory
+    published = []
+    drainer = SpoolDrainer(reopened, lambda records: published.extend(records) or [None] * len(records))
+    
+    assert drainer.drain_once() == (3, False)
+    assert [body for body, _, _ in published] == [b'2', b'3', b'4']
+    assert reopened.read(10) == ([], [])
+    reopened.close()
+
+
+def test_failed_publish_keeps_cursor_at_first_error(tmp_path):
+    spool = open_spool(tmp_path)
+    for i in range(3):
+        spool.append(b'%d' % i, {}, CONTENT_TYPE_JSON)
+    
+    drainer = SpoolDrainer(spool, lambda records: [None, RuntimeError("broker down"), None])
+    assert drainer.drain_once() == (1, True)
+    
+    records, _ = spool.read(10)
+    assert [body for body, _, _ in records] == [b'1', b'2']
+    spool.close()
+
+
+def test_corrupted_tail_is_skipped(tmp_path):
+    spool = open_spool(tmp_path)
+    spool.append(b'good', {}, CONTENT_TYPE_JSON)
+    spool.append(b'broken', {}, CONTENT_TYPE_JSON)
+    segment = spool._segment_path(spool._active_seq)
+    spool.close()
+    
+    # Портим последний байт второй записи: crc32 не сойдётся
+    with open(segment, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'X')
+    
+    reopened = open_spool(tmp_path)
+    records, positions = reopened.read(10)
+    
+    assert [body for body, _, _ in records] == [b'good']
+    reopened.commit(positions[-1])
+    assert reopened.read(10) == ([], [])
+    reopened.close()
+
+
+def test_orphaned_slot_is_adopted(tmp_path):
+    first = open_spool(tmp_path)
+    second = open_spool(tmp_path)
+    for i in range(3):
+        second.append(b'orphan-%d' % i, {'n': i}, CONTENT_TYPE_MSGPACK)
+    records, positions = second.read(1)
+    second.commit(positions[-1])
+    first.append(b'own', {}, CONTENT_TYPE_JSON)
+    first.close()
+    # Процессов стало меньше: slot-1 больше никто не займёт
+    second.close()
+    
+    survivor = open_spool(tmp_path)
+    assert survivor.directory == first.directory
+    
+    records, _ = survivor.read(10)
+    assert [(body, content_type) for body, _, content_type in records] == [
+        (b'own', CONTENT_TYPE_JSON),
+        (b'orphan-1', CONTENT_TYPE_MSGPACK),
+        (b'orphan-2', CONTENT_TYPE_MSGPACK),
+    ]
+    assert not [name for name in os.listdir(second.directory) if name.endswith('.seg')]
+    assert survivor.adopt_orphans() == 0
+    survivor.close()
+
+
+def test_busy_slot_is_not_adopted(tmp_path):
+    first = open_spool(tmp_path)
+    second = open_spool(tmp_path)
+    second.append(b'live', {}, CONTENT_TYPE_JSON)
+    
+    assert first.adopt_orphans() == 0
+    assert first.read(10) == ([], [])
+    assert [body for body, _, _ in second.read(10)[0]] == [b'live']
+    second.close()
+    first.close()
@@ -0,0 +1,152 @@
+"""Тесты автомасштабирования и перезапуска процессов супервизора"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from worker import supervisor as supervisor_module
+from worker.supervisor import ScalePolicy, Supervisor, restart_delay, scale_decision
+
+POLICY = ScalePolicy(
+    min_workers=1,
+    max_workers=3,
+    scale_up_backlog=100.0,
+    scale_down_backlog=10.0,
+    scale_down_samples=3,
+)
+
+
+def test_scale_up_on_backlog():
+    assert scale_decision(POLICY, 1, 2, depth=500, consumers=1, active=1) == (2, 0)
+
+
+def test_scale_up_stops_at_max():
+    assert scale_decision(POLICY, 3, 0, depth=10000, consumers=3, active=3) == (3, 0)
+
+
+def test_scale_down_after_consecutive_idle_samples():
+    desired, idle = 3, 0
+    for _ in range(2):
+        desired, idle = scale_decision(POLICY, desired, idle, depth=0, consumers=3, active=3)
+        assert desired == 3
+    
+    assert scale_decision(POLICY, desired, idle, depth=0, consumers=3, active=3) == (2, 0)
+
+
+def test_scale_down_stops_at_min():
+    assert scale_decision(POLICY, 1, 5, depth=0, consumers=1, active=1) == (1, 6)
+
+
+def test_sample_between_thresholds_resets_idle_counter():
+    # 50 сообщений на консьюмера: ни рост, ни простой
+    assert scale_decision(POLICY, 2, 2, depth=100, consumers=2, active=2) == (2, 0)
+
+
+def test_sample_ignored_while_workers_connect():
+    assert scale_decision(POLICY, 2, 1, depth=10000, consumers=1, active=2) == (2, 1)
+
+
+def test_no_consumers_counts_whole_queue():
+    assert scale_decision(POLICY, 1, 0, depth=101, consumers=0, active=0) == (2, 0)
+
+
+@pytest.mark.parametrize('crashes, delay', [(1, 1.0), (2, 2.0), (3, 4.0), (10, 30.0)])
+def test_restart_delay_doubles_up_to_limit(crashes, delay):
+    assert restart_delay(crashes, 1.0, 30.0) == delay
+
+
+class FakeProcess:
+    def __init__(self, pid, alive=True, exitcode=None):
+        self.pid = pid
+        self.alive = alive
+        self.exitcode = exitcode
+    
+    def is_alive(self):
+        return self.alive
+    
+    def join(self, timeout=None):
+        pass
+    
+    def kill(self):
+        self.alive = False
+
+
+def make_supervisor(**overrides):
+    config = SimpleNamespace(
+        SUPERVISOR_MIN_WORKERS=1,
+        SUPERVISOR_MAX_WORKERS=3,
+        SUPERVISOR_SCALE_UP_BACKLOG=100.0,
+        SUPERVISOR_SCALE_DOWN_BACKLOG=10.0,
+        SUPERVISOR_SCALE_DOWN_SAMPLES=3,
+        SUPERVISOR_RESTART_BACKOFF=1.0,
+        SUPERVISOR_MAX_RESTART_BACKOFF=30.0,
+        SUPERVISOR_STABLE_AFTER=60.0,
+        SUPERVISOR_SHUTDOWN_TIMEOUT=10.0,
+    )
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    return Supervisor(config)
+
+
+def test_autoscale_applies_decision(monkeypatch):
+    supervisor = make_supervisor()
+    supervisor.children = {1: (FakeProcess(1), 0.0)}
+    monkeypatch.setattr(supervisor, 'sample_queue', lambda: (500, 1))
+    
+    supervisor.autoscale()
+    
+    assert supervisor.desired == 2
+
+
+def test_fixed_pool_is_not_sampled(monkeypatch):
+    supervisor = make_supervisor(SUPERVISOR_MIN_WORKERS=2, SUPERVISOR_MAX_WORKERS=2)
+    monkeypatch.setattr(supervisor, 'sample_queue', lambda: pytest.fail("sampled fixed pool"))
+    
+    supervisor.autoscale()
+    
+    assert supervisor.desired == 2
+
+
+def test_crashed_worker_is_respawned_after_backoff(monkeypatch):
+    supervisor = make_supervisor()
+    spawned = []
+    monkeypatch.setattr(supervisor, 'spawn', lambda: spawned.append(True))
+    
+    # Два быстрых падения подряд: задержка 1с, затем 2с
+    supervisor.children = {1: (FakeProcess(1, alive=False, exitcode=1), 100.0)}
+    supervisor.reap_children(101.0)
+    assert supervisor.next_spawn_at == 102.0
+    supervisor.children = {2: (FakeProcess(2, alive=False, exitcode=1), 102.0)}
+    supervisor.reap_children(103.0)
+    assert (supervisor.crashes, supervisor.next_spawn_at) == (2, 105.0)
+    
+    supervisor.reconcile(104.0)
+    assert spawned == []
+    supervisor.reconcile(105.0)
+    assert spawned == [True]
+
+
+def test_crash_after_stable_run_resets_backoff():
+    supervisor = make_supervisor()
+    supervisor.crashes = 4
+    supervisor.children = {1: (FakeProcess(1, alive=False, exitcode=1), 0.0)}
+    
+    supervisor.reap_children(100.0)
+    
+    assert (supervisor.crashes, supervisor.next_spawn_at) == (1, 101.0)
+
+
+def test_retired_worker_is_not_counted_as_crash(monkeypatch):
+    supervisor = make_supervisor()
+    killed = []
+    monkeypatch.setattr(supervisor_module, 'os', SimpleNamespace(kill=lambda pid, sig: killed.append(pid)))
+    supervisor.children = {1: (FakeProcess(1), 0.0), 2: (FakeProcess(2), 5.0)}
+    supervisor.desired = 1
+    
+    supervisor.reconcile(10.0)
+    assert killed == [2]
+    
+    supervisor.children[2][0].alive = False
+    supervisor.reap_children(11.0)
+    assert list(supervisor.children) == [1]
+    assert (supervisor.crashes, supervisor.next_spawn_at) == (0, 0.0)
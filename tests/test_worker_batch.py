@@ -0,0 +1,80 @@
+"""Тесты подтверждения пачки в EventWorker.flush_batch"""
+
+from types import SimpleNamespace
+
+import psycopg2
+import pytest
+
+import worker.worker as worker_module
+from worker.worker import EventWorker
+
+
+class FakeChannel:
+    def __init__(self):
+        self.calls = []
+    
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.calls.append(('ack', delivery_tag, multiple))
+    
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.calls.append(('nack', delivery_tag, multiple, requeue))
+
+
+def make_worker(tags):
+    worker = EventWorker()
+    worker.rabbit_consumer = SimpleNamespace(channel=FakeChannel(), connection=None)
+    worker.batch = [(tag, b'{"tag": %d}' % tag, 'application/json', f'corr-{tag}', {}) for tag in tags]
+    return worker
+
+
+def test_batch_acks_successes_and_rejects_failures_one_by_one(monkeypatch):
+    monkeypatch.setattr(worker_module, 'handle_event_batch', lambda messages, *a, **kw: [True, False, True, False])
+    worker = make_worker([1, 2, 3, 4])
+    
+    worker.flush_batch()
+    
+    assert worker.rabbit_consumer.channel.calls == [
+        ('nack', 2, False, False),
+        ('nack', 4, False, False),
+        ('ack', 3, True),
+    ]
+    assert worker.batch == []
+
+
+def test_unexpected_batch_error_falls_back_to_single_messages(monkeypatch):
+    def broken_batch(messages, *args, **kwargs):
+        raise RuntimeError("bug in batch path")
+    
+    handled = []
+    
+    def handle_single(body, *args, **kwargs):
+        handled.append(body)
+        if body == b'{"tag": 2}':
+            return False
+        if body == b'{"tag": 3}':
+            raise RuntimeError("bug in single path")
+        return True
+    
+    monkeypatch.setattr(worker_module, 'handle_event_batch', broken_batch)
+    monkeypatch.setattr(worker_module, 'handle_event_with_dlq', handle_single)
+    worker = make_worker([1, 2, 3, 4])
+    
+    worker.flush_batch()
+    
+    assert len(handled) == 4
+    calls = worker.rabbit_consumer.channel.calls
+    # Никаких multiple=True отказов: отклоняются только сообщения, которые не удалось обработать
+    assert [call for call in calls if call[0] == 'nack'] == [('nack', 2, False, False), ('nack', 3, False, False)]
+    assert calls[-1] == ('ack', 4, True)
+
+
+def test_connection_error_requeues_batch(monkeypatch):
+    def pg_down(messages, *args, **kwargs):
+        raise psycopg2.OperationalError("connection refused")
+    
+    monkeypatch.setattr(worker_module, 'handle_event_batch', pg_down)
+    worker = make_worker([5, 6])
+    
+    with pytest.raises(psycopg2.OperationalError):
+        worker.flush_batch()
+    assert worker.rabbit_consumer.channel.calls == [('nack', 6, True, True)]
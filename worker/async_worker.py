@@ -0,0 +1,455 @@
+import sys
+import os
+import json
+import signal
+import asyncio
+import time
+from datetime import timezone
+from typing import Any, Dict, Optional, Set
+
+# Добавляем корневую директорию проекта в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Асинхронные драйверы нужны только для WORKER_ENGINE=asyncio
+try:
+    import aio_pika
+except ImportError:
+    aio_pika = None
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+from worker.config import Config
+from worker.handlers import dlq_error_info, is_transient_error, parse_event
+from shared.db_mysql import MySQLClient, PROJECTION_ROW, UPSERT_PROJECTION_SQL, projection_row
+from shared.db_postgres import OUTBOX_SCHEMA_SQL, insert_events_sql, with_outbox
+from shared.rabbit import RetryPolicy, build_dlq_message, retry_queue_name, topology
+from shared.schemas import SchemaRegistry
+from shared.logging import clear_correlation_id, set_correlation_id, setup_logging
+from worker.metrics import start_metrics_server
+from worker.sinks import OVERFLOW_BLOCK, SinkFanout, start_mysql_sinks
+
+logger = setup_logging(__name__, Config.LOG_LEVEL, json_format=Config.JSON_LOGS)
+
+_INSERT_EVENT_SQL = insert_events_sql('($1, $2, $3, $4, $5, $6)', 'id, event_id')
+
+
+class AsyncEventWorker:
+    """
+    Воркер на asyncio (WORKER_ENGINE=asyncio)
+    
+    Та же обработка, что у EventWorker с handle_event_with_dlq, но на
+    асинхронных драйверах (aio-pika, asyncpg, aiomysql): каждое сообщение
+    обрабатывается в своей задаче, и пока одна ждёт базу, остальные
+    работают. Одновременно в работе не больше WORKER_ASYNC_CONCURRENCY
+    сообщений — столько брокер отдаёт без подтверждения (prefetch_count),
+    столько же соединений в пулах PostgreSQL и MySQL.
+    
+    Проекция в MySQL — те же приёмники, что у EventWorker (SINK_MYSQL_*):
+    очередь и потоки с mysql-connector вне цикла событий. При
+    SINK_MYSQL_ENABLED=false — одна попытка через aiomysql до ack.
+    """
+    
+    def __init__(self, config: Config = None):
+        self.config = config or Config()
+        self.concurrency = max(1, self.config.WORKER_ASYNC_CONCURRENCY)
+        self.connection = None
+        self.channel = None
+        self.queue = None
+        self.consumer_tag: Optional[str] = None
+        self.pg_pool = None
+        self.mysql_pool = None
+        # Приёмники проекции; переживают переподключения
+        self.sinks: Optional[SinkFanout] = None
+        self.schemas: Optional[SchemaRegistry] = None
+        # С outbox событие ставится в events_outbox тем же запросом
+        self.insert_sql = with_outbox(_INSERT_EVENT_SQL, 'id') if self.config.OUTBOX_ENABLED else _INSERT_EVENT_SQL
+        self.retry: Optional[RetryPolicy] = None
+        if self.config.RETRY_DELAYS_MS:
+            self.retry = RetryPolicy(self.config.RETRY_DELAYS_MS, self.config.MAX_PROCESSING_ATTEMPTS)
+        # Задачи обработки сообщений, которые ещё выполняются
+        self.tasks: Set[asyncio.Task] = set()
+        self.stopping: Optional[asyncio.Event] = None
+    
+    def setup_signal_handlers(self):
+        """SIGTERM/SIGINT: перестать брать сообщения и дождаться текущих"""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.signal_handler, signum)
+    
+    def signal_handler(self, signum):
+        logger.info(f"Received signal {signum}, shutting down...")
+        self.stopping.set()
+    
+    async def connect_to_services(self):
+        """Подключение к PostgreSQL, MySQL и RabbitMQ"""
+        logger.info("Connecting to services...")
+        
+        # Подключаемся к PostgreSQL (source of truth)
+        try:
+            self.pg_pool = await asyncpg.create_pool(
+                self.config.POSTGRES_URL, min_size=1, max_size=self.concurrency
+            )
+            if self.config.OUTBOX_ENABLED:
+                async with self.pg_pool.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.execute(OUTBOX_SCHEMA_SQL)
+            logger.info("✅ Connected to PostgreSQL (asyncpg)")
+        except Exception as e:
+            logger.error(f"❌ Failed to connect to PostgreSQL: {e}")
+            raise
+        
+        # Подключаемся к MySQL (best-effort проекция)
+        if self.config.OUTBOX_ENABLED:
+            logger.info("✅ MySQL projection via outbox (python -m worker.projector)")
+        elif not self.config.MYSQL_URL:
+            logger.warning("⚠️  MYSQL_URL not set, MySQL projection disabled")
+        elif self.config.SINK_MYSQL_ENABLED:
+            # Подключение к MySQL блокирующее — не в цикле событий
+            if self.sinks is None:
+                self.sinks = await asyncio.to_thread(start_mysql_sinks, self.config)
+        elif aiomysql is None:
+            logger.warning("⚠️  aiomysql is not installed, MySQL projection disabled")
+        else:
+            try:
+                params = MySQLClient(self.config.MYSQL_URL).parse_url(self.config.MYSQL_URL)
+                self.mysql_pool = await aiomysql.create_pool(
+                    host=params['host'],
+                    port=params['port'],
+                    user=params['user'],
+                    password=params['password'],
+                    db=params['database'],
+                    minsize=1,
+                    maxsize=self.concurrency,
+                    autocommit=True
+                )
+                logger.info("✅ Connected to MySQL (projection, aiomysql)")
+            except Exception as e:
+                # MySQL НЕ обязателен для работы воркера
+                logger.warning(f"⚠️  Failed to connect to MySQL (projection will be skipped): {e}")
+                self.mysql_pool = None
+        
+        # Схемы payload (неизвестные типы проходят без проверки)
+        if self.config.SCHEMA_DIR and self.schemas is None:
+            self.schemas = SchemaRegistry(
+                self.config.SCHEMA_DIR,
+                reload_interval=self.config.SCHEMA_RELOAD_INTERVAL,
+                max_depth=self.config.SCHEMA_MAX_DEPTH,
+                max_nodes=self.config.SCHEMA_MAX_NODES
+            )
+            logger.info(f"✅ Payload schemas loaded from {self.config.SCHEMA_DIR}")
+        
+        # Подключаемся к RabbitMQ; robust-соединение само переподключается
+        try:
+            self.connection = await aio_pika.connect_robust(self.config.RABBIT_URL)
+            self.channel = await self.connection.channel()
+            await self.channel.set_qos(prefetch_count=self.concurrency)
+            
+            # Те же очереди, что объявляет RabbitMQConsumer (declare_topology)
+            queues = [
+                await self.channel.declare_queue(queue_name, durable=True, arguments=arguments or None)
+                for queue_name, arguments in topology(self.config.RETRY_DELAYS_MS)
+            ]
+            # Первая в топологии — очередь событий
+            self.queue = queues[0]
+            logger.info("✅ Connected to RabbitMQ (aio-pika)")
+        except Exception as e:
+            logger.error(f"❌ Failed to connect to RabbitMQ: {e}")
+            raise
+    
+    async def on_message(self, message):
+        """Колбэк консьюмера: обработка сообщения в отдельной задаче"""
+        # Задач не больше prefetch_count: больше брокер не отдаст
+        task = asyncio.create_task(self.process_message(message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+    
+    async def process_message(self, message):
+        """Обработка сообщения с отправкой в DLQ при ошибках"""
+        correlation_id = (message.headers or {}).get('correlation_id')
+        if isinstance(correlation_id, bytes):
+            correlation_id = correlation_id.decode('utf-8', 'replace')
+        
+        # Контекст у каждой задачи свой: correlation_id не пересекается с другими
+        if correlation_id:
+            set_correlation_id(correlation_id)
+        else:
+            clear_correlation_id()
+        
+        logger.info(f"Received message: {message.delivery_tag}, correlation: {correlation_id}")
+        
+        try:
+            success = await self.handle_event(message.body, message.content_type, correlation_id, message.headers)
+            
+            if success:
+                await message.ack()
+                logger.info(f"Message acknowledged: {message.delivery_tag}, correlation: {correlation_id}")
+            else:
+                # Уже отправлено в DLQ, отклоняем без повторной попытки
+                await message.reject(requeue=False)
+                logger.warning(f"Message sent to DLQ: {message.delivery_tag}, correlation: {correlation_id}")
+        except Exception as e:
+            logger.error(f"Unexpected error processing message: {e}, correlation: {correlation_id}")
+            try:
+                await message.reject(requeue=False)
+            except Exception as reject_error:
+                logger.error(f"Failed to reject message {message.delivery_tag}: {reject_error}")
+    
+    async def handle_event(self, message_body: bytes, content_type: Optional[str],
+                           correlation_id: Optional[str], headers: Optional[dict] = None) -> bool:
+        """
+        Асинхронный аналог handle_event_with_dlq
+        
+        Returns:
+            bool: True если успешно или отложено на повтор, False если отправлено в DLQ
+        """
+        try:
+            event = parse_event(message_body, content_type, self.schemas)
+        except Exception as e:
+            await self.send_to_dlq(message_body, dlq_error_info(e, correlation_id))
+            return False
+        
+        try:
+            event_dict = event.dict()
+            
+            logger.info(
+                f"Processing event: {event.event_id}, type: {event.event_type}, "
+                f"correlation: {correlation_id}",
+                extra={'event_id': event.event_id, 'correlation_id': correlation_id}
+            )
+            
+            # Запись в PostgreSQL
+            inserted = await self.insert_event(event_dict)
+            
+            if inserted:
+                logger.info(f"Event saved to PostgreSQL: {event.event_id}, correlation: {correlation_id}")
+            else:
+                logger.info(f"Event already exists: {event.event_id}, correlation: {correlation_id}")
+            
+            # MySQL проекция (best-effort): через очередь приёмника, не дожидаясь записи
+            if self.sinks is not None:
+                await self.publish_to_sinks(event_dict)
+            elif self.mysql_pool is not None:
+                await self.attempt_mysql_projection(event_dict, correlation_id)
+            
+            return True
+        
+        except Exception as e:
+            if self.retry is not None and self.is_transient(e):
+                return await self.retry_later(message_body, e, correlation_id, headers, content_type)
+            await self.send_to_dlq(message_body, dlq_error_info(e, correlation_id))
+            return False
+    
+    @staticmethod
+    def is_transient(error: Exception) -> bool:
+        """is_transient_error плюс ошибки соединения asyncpg"""
+        if isinstance(error, (OSError, asyncio.TimeoutError)):
+            return True
+        if asyncpg is not None and isinstance(error, (asyncpg.PostgresConnectionError, asyncpg.InterfaceError)):
+            return True
+        return is_transient_error(error)
+    
+    async def retry_later(self, message_body: bytes, error: Exception, correlation_id: Optional[str],
+                          headers: Optional[dict], content_type: Optional[str]) -> bool:
+        """Асинхронный аналог handlers._retry_later"""
+        attempt = self.retry.attempt(headers)
+        delay_ms = self.retry.delay_ms(attempt)
+        
+        if delay_ms is None:
+            error_info = dlq_error_info(error, correlation_id)
+            error_info["last_reason"] = error_info["reason"]
+            error_info["reason"] = "max_attempts_exceeded"
+            error_info["attempts"] = attempt
+            logger.error(f"Giving up after {attempt} attempts: {error}, correlation: {correlation_id}")
+            await self.send_to_dlq(message_body, error_info)
+            return False
+        
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=message_body,
+                    headers=self.retry.retry_headers(headers, attempt),
+                    content_type=content_type or 'application/json',
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=retry_queue_name(delay_ms)
+            )
+        except Exception as publish_error:
+            # Брокер отправит отклонённое сообщение в DLQ по x-dead-letter-routing-key
+            logger.error(f"Failed to schedule retry: {publish_error}, correlation: {correlation_id}")
+            return False
+        
+        logger.warning(
+            f"Transient error (attempt {attempt}/{self.retry.max_attempts}): {type(error).__name__}: {error}. "
+            f"Retrying in {delay_ms / 1000:.1f}s via broker, correlation: {correlation_id}"
+        )
+        return True
+    
+    async def insert_event(self, event_data: Dict[str, Any]) -> bool:
+        """
+        Вставка события с проверкой идемпотентности (как PostgresClient.insert_event)
+        
+        Returns:
+            bool: True если событие вставлено, False если уже существует
+        """
+        occurred_at = event_data.get('occurred_at')
+        # Конверт без временной зоны — UTC
+        if occurred_at.tzinfo is None:
+            occurred_at = occurred_at.replace(tzinfo=timezone.utc)
+        
+        inserted_id = await self.pg_pool.fetchval(
+            self.insert_sql,
+            event_data.get('event_id'),
+            event_data.get('schema_version'),
+            event_data.get('event_type'),
+            event_data.get('source'),
+            occurred_at,
+            json.dumps(event_data.get('payload', {}))
+        )
+        return inserted_id is not None
+    
+    async def upsert_projection(self, event_data: Dict[str, Any]) -> None:
+        """Upsert проекции события в MySQL (как MySQLClient.upsert_projection)"""
+        async with self.mysql_pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    UPSERT_PROJECTION_SQL.format(values=PROJECTION_ROW),
+                    projection_row(event_data)
+                )
+    
+    async def publish_to_sinks(self, event_data: Dict[str, Any]) -> None:
+        """Постановка события в очереди приёмников"""
+        # block ждёт места в очереди до SINK_MYSQL_BLOCK_TIMEOUT_MS — не в цикле событий
+        if self.config.SINK_MYSQL_OVERFLOW == OVERFLOW_BLOCK:
+            await asyncio.to_thread(self.sinks.publish, event_data)
+        else:
+            self.sinks.publish(event_data)
+    
+    async def attempt_mysql_projection(self, event_dict: Dict[str, Any], correlation_id: Optional[str]) -> bool:
+        """Одна попытка проекции в MySQL, как handlers._attempt_mysql_projection"""
+        event_id = event_dict.get('event_id', 'unknown')
+        started = time.time()
+        try:
+            await self.upsert_projection(event_dict)
+        except Exception as e:
+            logger.error(
+                f"MySQL projection failed, skipped: {event_id}: {type(e).__name__}: {e} "
+                f"({time.time() - started:.3f}s), correlation: {correlation_id}"
+            )
+            return False
+        logger.info(f"Event projection saved to MySQL: {event_id} ({time.time() - started:.3f}s), correlation: {correlation_id}")
+        return True
+    
+    async def send_to_dlq(self, message_body: bytes, error_info: dict):
+        """Публикация в DLQ через канал воркера (как publish_to_dlq)"""
+        try:
+            body, headers = build_dlq_message(message_body, error_info, self.config.RABBIT_QUEUE_EVENTS)
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=body,
+                    headers=headers,
+                    content_type='application/json',
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=self.config.RABBIT_QUEUE_DLQ
+            )
+            logger.info(f"Message sent to DLQ: {error_info['reason']}, correlation: {error_info.get('correlation_id')}")
+        except Exception as dlq_error:
+            logger.error(f"Failed to send to DLQ: {dlq_error}, correlation: {error_info.get('correlation_id')}")
+    
+    async def run(self):
+        """Основной цикл: подключение, потребление до сигнала остановки, переподключение"""
+        logger.info(f"Starting asyncio event worker (concurrency {self.concurrency})...")
+        self.stopping = asyncio.Event()
+        self.setup_signal_handlers()
+        start_metrics_server(self.config.WORKER_METRICS_PORT)
+        if self.config.SEEN_FILTER_PATH:
+            logger.warning("⚠️  SEEN_FILTER_PATH is ignored by WORKER_ENGINE=asyncio (sync engine only)")
+        
+        try:
+            while not self.stopping.is_set():
+                try:
+                    await self.connect_to_services()
+                    self.consumer_tag = await self.queue.consume(self.on_message)
+                    logger.info(f"🚀 Worker started. Waiting for messages from queue '{self.config.RABBIT_QUEUE_EVENTS}'...")
+                    # Обрывы RabbitMQ после подключения robust-соединение переживает само
+                    await self.stopping.wait()
+                except Exception as e:
+                    logger.error(f"Connection error: {type(e).__name__}: {e}")
+                finally:
+                    await self.shutdown()
+                
+                if not self.stopping.is_set():
+                    logger.info(f"Reconnecting in {self.config.WORKER_RECONNECT_DELAY} seconds...")
+                    try:
+                        await asyncio.wait_for(self.stopping.wait(), timeout=self.config.WORKER_RECONNECT_DELAY)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            # Сообщения уже подтверждены: дописываем то, что осталось в очередях приёмников
+            await self.stop_sinks()
+        
+        logger.info("Worker stopped")
+    
+    async def stop_sinks(self):
+        """Дописать очереди приёмников (до SINK_SHUTDOWN_TIMEOUT) и остановить их"""
+        sinks, self.sinks = self.sinks, None
+        if sinks is not None:
+            await asyncio.to_thread(sinks.close, self.config.SINK_SHUTDOWN_TIMEOUT)
+    
+    async def shutdown(self):
+        """Отмена консьюмера, ожидание текущих сообщений и закрытие соединений"""
+        if self.consumer_tag is not None:
+            try:
+                await self.queue.cancel(self.consumer_tag)
+            except Exception as e:
+                logger.debug(f"Error cancelling consumer: {e}")
+            self.consumer_tag = None
+        
+        # Начатые сообщения доводим до ack/reject, пока канал открыт
+        if self.tasks:
+            logger.info(f"Waiting for {len(self.tasks)} in-flight messages...")
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        
+        # Соединения могли оборваться: ошибки закрытия не мешают переподключению
+        connection, self.connection = self.connection, None
+        self.channel = self.queue = None
+        if connection is not None:
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.debug(f"Error closing RabbitMQ connection: {e}")
+        
+        pg_pool, self.pg_pool = self.pg_pool, None
+        if pg_pool is not None:
+            try:
+                await pg_pool.close()
+            except Exception as e:
+                logger.debug(f"Error closing PostgreSQL pool: {e}")
+        
+        mysql_pool, self.mysql_pool = self.mysql_pool, None
+        if mysql_pool is not None:
+            mysql_pool.close()
+            await mysql_pool.wait_closed()
+
+
+def main():
+    """Точка входа для WORKER_ENGINE=asyncio"""
+    if aio_pika is None or asyncpg is None:
+        raise RuntimeError("WORKER_ENGINE=asyncio requires aio-pika and asyncpg (see worker/requirements.txt)")
+    
+    try:
+        asyncio.run(AsyncEventWorker().run())
+    except KeyboardInterrupt:
+        logger.info("Worker interrupted by user")
+
+
+if __name__ == '__main__':
+    main()
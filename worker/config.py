@@ -16,7 +16,80 @@ class Config:
     WORKER_PREFETCH_COUNT = int(os.getenv("WORKER_PREFETCH_COUNT", "1"))
     WORKER_RECONNECT_DELAY = int(os.getenv("WORKER_RECONNECT_DELAY", "5"))
     MAX_PROCESSING_ATTEMPTS = int(os.getenv("MAX_PROCESSING_ATTEMPTS", "3"))
+    # Публикация копий в DLQ и очереди повторов (постоянное соединение, пачки, подтверждения).
+    # Движок asyncio публикует через свой канал aio-pika (подтверждения по одной копии), PUBLISH_* не действуют
+    PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "500"))
+    PUBLISH_LINGER_MS = float(os.getenv("PUBLISH_LINGER_MS", "2"))
+    PUBLISH_CONFIRM_TIMEOUT = float(os.getenv("PUBLISH_CONFIRM_TIMEOUT", "5"))
+    # Задержки отложенных повторов, мс: очередь events.retry.<мс> на каждую (пусто — без повторов)
+    RETRY_DELAYS_MS = [int(delay) for delay in os.getenv("RETRY_DELAYS_MS", "1000,10000,60000").split(",") if delay.strip()]
+    
+    # Параллельная обработка в пуле потоков (1 — в потоке pika, по одному)
+    WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1"))
+    
+    # Движок воркера: 'sync' (pika, блокирующие драйверы) или 'asyncio' (aio-pika, asyncpg, aiomysql)
+    WORKER_ENGINE = os.getenv("WORKER_ENGINE", "sync").lower()
+    # Сообщений в работе одновременно на процесс при WORKER_ENGINE=asyncio
+    WORKER_ASYNC_CONCURRENCY = int(os.getenv("WORKER_ASYNC_CONCURRENCY", "32"))
+    
+    # Проекция в MySQL через очередь приёмника (false — синхронно, после записи в PostgreSQL)
+    SINK_MYSQL_ENABLED = os.getenv("SINK_MYSQL_ENABLED", "true").lower() == "true"
+    SINK_MYSQL_QUEUE_SIZE = int(os.getenv("SINK_MYSQL_QUEUE_SIZE", "10000"))
+    SINK_MYSQL_BATCH_SIZE = int(os.getenv("SINK_MYSQL_BATCH_SIZE", "100"))
+    SINK_MYSQL_BATCH_TIMEOUT_MS = float(os.getenv("SINK_MYSQL_BATCH_TIMEOUT_MS", "50"))
+    SINK_MYSQL_CONCURRENCY = int(os.getenv("SINK_MYSQL_CONCURRENCY", "2"))
+    # drop_oldest / drop_newest / block (ждать до SINK_MYSQL_BLOCK_TIMEOUT_MS)
+    SINK_MYSQL_OVERFLOW = os.getenv("SINK_MYSQL_OVERFLOW", "drop_oldest").lower()
+    SINK_MYSQL_BLOCK_TIMEOUT_MS = float(os.getenv("SINK_MYSQL_BLOCK_TIMEOUT_MS", "100"))
+    SINK_MYSQL_MAX_ATTEMPTS = int(os.getenv("SINK_MYSQL_MAX_ATTEMPTS", "3"))
+    SINK_SHUTDOWN_TIMEOUT = float(os.getenv("SINK_SHUTDOWN_TIMEOUT", "10"))
+    
+    # Порт /metrics воркера (0 — выключено, нужен prometheus_client)
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+    
+    # Фильтр уже записанных event_id в файле (пусто — выключен; процессы супервизора берут path, path.1, ...).
+    # Только движок sync: asyncio его не использует
+    SEEN_FILTER_PATH = os.getenv("SEEN_FILTER_PATH", "")
+    SEEN_FILTER_CAPACITY = int(os.getenv("SEEN_FILTER_CAPACITY", "1000000"))
+    SEEN_FILTER_ERROR_RATE = float(os.getenv("SEEN_FILTER_ERROR_RATE", "0.001"))
+    SEEN_FILTER_ROTATE_SECONDS = float(os.getenv("SEEN_FILTER_ROTATE_SECONDS", "3600"))
+    SEEN_FILTER_CHECKPOINT_SECONDS = float(os.getenv("SEEN_FILTER_CHECKPOINT_SECONDS", "10"))
+    # Окно по created_at для заполнения нового файла (0 — не заполнять)
+    SEEN_FILTER_WARM_SECONDS = float(os.getenv("SEEN_FILTER_WARM_SECONDS", "3600"))
+    
+    # Outbox: воркер только ставит события в events_outbox, в MySQL их переносит python -m worker.projector
+    OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+    # Опрос outbox без уведомлений (страховка от потерянных NOTIFY), секунды
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+    OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "1"))
+    PROJECTOR_METRICS_PORT = int(os.getenv("PROJECTOR_METRICS_PORT", "0"))
+    
+    # Супервизор (python -m worker.supervisor): число процессов воркера и автомасштабирование
+    SUPERVISOR_MIN_WORKERS = int(os.getenv("SUPERVISOR_MIN_WORKERS", "1"))
+    SUPERVISOR_MAX_WORKERS = int(os.getenv("SUPERVISOR_MAX_WORKERS", str(os.cpu_count() or 1)))
+    SUPERVISOR_SCALE_INTERVAL = float(os.getenv("SUPERVISOR_SCALE_INTERVAL", "10"))
+    # Сообщений в очереди на одного консьюмера: выше — добавить процесс, ниже — убрать
+    SUPERVISOR_SCALE_UP_BACKLOG = float(os.getenv("SUPERVISOR_SCALE_UP_BACKLOG", "1000"))
+    SUPERVISOR_SCALE_DOWN_BACKLOG = float(os.getenv("SUPERVISOR_SCALE_DOWN_BACKLOG", "10"))
+    SUPERVISOR_SCALE_DOWN_SAMPLES = int(os.getenv("SUPERVISOR_SCALE_DOWN_SAMPLES", "6"))
+    SUPERVISOR_RESTART_BACKOFF = float(os.getenv("SUPERVISOR_RESTART_BACKOFF", "1"))
+    SUPERVISOR_MAX_RESTART_BACKOFF = float(os.getenv("SUPERVISOR_MAX_RESTART_BACKOFF", "60"))
+    SUPERVISOR_STABLE_AFTER = float(os.getenv("SUPERVISOR_STABLE_AFTER", "60"))
+    SUPERVISOR_SHUTDOWN_TIMEOUT = float(os.getenv("SUPERVISOR_SHUTDOWN_TIMEOUT", "30"))
+    
+    # Пакетный режим: до WORKER_BATCH_SIZE сообщений или WORKER_BATCH_TIMEOUT_MS на пачку (1 — по одному)
+    WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "1"))
+    WORKER_BATCH_TIMEOUT_MS = float(os.getenv("WORKER_BATCH_TIMEOUT_MS", "50"))
+    
+    # Схемы payload по event_type / schema_version (пусто — без проверки)
+    SCHEMA_DIR = os.getenv("SCHEMA_DIR", "")
+    SCHEMA_RELOAD_INTERVAL = float(os.getenv("SCHEMA_RELOAD_INTERVAL", "5"))
+    SCHEMA_MAX_DEPTH = int(os.getenv("SCHEMA_MAX_DEPTH", "32"))
+    SCHEMA_MAX_NODES = int(os.getenv("SCHEMA_MAX_NODES", "10000"))
     
     # Logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT = os.getenv("LOG_FORMAT", "plain")  # 'plain' или 'json'
+    JSON_LOGS = os.getenv("JSON_LOGS", "true").lower() == "true"
@@ -1,20 +1,31 @@
-import json
 import logging
 import time
-from typing import Dict, Any
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
 from pydantic import ValidationError
 
-from shared.models import IncomingEvent
-from shared.db_postgres import PostgresClient
+from shared.codec import CONTENT_TYPE_JSON, MessageDecodeError, decode_message
+from shared.validation import validate_event
+from shared.schemas import PayloadSchemaError, SchemaRegistry
+from shared.db_postgres import CONNECTION_ERRORS, PostgresClient, _occurred_at_str
 from shared.db_mysql import MySQLClient
 from shared.utils import is_retryable_error
-from shared.logging import get_correlation_id
+from shared.logging import get_correlation_id, set_correlation_id
+from shared.models import IncomingEvent
+from shared.publisher import ConfirmingPublisher, PublishError, wait_confirm
+from shared.rabbit import DLQ_QUEUE, RetryPolicy, build_dlq_message, publish_to_retry, retry_queue_name
+from worker.seen_filter import SeenIdsFilter
+from worker.sinks import SinkFanout
 
 logger = logging.getLogger(__name__)
 
 
 def handle_event_with_dlq(message_body: bytes, pg_client: PostgresClient, 
-                         mysql_client: MySQLClient = None, rabbit_url: str = None) -> bool:
+                         mysql_client: MySQLClient = None, rabbit_url: str = None,
+                         content_type: str = None, schemas: SchemaRegistry = None,
+                         sinks: SinkFanout = None, headers: dict = None,
+                         retry: RetryPolicy = None, publisher: ConfirmingPublisher = None,
+                         seen: SeenIdsFilter = None) -> bool:
     """
     Обработка события с отправкой невалидных сообщений в DLQ
     
@@ -23,19 +34,28 @@ def handle_event_with_dlq(message_body: bytes, pg_client: PostgresClient,
         pg_client: Клиент PostgreSQL
         mysql_client: Клиент MySQL
         rabbit_url: URL RabbitMQ для отправки в DLQ
+        content_type: AMQP content_type сообщения (JSON, если не указан)
+        schemas: Реестр схем payload (None — payload не проверяется)
+        sinks: Вторичные приёмники; если заданы, проекция в MySQL идёт
+            через них и mysql_client не используется
+        headers: AMQP-заголовки сообщения (x-attempt, correlation_id)
+        retry: Политика отложенных повторов (None — временные ошибки сразу в DLQ)
+        publisher: Постоянный публикатор с подтверждениями для копий в DLQ и
+            очереди повторов (None — отдельное соединение на каждую копию)
+        seen: Фильтр уже записанных event_id (None — всегда INSERT)
     
     Returns:
-        bool: True если успешно, False если отправлено в DLQ
+        bool: True если успешно или отложено на повтор, False если отправлено в DLQ
     """
     correlation_id = get_correlation_id()  # Получаем correlation_id
     
     try:
-        # Парсинг JSON
-        message_str = message_body.decode('utf-8')
-        raw_data = json.loads(message_str)
-        
-        # Валидация
-        event = IncomingEvent(**raw_data)
+        event = parse_event(message_body, content_type, schemas)
+    except Exception as e:
+        _reject(message_body, rabbit_url, e, correlation_id, publisher)
+        return False
+    
+    try:
         event_dict = event.dict()
         
         # Логируем с correlation_id
@@ -46,57 +66,434 @@ def handle_event_with_dlq(message_body: bytes, pg_client: PostgresClient,
         )
         
         # Запись в PostgreSQL
-        inserted = pg_client.insert_event(event_dict)
+        inserted, unchanged = _store_event(event_dict, pg_client, seen)
         
         if inserted:
             logger.info(f"Event saved to PostgreSQL: {event.event_id}, correlation: {correlation_id}")
         else:
             logger.info(f"Event already exists: {event.event_id}, correlation: {correlation_id}")
         
-        # MySQL проекция (best-effort)
-        if mysql_client:
-            _attempt_mysql_projection_with_retry(event_dict, mysql_client, correlation_id)
+        # MySQL проекция (best-effort): через очереди приёмников, не дожидаясь записи.
+        # Повтор с теми же данными уже спроецирован — проекцию не трогаем
+        if unchanged:
+            logger.debug(f"Event unchanged, projection skipped: {event.event_id}")
+        elif sinks is not None:
+            sinks.publish(event_dict)
+        elif mysql_client:
+            _attempt_mysql_projection(event_dict, mysql_client, correlation_id)
         
         return True
         
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON: {e}, correlation: {correlation_id}")
-        if rabbit_url:
-            _send_to_dlq(message_body, rabbit_url, {
-                "reason": "invalid_json",
-                "error": str(e),
-                "exception_type": "JSONDecodeError",
-                "correlation_id": correlation_id
-            })
+    except Exception as e:
+        if retry is not None and is_transient_error(e):
+            return _retry_later(message_body, rabbit_url, e, correlation_id, headers, content_type, retry, publisher)
+        _reject(message_body, rabbit_url, e, correlation_id, publisher)
         return False
+
+
+def handle_event_batch(messages: List[Tuple[bytes, Optional[str], Optional[str], Optional[dict]]],
+                       pg_client: PostgresClient,
+                       mysql_client: MySQLClient = None,
+                       rabbit_url: str = None,
+                       schemas: SchemaRegistry = None,
+                       sinks: SinkFanout = None,
+                       retry: RetryPolicy = None,
+                       publisher: ConfirmingPublisher = None,
+                       seen: SeenIdsFilter = None) -> List[bool]:
+    """
+    Обработка пачки событий: один INSERT в PostgreSQL на всю пачку
+    
+    Невалидные сообщения отсеиваются до вставки. Если вставка пачки
+    падает из-за данных, события вставляются по одному, и в DLQ уходят
+    только строки, которые не удалось вставить. Сообщения отправляются
+    в DLQ после записи в PostgreSQL: если база недоступна, пачку можно
+    вернуть в очередь целиком без дублей в DLQ, а с политикой повторов
+    валидные сообщения откладываются в очереди повторов.
+    
+    Args:
+        messages: Список (тело, content_type, correlation_id, заголовки)
+        pg_client: Клиент PostgreSQL
+        mysql_client: Клиент MySQL
+        rabbit_url: URL RabbitMQ для отправки в DLQ
+        schemas: Реестр схем payload (None — payload не проверяется)
+        sinks: Вторичные приёмники (вместо mysql_client)
+        retry: Политика отложенных повторов
+        publisher: Публикатор с подтверждениями: копии в DLQ уходят пачкой
+        seen: Фильтр уже записанных event_id: возможные повторы проверяются
+            одним SELECT и не вставляются
+    
+    Returns:
+        List[bool]: для каждого сообщения True если обработано или отложено
+            на повтор, False если отправлено в DLQ
+    
+    Raises:
+        CONNECTION_ERRORS: PostgreSQL недоступен и retry не задан, ни одно событие не обработано
+    """
+    results = [False] * len(messages)
+    rejected: List[Tuple[int, Exception]] = []
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    
+    # Одно "сейчас" на пачку для проверки occurred_at
+    now = datetime.now(timezone.utc)
+    for index, (message_body, content_type, _, _) in enumerate(messages):
+        try:
+            event = parse_event(message_body, content_type, schemas, now)
+        except Exception as e:
+            rejected.append((index, e))
+            continue
+        valid.append((index, event.dict()))
+    
+    # Уже записанные события (по фильтру и подтверждающему SELECT)
+    known: List[Tuple[int, Dict[str, Any]]] = []
+    unchanged = set()
+    try:
+        if seen is not None and valid:
+            valid, known, unchanged = _split_seen(valid, pg_client, seen)
+        stored = _insert_batch(valid, messages, pg_client, rejected)
+    except CONNECTION_ERRORS as e:
+        if retry is None:
+            raise
+        # База недоступна: валидные сообщения ждут в очередях повторов, а не в воркере
+        valid += known
+        known = []
+        logger.error(f"PostgreSQL unavailable, scheduling {len(valid)} messages for retry: {e}")
+        scheduled = _retry_many([messages[index] for index, _ in valid], rabbit_url, e, retry, publisher)
+        for (index, _), result in zip(valid, scheduled):
+            results[index] = result
+        stored = []
+    
+    if seen is not None:
+        seen.add_many(event_dict.get('event_id') for _, event_dict in stored)
+    stored += known
+    
+    projected = [(index, event_dict) for index, event_dict in stored if index not in unchanged]
+    if sinks is not None:
+        sinks.publish_many([event_dict for _, event_dict in projected])
+    elif mysql_client and projected:
+        _attempt_mysql_projections(projected, mysql_client)
+    
+    for index, _ in stored:
+        results[index] = True
+    
+    # Копии в DLQ публикуются все сразу, затем ждём подтверждения каждой
+    pending = []
+    for index, error in rejected:
+        message_body, _, correlation_id, _ = messages[index]
+        set_correlation_id(correlation_id)
+        error_info = dlq_error_info(error, correlation_id)
+        if publisher is not None:
+            pending.append((publisher.submit(DLQ_QUEUE, *build_dlq_message(message_body, error_info)), error_info))
+        else:
+            _send_to_dlq(message_body, rabbit_url, error_info)
+    for future, error_info in pending:
+        _await_dlq_confirm(future, publisher.confirm_timeout, error_info)
+    
+    logger.info(f"Batch processed: {len(messages)} messages, stored={len(stored)}, rejected={len(rejected)}")
+    return results
+
+
+def parse_event(message_body: bytes, content_type: Optional[str],
+                schemas: Optional[SchemaRegistry], now: Optional[datetime] = None) -> IncomingEvent:
+    """Декодирование, валидация конверта и проверка payload по схеме"""
+    # Декодирование тела по content_type (JSON или MessagePack)
+    raw_data = decode_message(message_body, content_type)
+    
+    # Валидация (быстрый путь с теми же результатами и ошибками, что у pydantic)
+    event = validate_event(raw_data, now)
+    if schemas is not None:
+        schemas.validate(event.event_type, event.schema_version, event.payload)
+    return event
+
+
+def _store_event(event_dict: Dict[str, Any], pg_client: PostgresClient,
+                 seen: Optional[SeenIdsFilter]) -> Tuple[bool, bool]:
+    """
+    Запись события в PostgreSQL с проверкой по фильтру уже записанных
+    
+    Промах фильтра — сразу INSERT. Попадание подтверждается SELECT по
+    event_id: если событие есть, INSERT не нужен.
+    
+    Returns:
+        Tuple[bool, bool]: (вставлено, уже записано с теми же данными)
+    """
+    event_id = event_dict.get('event_id')
+    if seen is not None and seen.might_contain(event_id):
+        stored = pg_client.get_events([event_id]).get(event_id)
+        seen.record_lookup(stored is not None)
+        if stored is not None:
+            return False, _same_event(stored, event_dict)
+    
+    inserted = pg_client.insert_event(event_dict)
+    if seen is not None:
+        seen.add(event_id)
+    return inserted, False
+
+
+def _split_seen(valid: List[Tuple[int, Dict[str, Any]]], pg_client: PostgresClient,
+                seen: SeenIdsFilter):
+    """
+    Разделение пачки на новые и уже записанные события
+    
+    Возможные повторы (попадания фильтра) проверяются одним SELECT.
+    
+    Returns:
+        (события для INSERT, уже записанные события,
+         индексы записанных с теми же данными)
+    """
+    maybe = [event_dict.get('event_id') for _, event_dict in valid if seen.might_contain(event_dict.get('event_id'))]
+    if not maybe:
+        return valid, [], set()
+    
+    rows = pg_client.get_events(maybe)
+    for event_id in maybe:
+        seen.record_lookup(event_id in rows)
+    
+    fresh, known, unchanged = [], [], set()
+    for index, event_dict in valid:
+        row = rows.get(event_dict.get('event_id'))
+        if row is None:
+            fresh.append((index, event_dict))
+            continue
+        known.append((index, event_dict))
+        if _same_event(row, event_dict):
+            unchanged.add(index)
+    
+    if known:
+        logger.info(f"Seen-ids filter: {len(known)} of {len(valid)} events already stored, {len(unchanged)} unchanged")
+    return fresh, known, unchanged
+
+
+def _same_event(row: Dict[str, Any], event_dict: Dict[str, Any]) -> bool:
+    """Совпадает ли сохранённая строка events с данными события"""
+    return (
+        row['schema_version'] == event_dict.get('schema_version')
+        and row['event_type'] == event_dict.get('event_type')
+        and row['source'] == event_dict.get('source')
+        and _occurred_at_str(row['occurred_at']) == _occurred_at_str(event_dict.get('occurred_at'))
+        and row['payload'] == event_dict.get('payload', {})
+    )
+
+
+def _insert_batch(valid: List[Tuple[int, Dict[str, Any]]],
+                  messages: List[Tuple[bytes, Optional[str], Optional[str], Optional[dict]]],
+                  pg_client: PostgresClient,
+                  rejected: List[Tuple[int, Exception]]) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Вставка валидных событий пачкой, при ошибке данных — по одному
+    
+    Returns:
+        События, записанные в PostgreSQL (вставленные или уже существовавшие)
+    """
+    if not valid:
+        return []
+    
+    try:
+        inserted = pg_client.insert_events([event_dict for _, event_dict in valid])
+        new = sum(inserted)
+        logger.info(f"Events saved to PostgreSQL: {new} new, {len(valid) - new} already existed")
+        return valid
+    except CONNECTION_ERRORS:
+        raise
+    except Exception as e:
+        logger.warning(f"Batch insert failed, inserting {len(valid)} events one by one: {e}")
+    
+    # Изолируем строки, из-за которых упала пачка
+    stored = []
+    for index, event_dict in valid:
+        correlation_id = messages[index][2]
+        try:
+            pg_client.insert_event(event_dict)
+        except CONNECTION_ERRORS:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to insert event {event_dict.get('event_id')}: {e}, correlation: {correlation_id}")
+            rejected.append((index, e))
+            continue
+        stored.append((index, event_dict))
+    return stored
+
+
+def _reject(message_body: bytes, rabbit_url: Optional[str], error: Exception, correlation_id: Optional[str],
+            publisher: Optional[ConfirmingPublisher] = None) -> None:
+    """Логирование ошибки обработки и отправка сообщения в DLQ"""
+    error_info = dlq_error_info(error, correlation_id)
+    _send_to_dlq(message_body, rabbit_url, error_info, publisher)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Временная ошибка (соединение, deadlock, таймаут): есть смысл повторить позже"""
+    return isinstance(error, CONNECTION_ERRORS) or is_retryable_error(error)
+
+
+def _retry_later(message_body: bytes, rabbit_url: Optional[str], error: Exception,
+                 correlation_id: Optional[str], headers: Optional[dict],
+                 content_type: Optional[str], retry: RetryPolicy,
+                 publisher: Optional[ConfirmingPublisher] = None) -> bool:
+    """
+    Отложенный повтор через очередь брокера или DLQ, если попытки исчерпаны
+    
+    Returns:
+        bool: True если копия отложена на повтор (исходное сообщение можно
+            подтвердить), False если сообщение отправлено в DLQ
+    """
+    return _retry_many([(message_body, content_type, correlation_id, headers)], rabbit_url, error, retry, publisher)[0]
+
+
+def _retry_many(messages: List[Tuple[bytes, Optional[str], Optional[str], Optional[dict]]],
+                rabbit_url: Optional[str], error: Exception, retry: RetryPolicy,
+                publisher: Optional[ConfirmingPublisher] = None) -> List[bool]:
+    """
+    Отложенный повтор нескольких сообщений (см. _retry_later)
+    
+    С публикатором копии в очереди повторов отправляются все сразу,
+    а подтверждения ожидаются вместе (не дольше confirm_timeout на всю пачку).
+    
+    Args:
+        messages: Список (тело, content_type, correlation_id, заголовки)
+    
+    Returns:
+        List[bool]: для каждого сообщения True если копия отложена на повтор
+    """
+    results = [False] * len(messages)
+    # (индекс, Future копии, попытка, задержка)
+    pending = []
+    for index, (message_body, content_type, correlation_id, headers) in enumerate(messages):
+        set_correlation_id(correlation_id)
+        attempt = retry.attempt(headers)
+        delay_ms = retry.delay_ms(attempt)
         
-    except ValidationError as e:
-        logger.error(f"Validation error: {e}, correlation: {correlation_id}")
-        if rabbit_url:
-            _send_to_dlq(message_body, rabbit_url, {
-                "reason": "validation_error",
-                "error": str(e),
-                "exception_type": "ValidationError",
-                "errors": e.errors() if hasattr(e, 'errors') else None,
-                "correlation_id": correlation_id
-            })
-        return False
+        if delay_ms is None:
+            error_info = dlq_error_info(error, correlation_id)
+            error_info["last_reason"] = error_info["reason"]
+            error_info["reason"] = "max_attempts_exceeded"
+            error_info["attempts"] = attempt
+            logger.error(f"Giving up after {attempt} attempts: {error}, correlation: {correlation_id}")
+            _send_to_dlq(message_body, rabbit_url, error_info, publisher)
+            continue
         
+        retry_headers = retry.retry_headers(headers, attempt)
+        if publisher is not None:
+            future = publisher.submit(retry_queue_name(delay_ms), message_body, retry_headers, content_type or CONTENT_TYPE_JSON)
+            pending.append((index, future, attempt, delay_ms))
+            continue
+        try:
+            publish_to_retry(rabbit_url, message_body, retry_headers, content_type, delay_ms)
+        except Exception as publish_error:
+            # Брокер отправит отклонённое сообщение в DLQ по x-dead-letter-routing-key
+            logger.error(f"Failed to schedule retry: {publish_error}, correlation: {correlation_id}")
+            continue
+        results[index] = _log_retry(error, attempt, delay_ms, retry, correlation_id)
+    
+    if pending:
+        # Исходное сообщение подтверждается только после подтверждения копии
+        deadline = time.monotonic() + publisher.confirm_timeout
+        for index, future, attempt, delay_ms in pending:
+            correlation_id = messages[index][2]
+            try:
+                wait_confirm(future, max(0.0, deadline - time.monotonic()))
+            except PublishError as publish_error:
+                logger.error(f"Failed to schedule retry: {publish_error}, correlation: {correlation_id}")
+                continue
+            results[index] = _log_retry(error, attempt, delay_ms, retry, correlation_id)
+    return results
+
+
+def _log_retry(error: Exception, attempt: int, delay_ms: int, retry: RetryPolicy,
+               correlation_id: Optional[str]) -> bool:
+    logger.warning(
+        f"Transient error (attempt {attempt}/{retry.max_attempts}): {type(error).__name__}: {error}. "
+        f"Retrying in {delay_ms / 1000:.1f}s via broker, correlation: {correlation_id}"
+    )
+    return True
+
+
+def dlq_error_info(error: Exception, correlation_id: Optional[str]) -> Dict[str, Any]:
+    """Логирование ошибки обработки и описание ошибки для DLQ"""
+    if isinstance(error, MessageDecodeError):
+        logger.error(f"Invalid message body ({error.content_type}): {error}, correlation: {correlation_id}")
+        return {
+            "reason": error.reason,
+            "error": str(error),
+            "exception_type": type(error.__cause__ or error).__name__,
+            "content_type": error.content_type,
+            "correlation_id": correlation_id
+        }
+    if isinstance(error, PayloadSchemaError):
+        logger.error(f"Payload schema error: {error}, correlation: {correlation_id}")
+        return {
+            "reason": "schema_error",
+            "error": str(error),
+            "exception_type": "PayloadSchemaError",
+            "path": error.location,
+            "correlation_id": correlation_id
+        }
+    if isinstance(error, ValidationError):
+        logger.error(f"Validation error: {error}, correlation: {correlation_id}")
+        return {
+            "reason": "validation_error",
+            "error": str(error),
+            "exception_type": "ValidationError",
+            "errors": error.errors() if hasattr(error, 'errors') else None,
+            "correlation_id": correlation_id
+        }
+    logger.error(f"Unexpected error: {error}, correlation: {correlation_id}")
+    return {
+        "reason": "unexpected_error",
+        "error": str(error),
+        "exception_type": type(error).__name__,
+        "correlation_id": correlation_id
+    }
+
+
+def _attempt_mysql_projections(stored: List[Tuple[int, Dict[str, Any]]], mysql_client: MySQLClient):
+    """
+    Проекция пачки в MySQL одним upsert, при ошибке — по одному
+    
+    Args:
+        stored: Записанные в PostgreSQL события (индекс, данные)
+        mysql_client: Клиент MySQL
+    """
+    event_dicts = [event_dict for _, event_dict in stored]
+    if mysql_client.upsert_projections(event_dicts):
+        return
+    
+    logger.warning(f"MySQL batch projection failed, projecting {len(event_dicts)} events one by one")
+    for event_dict in event_dicts:
+        _attempt_mysql_projection(event_dict, mysql_client, get_correlation_id())
+
+
+def _attempt_mysql_projection(event_dict: Dict[str, Any], mysql_client: MySQLClient,
+                              correlation_id: Optional[str] = None) -> bool:
+    """
+    Одна попытка проекции в MySQL из потока консьюмера
+    
+    Повторов с паузой здесь нет: они держали бы сообщение и консьюмер.
+    Надёжная проекция — приёмник (SINK_MYSQL_ENABLED) или outbox
+    (OUTBOX_ENABLED); пропущенную строку восстанавливает
+    scripts/rebuild_projection.py.
+    
+    Returns:
+        bool: True если проекция записана
+    """
+    event_id = event_dict.get('event_id', 'unknown')
+    started = time.time()
+    try:
+        if mysql_client.upsert_projection(event_dict):
+            logger.info(f"Event projection saved to MySQL: {event_id} ({time.time() - started:.3f}s), correlation: {correlation_id}")
+            return True
+        logger.warning(f"MySQL projection failed, skipped: {event_id}, correlation: {correlation_id}")
     except Exception as e:
-        logger.error(f"Unexpected error: {e}, correlation: {correlation_id}")
-        if rabbit_url:
-            _send_to_dlq(message_body, rabbit_url, {
-                "reason": "unexpected_error",
-                "error": str(e),
-                "exception_type": type(e).__name__,
-                "correlation_id": correlation_id
-            })
-        return False
+        logger.error(
+            f"MySQL projection failed, skipped: {event_id}: {type(e).__name__}: {e} "
+            f"({time.time() - started:.3f}s), correlation: {correlation_id}"
+        )
+    return False
 
 
 def _attempt_mysql_projection_with_retry(event_dict: Dict[str, Any], mysql_client: MySQLClient, correlation_id: str = None):
     """
-    Попытка сохранения в MySQL с повторными попытками
+    Попытка сохранения в MySQL с повторными попытками (только handle_event_with_retry;
+    воркер вызывает _attempt_mysql_projection)
     
     Args:
         event_dict: Данные события
@@ -141,8 +538,16 @@ def _attempt_mysql_projection_with_retry(event_dict: Dict[str, Any], mysql_clien
     return False
 
 
-def _send_to_dlq(message_body: bytes, rabbit_url: str, error_info: dict):
+def _send_to_dlq(message_body: bytes, rabbit_url: Optional[str], error_info: dict,
+                 publisher: Optional[ConfirmingPublisher] = None):
     """Вспомогательная функция для отправки в DLQ"""
+    if publisher is not None:
+        future = publisher.submit(DLQ_QUEUE, *build_dlq_message(message_body, error_info))
+        _await_dlq_confirm(future, publisher.confirm_timeout, error_info)
+        return
+    if not rabbit_url:
+        return
+    
     try:
         from shared.rabbit import publish_to_dlq
         publish_to_dlq(rabbit_url, message_body, error_info)
@@ -151,10 +556,21 @@ def _send_to_dlq(message_body: bytes, rabbit_url: str, error_info: dict):
         logger.error(f"Failed to send to DLQ: {dlq_error}, correlation: {error_info.get('correlation_id')}")
 
 
+def _await_dlq_confirm(future, timeout: float, error_info: dict):
+    """Ожидание подтверждения копии в DLQ до отклонения исходного сообщения"""
+    try:
+        wait_confirm(future, timeout)
+        logger.info(f"Message sent to DLQ: {error_info['reason']}, correlation: {error_info.get('correlation_id')}")
+    except PublishError as dlq_error:
+        # Исходное сообщение всё равно отклоняется: брокер переложит его в DLQ по x-dead-letter-routing-key
+        logger.error(f"DLQ copy not confirmed: {dlq_error}, correlation: {error_info.get('correlation_id')}")
+
+
 def handle_event_with_retry(
     message_body: bytes,
     pg_client: PostgresClient,
-    mysql_client: MySQLClient = None
+    mysql_client: MySQLClient = None,
+    content_type: str = None
 ) -> bool:
     """
     Обработка события с retry для MySQL (совместимость с существующим кодом)
@@ -163,6 +579,7 @@ def handle_event_with_retry(
         message_body: Тело сообщения из RabbitMQ
         pg_client: Клиент PostgreSQL
         mysql_client: Клиент MySQL (опционально)
+        content_type: AMQP content_type сообщения (JSON, если не указан)
         
     Returns:
         bool: True если событие успешно обработано
@@ -170,12 +587,11 @@ def handle_event_with_retry(
     correlation_id = get_correlation_id()
     
     try:
-        # Парсим JSON
-        message_str = message_body.decode('utf-8')
-        raw_data = json.loads(message_str)
+        # Декодируем тело (JSON или MessagePack)
+        raw_data = decode_message(message_body, content_type)
         
-        # Валидируем через Pydantic модель
-        event = IncomingEvent(**raw_data)
+        # Валидируем (быстрый путь с теми же результатами и ошибками, что у pydantic)
+        event = validate_event(raw_data)
         
         logger.info(f"Processing event: {event.event_id}, type: {event.event_type}, correlation: {correlation_id}")
         
@@ -198,8 +614,8 @@ def handle_event_with_retry(
         
         return True
         
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in message: {e}, correlation: {correlation_id}")
+    except MessageDecodeError as e:
+        logger.error(f"Invalid message body ({e.content_type}): {e}, correlation: {correlation_id}")
         return False
     except Exception as e:
         logger.error(f"Failed to process event: {e}, correlation: {correlation_id}")
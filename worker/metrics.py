@@ -0,0 +1,105 @@
+import logging
+
+# prometheus_client опционален: без него метрики воркера не собираются
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+class _NullMetric:
+    """Заглушка метрики, если prometheus_client не установлен"""
+    
+    def labels(self, *args, **kwargs):
+        return self
+    
+    def inc(self, amount=1):
+        pass
+    
+    def observe(self, value):
+        pass
+    
+    def set(self, value):
+        pass
+    
+    def set_function(self, f):
+        pass
+
+
+if prometheus_client is not None:
+    SINK_EVENTS = prometheus_client.Counter(
+        'ingestion_worker_sink_events_total',
+        'Events handed to secondary sinks, by sink and outcome',
+        ['sink', 'outcome']
+    )
+    SINK_DROPPED = prometheus_client.Counter(
+        'ingestion_worker_sink_dropped_total',
+        'Events dropped by secondary sinks, by sink and reason',
+        ['sink', 'reason']
+    )
+    SINK_QUEUE_DEPTH = prometheus_client.Gauge(
+        'ingestion_worker_sink_queue_depth',
+        'Events waiting in the sink queue',
+        ['sink']
+    )
+    SINK_LAG = prometheus_client.Gauge(
+        'ingestion_worker_sink_lag_seconds',
+        'Age of the oldest event waiting in the sink queue',
+        ['sink']
+    )
+    SINK_DELIVERY_SECONDS = prometheus_client.Histogram(
+        'ingestion_worker_sink_delivery_seconds',
+        'Time from enqueue to successful sink write',
+        ['sink'],
+        buckets=_LATENCY_BUCKETS
+    )
+    SEEN_FILTER_LOOKUPS = prometheus_client.Counter(
+        'ingestion_worker_seen_filter_lookups_total',
+        'Seen-ids filter lookups: miss, duplicate (confirmed hit), false_positive',
+        ['result']
+    )
+    PROJECTOR_EVENTS = prometheus_client.Counter(
+        'ingestion_projector_events_total',
+        'Outbox events handled by the projector, by outcome',
+        ['outcome']
+    )
+    PROJECTOR_LAG = prometheus_client.Gauge(
+        'ingestion_projector_lag_seconds',
+        'Age of the oldest outbox row in the last claimed batch'
+    )
+else:
+    SINK_EVENTS = SINK_DROPPED = SINK_QUEUE_DEPTH = SINK_LAG = SINK_DELIVERY_SECONDS = _NullMetric()
+    SEEN_FILTER_LOOKUPS = _NullMetric()
+    PROJECTOR_EVENTS = PROJECTOR_LAG = _NullMetric()
+
+
+def start_metrics_server(port: int) -> bool:
+    """
+    HTTP-эндпоинт /metrics воркера
+    
+    Args:
+        port: Порт (0 — не запускать)
+    
+    Returns:
+        bool: True если сервер запущен
+    """
+    if not port:
+        return False
+    if prometheus_client is None:
+        logger.warning("WORKER_METRICS_PORT is set but prometheus_client is not installed")
+        return False
+    try:
+        prometheus_client.start_http_server(port)
+    except OSError as e:
+        # Например, несколько процессов супервизора на одном порту
+        logger.warning(f"Failed to start metrics server on port {port}: {e}")
+        return False
+    logger.info(f"Metrics server listening on port {port}")
+    return True
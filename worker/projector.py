@@ -0,0 +1,231 @@
+import sys
+import os
+import logging
+import select
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+# Добавляем корневую директорию проекта в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from worker.config import Config
+from shared.db_mysql import MySQLClient
+from shared.db_postgres import CONNECTION_ERRORS, OUTBOX_CHANNEL, ensure_outbox
+from shared.logging import setup_logging
+from worker.metrics import PROJECTOR_EVENTS, PROJECTOR_LAG, start_metrics_server
+from worker.sinks import MySQLProjectionSink
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = setup_logging(__name__, Config.LOG_LEVEL, json_format=Config.JSON_LOGS)
+
+# SKIP LOCKED: несколько проекторов разбирают outbox, не мешая друг другу.
+# LEFT JOIN — строку outbox без события (событие удалено) тоже нужно убрать
+_CLAIM_SQL = """
+SELECT o.id AS outbox_id, o.attempts, o.created_at AS queued_at, o.event_id,
+       e.id AS event_pk, e.event_type, e.source, e.occurred_at, e.payload
+FROM events_outbox o
+LEFT JOIN events e ON e.event_id = o.event_id
+ORDER BY o.id
+LIMIT %s
+FOR UPDATE OF o SKIP LOCKED;
+"""
+
+_DELETE_SQL = "DELETE FROM events_outbox WHERE id = ANY(%s);"
+
+_FAILED_SQL = "UPDATE events_outbox SET attempts = attempts + 1 WHERE id = ANY(%s);"
+
+
+class OutboxProjector:
+    """
+    Проектор outbox: переносит новые события из PostgreSQL в MySQL
+    
+    Воркер с OUTBOX_ENABLED=true в той же транзакции, что и INSERT в
+    events, ставит событие в events_outbox, поэтому проекция не теряется
+    при падении между записью в PostgreSQL и MySQL, а MySQL не стоит на
+    пути сообщения. Проектор забирает до OUTBOX_BATCH_SIZE строк
+    (FOR UPDATE SKIP LOCKED), пишет их в MySQL многострочным upsert и
+    удаляет одним DELETE в той же транзакции. Пока outbox пуст, проектор
+    ждёт NOTIFY, а раз в OUTBOX_POLL_INTERVAL проверяет outbox сам.
+    
+    Строки, которые MySQL не принял, остаются в outbox со счётчиком
+    attempts и повторяются через OUTBOX_RETRY_DELAY; после
+    OUTBOX_MAX_ATTEMPTS они удаляются (проекцию можно пересобрать
+    scripts/rebuild_projection.py).
+    """
+    
+    def __init__(self, config: Config = None):
+        self.config = config or Config()
+        self.batch_size = max(1, self.config.OUTBOX_BATCH_SIZE)
+        self.conn = None
+        self.listen_conn = None
+        self.sink: Optional[MySQLProjectionSink] = None
+        self.stopping = threading.Event()
+        
+        self.projected = 0
+        self.retried = 0
+        self.dropped = 0
+        self._projected_metric = PROJECTOR_EVENTS.labels('projected')
+        self._retried_metric = PROJECTOR_EVENTS.labels('retried')
+        self._dropped_metric = PROJECTOR_EVENTS.labels('dropped')
+    
+    def setup_signal_handlers(self):
+        signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)
+    
+    def signal_handler(self, signum, frame):
+        logger.info(f"Received signal {signum}, shutting down...")
+        self.stopping.set()
+    
+    def connect(self):
+        """Соединения с PostgreSQL (разбор outbox и LISTEN) и MySQL"""
+        self.conn = psycopg2.connect(self.config.POSTGRES_URL, cursor_factory=RealDictCursor)
+        ensure_outbox(self.conn)
+        
+        # Уведомления приходят только на соединение в autocommit
+        self.listen_conn = psycopg2.connect(self.config.POSTGRES_URL)
+        self.listen_conn.autocommit = True
+        with self.listen_conn.cursor() as cur:
+            cur.execute(f"LISTEN {OUTBOX_CHANNEL};")
+        logger.info(f"✅ Connected to PostgreSQL, listening on {OUTBOX_CHANNEL}")
+        
+        if self.sink is None:
+            mysql_client = MySQLClient(self.config.MYSQL_URL, pool_size=1)
+            mysql_client.connect()
+            self.sink = MySQLProjectionSink(mysql_client)
+            logger.info("✅ Connected to MySQL (projection)")
+    
+    def close(self):
+        for conn in (self.conn, self.listen_conn):
+            if conn is not None and not conn.closed:
+                conn.close()
+        self.conn = self.listen_conn = None
+    
+    def project_batch(self) -> Tuple[int, int]:
+        """
+        Одна пачка outbox: захват, upsert в MySQL, удаление — одна транзакция
+        
+        Returns:
+            Tuple[int, int]: (захвачено строк, не принято MySQL)
+        """
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(_CLAIM_SQL, (self.batch_size,))
+                rows = cur.fetchall()
+                if not rows:
+                    self.conn.commit()
+                    return 0, 0
+                
+                oldest = min(row['queued_at'] for row in rows)
+                PROJECTOR_LAG.set((datetime.now(timezone.utc) - oldest).total_seconds())
+                
+                done = [row['outbox_id'] for row in rows if row['event_pk'] is None]
+                if done:
+                    logger.warning(f"{len(done)} outbox rows have no event in events, removing them")
+                
+                by_event_id = {row['event_id']: row for row in rows if row['event_pk'] is not None}
+                events = [dict(row) for row in by_event_id.values()]
+                try:
+                    failed = self.sink.write(events) if events else []
+                except Exception as e:
+                    logger.error(f"MySQL projection failed for {len(events)} events: {type(e).__name__}: {e}")
+                    failed = events
+                failed_ids = {event_data['event_id'] for event_data in failed}
+                
+                retry, dropped = [], []
+                for event_id, row in by_event_id.items():
+                    if event_id not in failed_ids:
+                        done.append(row['outbox_id'])
+                    elif row['attempts'] + 1 >= self.config.OUTBOX_MAX_ATTEMPTS:
+                        logger.error(f"Giving up on projection of {event_id} after {row['attempts'] + 1} attempts")
+                        dropped.append(row['outbox_id'])
+                    else:
+                        retry.append(row['outbox_id'])
+                
+                cur.execute(_DELETE_SQL, (done + dropped,))
+                if retry:
+                    cur.execute(_FAILED_SQL, (retry,))
+            self.conn.commit()
+        except Exception:
+            if not self.conn.closed:
+                self.conn.rollback()
+            raise
+        
+        projected = len(events) - len(failed)
+        self.projected += projected
+        self.retried += len(retry)
+        self.dropped += len(dropped)
+        self._projected_metric.inc(projected)
+        self._retried_metric.inc(len(retry))
+        self._dropped_metric.inc(len(dropped))
+        logger.info(f"Outbox batch: {projected} projected, {len(retry)} to retry, {len(dropped)} dropped")
+        return len(rows), len(failed)
+    
+    def wait_for_notify(self, timeout: float) -> None:
+        """Ожидание NOTIFY не дольше timeout; проверяем остановку раз в секунду"""
+        deadline = time.monotonic() + timeout
+        while not self.stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([self.listen_conn], [], [], min(remaining, 1.0))
+            if readable:
+                self.listen_conn.poll()
+                if self.listen_conn.notifies:
+                    # Одного уведомления достаточно: пачку забираем запросом
+                    self.listen_conn.notifies.clear()
+                    return
+    
+    def run(self):
+        logger.info("Starting outbox projector...")
+        self.setup_signal_handlers()
+        start_metrics_server(self.config.PROJECTOR_METRICS_PORT)
+        
+        while not self.stopping.is_set():
+            try:
+                self.connect()
+                while not self.stopping.is_set():
+                    claimed, failed = self.project_batch()
+                    if failed:
+                        self.stopping.wait(self.config.OUTBOX_RETRY_DELAY)
+                    elif claimed < self.batch_size:
+                        # Outbox разобран: ждём новых событий
+                        self.wait_for_notify(self.config.OUTBOX_POLL_INTERVAL)
+            except CONNECTION_ERRORS as e:
+                logger.error(f"PostgreSQL connection error: {e}")
+            except Exception as e:
+                logger.error(f"Unexpected error: {type(e).__name__}: {e}")
+            finally:
+                self.close()
+            
+            if not self.stopping.is_set():
+                logger.info(f"Reconnecting in {self.config.WORKER_RECONNECT_DELAY} seconds...")
+                self.stopping.wait(self.config.WORKER_RECONNECT_DELAY)
+        
+        if self.sink is not None:
+            self.sink.close()
+        logger.info(f"Projector stopped: {self.projected} projected, {self.retried} retried, {self.dropped} dropped")
+
+
+def main():
+    """Точка входа"""
+    if not Config.MYSQL_URL:
+        logger.error("❌ MYSQL_URL is not set, nothing to project to")
+        sys.exit(1)
+    OutboxProjector().run()
+
+
+if __name__ == "__main__":
+    main()
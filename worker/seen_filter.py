@@ -0,0 +1,247 @@
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# flock — только POSIX; без него файл не защищён от второго процесса
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from worker.metrics import SEEN_FILTER_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'SEENBF01'
+# magic, число бит, число хешей, текущее поколение, (число id, время создания) × 2
+_HEADER = struct.Struct('<8sQIIQdQd')
+_HEADER_SIZE = 64
+# Процессы супервизора занимают файлы path, path.1, path.2, ...
+_MAX_SLOTS = 64
+
+
+class SeenIdsFilter:
+    """
+    Bloom-фильтр недавно записанных event_id в файле, отображённом в память
+    
+    Промах означает, что event_id точно не добавлялся, и событие можно
+    сразу вставлять. Попадание — "возможно, уже записано", его нужно
+    подтвердить запросом. Ложные промахи невозможны только для того, что
+    было добавлено в этот файл, поэтому фильтр лишь экономит запросы:
+    вставка по-прежнему идёт с ON CONFLICT DO NOTHING.
+    
+    Фильтр состоит из двух поколений по capacity id. Когда текущее
+    заполнено или старше rotate_after секунд, предыдущее очищается и
+    становится текущим. Так фильтр помнит id за последние rotate_after..
+    2 × rotate_after секунд, а доля ложных попаданий не растёт.
+    
+    Биты лежат прямо в mmap, поэтому переживают перезапуск процесса;
+    checkpoint() сбрасывает их на диск. Каждый процесс берёт свой файл
+    (flock): path, path.1, path.2, ...
+    """
+    
+    def __init__(self, path: str, capacity: int = 1000000, error_rate: float = 0.001,
+                 rotate_after: float = 3600.0, checkpoint_interval: float = 10.0):
+        """
+        Args:
+            path: Файл фильтра
+            capacity: id в одном поколении
+            error_rate: Доля ложных попаданий при заполненном поколении
+            rotate_after: Максимальный возраст поколения (секунды)
+            checkpoint_interval: Как часто сбрасывать биты на диск (секунды)
+        """
+        self.capacity = max(1, capacity)
+        self.rotate_after = rotate_after
+        self.checkpoint_interval = checkpoint_interval
+        
+        # Оптимальные размеры: m = -n·ln p / ln²2, k = m/n · ln 2
+        bits = -self.capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.generation_bytes = max(8, int(math.ceil(bits / 64)) * 8)
+        self.bits = self.generation_bytes * 8
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        
+        self._lock = threading.Lock()
+        self.path, self._fd = self._open_slot(path)
+        self.fresh = self._prepare_file()
+        self._mm = mmap.mmap(self._fd, _HEADER_SIZE + 2 * self.generation_bytes)
+        self._read_header()
+        self._last_checkpoint = time.monotonic()
+        
+        self.misses = 0
+        self.maybe = 0
+        self.duplicates = 0
+        self.false_positives = 0
+        self._miss_metric = SEEN_FILTER_LOOKUPS.labels('miss')
+        self._duplicate_metric = SEEN_FILTER_LOOKUPS.labels('duplicate')
+        self._false_positive_metric = SEEN_FILTER_LOOKUPS.labels('false_positive')
+        
+        logger.info(
+            f"Seen-ids filter {self.path}: {self.bits} bits × 2 generations, {self.hashes} hashes, "
+            f"{'new' if self.fresh else f'loaded {self.counts[0] + self.counts[1]} ids'}"
+        )
+    
+    def _open_slot(self, path: str) -> Tuple[str, int]:
+        """Первый файл path[.N], который не занят другим процессом"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        for slot in range(_MAX_SLOTS):
+            candidate = path if slot == 0 else f"{path}.{slot}"
+            fd = os.open(candidate, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is None:
+                return candidate, fd
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return candidate, fd
+            except OSError:
+                os.close(fd)
+        raise RuntimeError(f"All {_MAX_SLOTS} seen-ids filter files are locked: {path}")
+    
+    def _prepare_file(self) -> bool:
+        """
+        Проверка заголовка файла; несовместимый или пустой файл пересоздаётся
+        
+        Returns:
+            bool: True если файл создан заново (фильтр пуст)
+        """
+        size = _HEADER_SIZE + 2 * self.generation_bytes
+        if os.fstat(self._fd).st_size == size:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            magic, bits, hashes, *_ = _HEADER.unpack(header)
+            if magic == _MAGIC and bits == self.bits and hashes == self.hashes:
+                return False
+        
+        # Размеры изменились (capacity / error_rate) — старые биты бесполезны
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, size)
+        os.pwrite(self._fd, _HEADER.pack(_MAGIC, self.bits, self.hashes, 0, 0, time.time(), 0, 0.0), 0)
+        return True
+    
+    def _read_header(self) -> None:
+        _, _, _, current, count0, created0, count1, created1 = _HEADER.unpack_from(self._mm, 0)
+        self.current = current
+        self.counts = [count0, count1]
+        self.created = [created0, created1]
+    
+    def _write_header(self) -> None:
+        _HEADER.pack_into(
+            self._mm, 0, _MAGIC, self.bits, self.hashes, self.current,
+            self.counts[0], self.created[0], self.counts[1], self.created[1]
+        )
+    
+    def _positions(self, event_id: str):
+        """k позиций бит (двойное хеширование Кирша — Митценмахера)"""
+        digest = blake2b(event_id.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+    
+    def _contains(self, generation: int, positions) -> bool:
+        offset = _HEADER_SIZE + generation * self.generation_bytes
+        mm = self._mm
+        for position in positions:
+            if not mm[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+    
+    def might_contain(self, event_id: Optional[str]) -> bool:
+        """False — event_id точно не добавлялся; True — возможно, добавлялся"""
+        if not event_id:
+            return False
+        positions = self._positions(event_id)
+        with self._lock:
+            found = self._contains(self.current, positions) or self._contains(1 - self.current, positions)
+            if found:
+                self.maybe += 1
+            else:
+                self.misses += 1
+        if not found:
+            self._miss_metric.inc()
+        return found
+    
+    def record_lookup(self, found: bool) -> None:
+        """Результат подтверждающего запроса после попадания"""
+        with self._lock:
+            if found:
+                self.duplicates += 1
+            else:
+                self.false_positives += 1
+        (self._duplicate_metric if found else self._false_positive_metric).inc()
+    
+    def add(self, event_id: Optional[str]) -> None:
+        if event_id:
+            self.add_many((event_id,))
+    
+    def add_many(self, event_ids: Iterable[str]) -> int:
+        """Добавление id в текущее поколение; возвращает число добавленных"""
+        added = 0
+        with self._lock:
+            mm = self._mm
+            for event_id in event_ids:
+                if not event_id:
+                    continue
+                self._maybe_rotate()
+                offset = _HEADER_SIZE + self.current * self.generation_bytes
+                for position in self._positions(event_id):
+                    index = offset + (position >> 3)
+                    mm[index] = mm[index] | (1 << (position & 7))
+                self.counts[self.current] += 1
+                added += 1
+            
+            if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+                self._checkpoint_locked()
+        return added
+    
+    def _maybe_rotate(self) -> None:
+        """Смена поколения (под self._lock)"""
+        current = self.current
+        if self.counts[current] < self.capacity and time.time() - self.created[current] < self.rotate_after:
+            return
+        
+        new = 1 - current
+        offset = _HEADER_SIZE + new * self.generation_bytes
+        self._mm[offset:offset + self.generation_bytes] = bytes(self.generation_bytes)
+        self.counts[new] = 0
+        self.created[new] = time.time()
+        self.current = new
+        self._write_header()
+        logger.info(f"Seen-ids filter rotated: previous generation has {self.counts[current]} ids")
+    
+    def checkpoint(self) -> None:
+        """Сброс заголовка и бит на диск"""
+        with self._lock:
+            self._checkpoint_locked()
+    
+    def _checkpoint_locked(self) -> None:
+        self._write_header()
+        self._mm.flush()
+        self._last_checkpoint = time.monotonic()
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._mm.closed:
+                return
+            self._checkpoint_locked()
+            self._mm.close()
+            # Закрытие дескриптора снимает flock
+            os.close(self._fd)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'path': self.path,
+                'bits': self.bits,
+                'hashes': self.hashes,
+                'ids': self.counts[0] + self.counts[1],
+                'misses': self.misses,
+                'maybe': self.maybe,
+                'duplicates': self.duplicates,
+                'false_positives': self.false_positives
+            }
@@ -0,0 +1,361 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from shared.db_mysql import MySQLClient
+from worker.metrics import SINK_DELIVERY_SECONDS, SINK_DROPPED, SINK_EVENTS, SINK_LAG, SINK_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# Что делать с событием, если очередь приёмника заполнена
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_POLICIES = (OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK)
+
+# Drop-события логируются не чаще, чем раз в столько секунд на приёмник
+_DROP_LOG_INTERVAL = 10.0
+
+
+class Sink:
+    """
+    Вторичный приёмник событий (после записи в PostgreSQL)
+    
+    Подклассы задают name и write(). write() вызывается из потоков
+    SinkRunner, одновременно не больше concurrency вызовов.
+    """
+    
+    name = 'sink'
+    
+    def write(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Запись пачки событий
+        
+        Returns:
+            События, которые записать не удалось (пустой список — всё записано)
+        """
+        raise NotImplementedError
+    
+    def close(self) -> None:
+        pass
+
+
+class MySQLProjectionSink(Sink):
+    """Проекция событий в MySQL: пачка одним upsert, при ошибке — по одному"""
+    
+    name = 'mysql_projection'
+    
+    def __init__(self, mysql_client: MySQLClient):
+        self.mysql_client = mysql_client
+    
+    def write(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.mysql_client.upsert_projections(events):
+            return []
+        if len(events) == 1:
+            return events
+        
+        # Изолируем строки, из-за которых упала пачка
+        logger.warning(f"MySQL batch projection failed, projecting {len(events)} events one by one")
+        return [event_data for event_data in events if not self.mysql_client.upsert_projection(event_data)]
+    
+    def close(self) -> None:
+        self.mysql_client.close()
+
+
+class SinkRunner:
+    """
+    Очередь и потоки одного приёмника
+    
+    Событие кладётся в ограниченную очередь и сразу возвращает управление;
+    concurrency потоков забирают события пачками до batch_size (или
+    сколько накопилось за batch_timeout секунд) и пишут их в приёмник.
+    Неудачные события повторяются с экспоненциальной задержкой до
+    max_attempts раз, затем отбрасываются. При заполненной очереди
+    действует overflow:
+    - drop_newest — новое событие отбрасывается;
+    - drop_oldest — отбрасывается самое старое в очереди;
+    - block — ожидание места до block_timeout секунд, затем drop_newest.
+    """
+    
+    def __init__(self, sink: Sink, queue_size: int = 10000, batch_size: int = 100,
+                 batch_timeout: float = 0.05, concurrency: int = 1,
+                 overflow: str = OVERFLOW_DROP_OLDEST, block_timeout: float = 0.1,
+                 max_attempts: int = 3, retry_delay: float = 1.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown sink overflow policy: {overflow}")
+        
+        self.sink = sink
+        self.name = sink.name
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout = batch_timeout
+        self.concurrency = max(1, concurrency)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        
+        # (время постановки в очередь, событие)
+        self.buffer: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.closed = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self.in_flight = 0
+        
+        self.enqueued = 0
+        self.written = 0
+        self.dropped: Dict[str, int] = {'overflow': 0, 'error': 0, 'shutdown': 0}
+        self.last_delivery_seconds = 0.0
+        self._last_drop_log = 0.0
+        
+        # Дочерние метрики создаются заранее, на горячем пути — только inc/observe
+        self._enqueued_metric = SINK_EVENTS.labels(self.name, 'enqueued')
+        self._written_metric = SINK_EVENTS.labels(self.name, 'written')
+        self._delivery_metric = SINK_DELIVERY_SECONDS.labels(self.name)
+        SINK_QUEUE_DEPTH.labels(self.name).set_function(lambda: len(self.buffer))
+        SINK_LAG.labels(self.name).set_function(self.lag_seconds)
+    
+    def start(self) -> None:
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f'sink-{self.name}-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def offer(self, event_data: Dict[str, Any]) -> bool:
+        """
+        Постановка события в очередь приёмника
+        
+        Returns:
+            bool: True если событие принято, False если отброшено
+        """
+        with self.lock:
+            if self.closed.is_set():
+                self._drop('shutdown')
+                return False
+            
+            if len(self.buffer) >= self.queue_size:
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    self.buffer.popleft()
+                    self._drop('overflow')
+                elif self.overflow == OVERFLOW_DROP_NEWEST or not self._wait_for_space():
+                    self._drop('overflow')
+                    return False
+            
+            self.buffer.append((time.monotonic(), event_data))
+            self.enqueued += 1
+            self.not_empty.notify()
+        
+        self._enqueued_metric.inc()
+        return True
+    
+    def _wait_for_space(self) -> bool:
+        """Ожидание места в очереди (под self.lock) не дольше block_timeout"""
+        deadline = time.monotonic() + self.block_timeout
+        while len(self.buffer) >= self.queue_size and not self.closed.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.not_full.wait(remaining)
+        return len(self.buffer) < self.queue_size
+    
+    def lag_seconds(self) -> float:
+        """Возраст самого старого события в очереди"""
+        try:
+            enqueued_at = self.buffer[0][0]
+        except IndexError:
+            return 0.0
+        return time.monotonic() - enqueued_at
+    
+    def _drop(self, reason: str, count: int = 1) -> None:
+        """Учёт отброшенных событий (под self.lock)"""
+        self.dropped[reason] += count
+        SINK_DROPPED.labels(self.name, reason).inc(count)
+        
+        now = time.monotonic()
+        if now - self._last_drop_log >= _DROP_LOG_INTERVAL:
+            self._last_drop_log = now
+            logger.warning(
+                f"Sink {self.name} dropped events: {self.dropped}, "
+                f"queue {len(self.buffer)}/{self.queue_size}, lag {self.lag_seconds():.1f}s"
+            )
+    
+    def _take_batch(self) -> Optional[List[Tuple[float, Dict[str, Any]]]]:
+        """Следующая пачка; None — очередь закрыта и пуста"""
+        with self.lock:
+            while not self.buffer and not self.closed.is_set():
+                self.not_empty.wait()
+            if not self.buffer:
+                return None
+            
+            # Даём пачке набраться, но не дольше batch_timeout
+            deadline = time.monotonic() + self.batch_timeout
+            while len(self.buffer) < self.batch_size and not self.closed.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.not_empty.wait(remaining)
+            if not self.buffer:
+                return None
+            
+            count = min(self.batch_size, len(self.buffer))
+            batch = [self.buffer.popleft() for _ in range(count)]
+            self.in_flight += count
+            self.not_full.notify(count)
+            return batch
+    
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self.lock:
+                    self.in_flight -= len(batch)
+    
+    def _write(self, batch: List[Tuple[float, Dict[str, Any]]]) -> None:
+        """Запись пачки с повторами неудачных событий"""
+        pending = [event_data for _, event_data in batch]
+        
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                failed = self.sink.write(pending)
+            except Exception as e:
+                logger.error(f"Sink {self.name} write failed (attempt {attempt}/{self.max_attempts}): {type(e).__name__}: {e}")
+                failed = pending
+            
+            if not failed:
+                pending = []
+                break
+            pending = failed
+            
+            if attempt == self.max_attempts:
+                logger.error(f"Sink {self.name} gave up on {len(pending)} events after {attempt} attempts")
+                with self.lock:
+                    self._drop('error', len(pending))
+                break
+            
+            wait_time = self.retry_delay * (2 ** (attempt - 1))
+            logger.warning(f"Sink {self.name}: {len(pending)} events failed, retrying in {wait_time:.1f}s")
+            # При остановке повторяем сразу: срок задаёт close()
+            self.closed.wait(wait_time)
+        
+        written = len(batch) - len(pending)
+        self.last_delivery_seconds = time.monotonic() - batch[0][0]
+        self._delivery_metric.observe(self.last_delivery_seconds)
+        with self.lock:
+            self.written += written
+        self._written_metric.inc(written)
+    
+    def close(self, timeout: float) -> None:
+        """Дописать очередь за timeout секунд; остальное отбрасывается"""
+        with self.lock:
+            self.closed.set()
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+        
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self.threads = []
+        
+        with self.lock:
+            left = len(self.buffer) + self.in_flight
+            self.buffer.clear()
+            if left:
+                self._drop('shutdown', left)
+                logger.warning(f"Sink {self.name} stopped with {left} events not written")
+        
+        self.sink.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'queue': len(self.buffer),
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': dict(self.dropped),
+                'lag_seconds': round(self.lag_seconds(), 3),
+                'last_delivery_seconds': round(self.last_delivery_seconds, 3)
+            }
+
+
+class SinkFanout:
+    """
+    Раздача записанных в PostgreSQL событий вторичным приёмникам
+    
+    publish() не ждёт приёмники: у каждого своя очередь, пачки, потоки и
+    политика переполнения, поэтому медленный приёмник не замедляет ни
+    основной путь, ни другие приёмники.
+    """
+    
+    def __init__(self, runners: List[SinkRunner]):
+        self.runners = runners
+    
+    def start(self) -> None:
+        for runner in self.runners:
+            runner.start()
+            logger.info(
+                f"Sink {runner.name} started: queue {runner.queue_size}, batch {runner.batch_size}, "
+                f"concurrency {runner.concurrency}, overflow {runner.overflow}"
+            )
+    
+    def publish(self, event_data: Dict[str, Any]) -> None:
+        for runner in self.runners:
+            runner.offer(event_data)
+    
+    def publish_many(self, events: List[Dict[str, Any]]) -> None:
+        for event_data in events:
+            self.publish(event_data)
+    
+    def close(self, timeout: float = 10.0) -> None:
+        """Остановка приёмников; общий срок на дописывание очередей — timeout"""
+        deadline = time.monotonic() + timeout
+        for runner in self.runners:
+            runner.close(max(0.0, deadline - time.monotonic()))
+            logger.info(f"Sink {runner.name} stopped: {runner.stats()}")
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {runner.name: runner.stats() for runner in self.runners}
+
+
+def start_mysql_sinks(config) -> Optional[SinkFanout]:
+    """
+    Проекция в MySQL через свою очередь и потоки (SINK_MYSQL_*)
+    
+    Args:
+        config: Конфигурация воркера
+    
+    Returns:
+        Запущенные приёмники или None, если MySQL недоступен
+    """
+    try:
+        mysql_client = MySQLClient(config.MYSQL_URL, pool_size=max(1, config.SINK_MYSQL_CONCURRENCY))
+        mysql_client.connect()
+    except Exception as e:
+        # MySQL НЕ обязателен для работы воркера
+        logger.warning(f"⚠️  Failed to connect to MySQL (projection will be skipped): {e}")
+        return None
+    
+    sinks = SinkFanout([
+        SinkRunner(
+            MySQLProjectionSink(mysql_client),
+            queue_size=config.SINK_MYSQL_QUEUE_SIZE,
+            batch_size=config.SINK_MYSQL_BATCH_SIZE,
+            batch_timeout=config.SINK_MYSQL_BATCH_TIMEOUT_MS / 1000,
+            concurrency=config.SINK_MYSQL_CONCURRENCY,
+            overflow=config.SINK_MYSQL_OVERFLOW,
+            block_timeout=config.SINK_MYSQL_BLOCK_TIMEOUT_MS / 1000,
+            max_attempts=config.SINK_MYSQL_MAX_ATTEMPTS
+        )
+    ])
+    sinks.start()
+    logger.info("✅ Connected to MySQL (projection sink)")
+    return sinks
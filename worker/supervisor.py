@@ -0,0 +1,279 @@
+import sys
+import os
+import signal
+import time
+import multiprocessing
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Добавляем корневую директорию проекта в путь Python
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pika
+from worker.config import Config
+from worker.worker import main as run_worker
+from shared.rabbit import get_connection
+from shared.logging import setup_logging
+
+logger = setup_logging(__name__, Config.LOG_LEVEL, json_format=Config.JSON_LOGS)
+
+# spawn, а не fork: дочерний процесс не наследует соединение с RabbitMQ супервизора
+_mp = multiprocessing.get_context('spawn')
+
+
+class ScalePolicy(NamedTuple):
+    """Границы и пороги автомасштабирования"""
+    min_workers: int
+    max_workers: int
+    # Очередь на одного консьюмера, выше которой добавляется процесс
+    scale_up_backlog: float
+    # Очередь на одного консьюмера, ниже которой процесс простаивает
+    scale_down_backlog: float
+    # Сколько замеров подряд ниже scale_down_backlog до остановки процесса
+    scale_down_samples: int
+
+
+def scale_decision(policy: ScalePolicy, desired: int, idle_samples: int,
+                   depth: int, consumers: int, active: int) -> Tuple[int, int]:
+    """
+    Желаемое число процессов по одному замеру очереди
+    
+    Args:
+        policy: Границы и пороги
+        desired: Текущее желаемое число процессов
+        idle_samples: Замеров подряд ниже scale_down_backlog до этого
+        depth: Готовых сообщений в очереди
+        consumers: Консьюмеров очереди
+        active: Работающих (не завершающихся) процессов
+    
+    Returns:
+        (новое желаемое число процессов, новый счётчик простоя)
+    """
+    # Процессы ещё подключаются — замер не отражает их пропускную способность
+    if consumers < active:
+        return desired, idle_samples
+    
+    backlog = depth / max(consumers, 1)
+    if backlog > policy.scale_up_backlog:
+        return min(desired + 1, policy.max_workers), 0
+    if backlog < policy.scale_down_backlog:
+        idle_samples += 1
+        if idle_samples >= policy.scale_down_samples and desired > policy.min_workers:
+            return desired - 1, 0
+        return desired, idle_samples
+    return desired, 0
+
+
+def restart_delay(crashes: int, backoff: float, max_backoff: float) -> float:
+    """Задержка перезапуска после crashes падений подряд: удваивается до max_backoff"""
+    return min(backoff * (2 ** (crashes - 1)), max_backoff)
+
+
+class Supervisor:
+    """
+    Супервизор процессов EventWorker
+    
+    Держит от min_workers до max_workers дочерних процессов воркера:
+    перезапускает упавшие с экспоненциальной задержкой, пересылает SIGTERM
+    для корректного завершения и меняет число процессов по глубине очереди
+    events. Очередь опрашивается пассивным queue_declare: число готовых
+    сообщений, делённое на число консьюмеров, — это очередь на одного
+    консьюмера. Если она растёт выше scale_up_backlog, консьюмеры не
+    успевают и добавляется процесс; если несколько замеров подряд она ниже
+    scale_down_backlog, консьюмеры простаивают и один процесс завершается.
+    """
+    
+    def __init__(self, config: Config):
+        self.config = config
+        self.min_workers = max(1, config.SUPERVISOR_MIN_WORKERS)
+        self.max_workers = max(self.min_workers, config.SUPERVISOR_MAX_WORKERS)
+        self.desired = self.min_workers
+        self.policy = ScalePolicy(
+            self.min_workers,
+            self.max_workers,
+            config.SUPERVISOR_SCALE_UP_BACKLOG,
+            config.SUPERVISOR_SCALE_DOWN_BACKLOG,
+            config.SUPERVISOR_SCALE_DOWN_SAMPLES
+        )
+        
+        self.running = False
+        # pid -> (процесс, время запуска)
+        self.children: Dict[int, Tuple[multiprocessing.Process, float]] = {}
+        # Процессы, которым отправлен SIGTERM: pid -> крайний срок завершения
+        self.retiring: Dict[int, float] = {}
+        
+        # Подряд идущие падения и время, раньше которого новый процесс не запускаем
+        self.crashes = 0
+        self.next_spawn_at = 0.0
+        
+        self.next_sample_at = 0.0
+        self.idle_samples = 0
+        self._connection: Optional[pika.BlockingConnection] = None
+        self._channel = None
+    
+    def setup_signal_handlers(self):
+        """SIGTERM/SIGINT: корректно остановить все дочерние процессы"""
+        signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)
+    
+    def signal_handler(self, signum, frame):
+        logger.info(f"Received signal {signum}, stopping {len(self.children)} workers...")
+        self.running = False
+    
+    def run(self):
+        """Основной цикл: перезапуск, масштабирование, остановка"""
+        logger.info(f"Starting worker supervisor: {self.min_workers}..{self.max_workers} workers")
+        self.setup_signal_handlers()
+        self.running = True
+        
+        try:
+            while self.running:
+                now = time.monotonic()
+                self.reap_children(now)
+                
+                if now >= self.next_sample_at:
+                    self.next_sample_at = now + self.config.SUPERVISOR_SCALE_INTERVAL
+                    self.autoscale()
+                
+                self.reconcile(now)
+                time.sleep(0.5)
+        finally:
+            self.shutdown()
+            self._close()
+        
+        logger.info("Worker supervisor stopped")
+    
+    def active_count(self) -> int:
+        """Процессы, которые работают и не завершаются"""
+        return len(self.children) - len(self.retiring)
+    
+    def reconcile(self, now: float):
+        """Довести число процессов до желаемого"""
+        active = self.active_count()
+        
+        if active < self.desired and now >= self.next_spawn_at:
+            self.spawn()
+        elif active > self.desired:
+            self.retire_newest(now)
+        
+        # Завершающийся процесс, не уложившийся в срок, убиваем
+        for pid, deadline in list(self.retiring.items()):
+            if now >= deadline and pid in self.children:
+                logger.warning(f"Worker {pid} did not stop in time, killing")
+                self.children[pid][0].kill()
+    
+    def spawn(self):
+        """Запуск одного процесса воркера"""
+        process = _mp.Process(target=run_worker, name='event-worker')
+        process.start()
+        self.children[process.pid] = (process, time.monotonic())
+        logger.info(f"Started worker {process.pid} ({self.active_count()}/{self.desired})")
+    
+    def retire_newest(self, now: float):
+        """Корректная остановка самого нового процесса (SIGTERM)"""
+        candidates = [pid for pid in self.children if pid not in self.retiring]
+        if not candidates:
+            return
+        pid = max(candidates, key=lambda candidate: self.children[candidate][1])
+        self.retiring[pid] = now + self.config.SUPERVISOR_SHUTDOWN_TIMEOUT
+        os.kill(pid, signal.SIGTERM)
+        logger.info(f"Stopping worker {pid} ({self.active_count()}/{self.desired})")
+    
+    def reap_children(self, now: float):
+        """Обработка завершившихся процессов и задержка перед перезапуском упавших"""
+        for pid, (process, started_at) in list(self.children.items()):
+            if process.is_alive():
+                continue
+            
+            process.join()
+            del self.children[pid]
+            if self.retiring.pop(pid, None) is not None:
+                logger.info(f"Worker {pid} stopped (exit code {process.exitcode})")
+                continue
+            
+            # Процесс завершился сам: после долгой работы счётчик падений
+            # сбрасывается, при падениях подряд задержка удваивается
+            if now - started_at >= self.config.SUPERVISOR_STABLE_AFTER:
+                self.crashes = 0
+            self.crashes += 1
+            delay = restart_delay(
+                self.crashes,
+                self.config.SUPERVISOR_RESTART_BACKOFF,
+                self.config.SUPERVISOR_MAX_RESTART_BACKOFF
+            )
+            self.next_spawn_at = max(self.next_spawn_at, now + delay)
+            logger.error(
+                f"Worker {pid} exited unexpectedly (exit code {process.exitcode}), "
+                f"restarting in {delay:.1f}s"
+            )
+    
+    def sample_queue(self) -> Optional[Tuple[int, int]]:
+        """
+        Пассивный queue_declare очереди событий
+        
+        Returns:
+            (число готовых сообщений, число консьюмеров) или None, если брокер недоступен
+        """
+        try:
+            if self._connection is None or self._connection.is_closed:
+                self._connection = get_connection(self.config.RABBIT_URL)
+                self._channel = self._connection.channel()
+            result = self._channel.queue_declare(queue=self.config.RABBIT_QUEUE_EVENTS, passive=True)
+            return result.method.message_count, result.method.consumer_count
+        except Exception as e:
+            logger.warning(f"Failed to sample queue {self.config.RABBIT_QUEUE_EVENTS}: {e}")
+            self._close()
+            return None
+    
+    def autoscale(self):
+        """Изменение желаемого числа процессов по очереди на одного консьюмера"""
+        if self.min_workers == self.max_workers:
+            return
+        
+        sample = self.sample_queue()
+        if sample is None:
+            return
+        depth, consumers = sample
+        
+        desired, self.idle_samples = scale_decision(
+            self.policy, self.desired, self.idle_samples, depth, consumers, self.active_count()
+        )
+        if desired > self.desired:
+            logger.info(f"Scaling up to {desired} workers: queue depth {depth}, {consumers} consumers")
+        elif desired < self.desired:
+            logger.info(f"Scaling down to {desired} workers: queue depth {depth}, {consumers} consumers")
+        self.desired = desired
+    
+    def shutdown(self):
+        """SIGTERM всем процессам, ожидание и SIGKILL оставшимся"""
+        for pid, (process, _) in self.children.items():
+            if process.is_alive():
+                os.kill(pid, signal.SIGTERM)
+        
+        deadline = time.monotonic() + self.config.SUPERVISOR_SHUTDOWN_TIMEOUT
+        for pid, (process, _) in self.children.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {pid} did not stop in time, killing")
+                process.kill()
+                process.join()
+        
+        self.children.clear()
+        self.retiring.clear()
+    
+    def _close(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception as e:
+            logger.debug(f"Error closing supervisor connection: {e}")
+        self._connection = None
+        self._channel = None
+
+
+def main():
+    """Точка входа: python -m worker.supervisor"""
+    Supervisor(Config()).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,19 +2,27 @@ import sys
 import os
 import logging
 import signal
+import threading
 import time
-from typing import Optional
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 # Добавляем корневую директорию проекта в путь Python
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pika
 from worker.config import Config
-from shared.rabbit import RabbitMQConsumer
-from shared.db_postgres import PostgresClient
+from shared.rabbit import RabbitMQConsumer, RetryPolicy
+from shared.publisher import ConfirmingPublisher
+from shared.db_postgres import CONNECTION_ERRORS, PostgresClient
 from shared.db_mysql import MySQLClient
 from shared.logging import set_correlation_id, setup_logging, clear_correlation_id
-from worker.handlers import handle_event_with_dlq
+from worker.handlers import handle_event_batch, handle_event_with_dlq
+from worker.metrics import start_metrics_server
+from worker.seen_filter import SeenIdsFilter
+from worker.sinks import SinkFanout, start_mysql_sinks
+from shared.schemas import SchemaRegistry
 
 # Настройка логгера
 logging.basicConfig(
@@ -37,6 +45,25 @@ class EventWorker:
         self.rabbit_consumer: Optional[RabbitMQConsumer] = None
         self.pg_client: Optional[PostgresClient] = None
         self.mysql_client: Optional[MySQLClient] = None
+        self.schemas: Optional[SchemaRegistry] = None
+        # Отложенные повторы через очереди events.retry.<мс> (пустой RETRY_DELAYS_MS — сразу в DLQ)
+        self.retry: Optional[RetryPolicy] = None
+        if self.config.RETRY_DELAYS_MS:
+            self.retry = RetryPolicy(self.config.RETRY_DELAYS_MS, self.config.MAX_PROCESSING_ATTEMPTS)
+        # Копии в DLQ и очереди повторов: своё соединение с подтверждениями; переживает переподключения
+        self.publisher: Optional[ConfirmingPublisher] = None
+        # Вторичные приёмники (проекция в MySQL); переживают переподключения
+        self.sinks: Optional[SinkFanout] = None
+        # Фильтр уже записанных event_id (SEEN_FILTER_PATH); переживает переподключения и перезапуски
+        self.seen: Optional[SeenIdsFilter] = None
+        # Пакетный режим: (delivery_tag, тело, content_type, correlation_id, заголовки)
+        self.batch: List[Tuple[int, bytes, Optional[str], Optional[str], Optional[dict]]] = []
+        self.batch_timer = None
+        # Параллельный режим: пул потоков и клиенты БД каждого потока
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.thread_local = threading.local()
+        self.thread_clients: List[Tuple[PostgresClient, Optional[MySQLClient]]] = []
+        self.thread_clients_lock = threading.Lock()
         
     def setup_signal_handlers(self):
         """Настройка обработчиков сигналов для graceful shutdown"""
@@ -63,15 +90,23 @@ class EventWorker:
         
         # Подключаемся к PostgreSQL (source of truth)
         try:
-            self.pg_client = PostgresClient(self.config.POSTGRES_URL)
+            self.pg_client = PostgresClient(self.config.POSTGRES_URL, outbox=self.config.OUTBOX_ENABLED)
             self.pg_client.connect()
             logger.info("✅ Connected to PostgreSQL")
         except Exception as e:
             logger.error(f"❌ Failed to connect to PostgreSQL: {e}")
             raise
         
+        if self.config.SEEN_FILTER_PATH and self.seen is None:
+            self.start_seen_filter()
+        
         # Подключаемся к MySQL (best-effort проекция)
-        if self.config.MYSQL_URL:
+        if self.config.OUTBOX_ENABLED:
+            logger.info("✅ MySQL projection via outbox (python -m worker.projector)")
+        elif self.config.MYSQL_URL and self.config.SINK_MYSQL_ENABLED:
+            if self.sinks is None:
+                self.start_sinks()
+        elif self.config.MYSQL_URL:
             try:
                 self.mysql_client = MySQLClient(self.config.MYSQL_URL)
                 self.mysql_client.connect()
@@ -83,15 +118,91 @@ class EventWorker:
         else:
             logger.warning("⚠️  MYSQL_URL not set, MySQL projection disabled")
         
+        # Схемы payload (неизвестные типы проходят без проверки)
+        if self.config.SCHEMA_DIR and self.schemas is None:
+            self.schemas = SchemaRegistry(
+                self.config.SCHEMA_DIR,
+                reload_interval=self.config.SCHEMA_RELOAD_INTERVAL,
+                max_depth=self.config.SCHEMA_MAX_DEPTH,
+                max_nodes=self.config.SCHEMA_MAX_NODES
+            )
+            logger.info(f"✅ Payload schemas loaded from {self.config.SCHEMA_DIR}")
+        
         # Подключаемся к RabbitMQ
         try:
-            self.rabbit_consumer = RabbitMQConsumer(self.config.RABBIT_URL)
+            self.rabbit_consumer = RabbitMQConsumer(self.config.RABBIT_URL, self.config.RETRY_DELAYS_MS)
             self.rabbit_consumer.connect()
             logger.info("✅ Connected to RabbitMQ")
         except Exception as e:
             logger.error(f"❌ Failed to connect to RabbitMQ: {e}")
             raise
     
+    def start_sinks(self):
+        """Проекция в MySQL через свою очередь и потоки (SINK_MYSQL_*)"""
+        self.sinks = start_mysql_sinks(self.config)
+    
+    def start_seen_filter(self):
+        """
+        Фильтр уже записанных event_id (SEEN_FILTER_*)
+        
+        Файл фильтра переживает перезапуск; новый (пустой) файл
+        заполняется event_id, записанными за SEEN_FILTER_WARM_SECONDS.
+        """
+        seen = SeenIdsFilter(
+            self.config.SEEN_FILTER_PATH,
+            capacity=self.config.SEEN_FILTER_CAPACITY,
+            error_rate=self.config.SEEN_FILTER_ERROR_RATE,
+            rotate_after=self.config.SEEN_FILTER_ROTATE_SECONDS,
+            checkpoint_interval=self.config.SEEN_FILTER_CHECKPOINT_SECONDS
+        )
+        if seen.fresh and self.config.SEEN_FILTER_WARM_SECONDS > 0:
+            started = time.monotonic()
+            try:
+                loaded = seen.add_many(self.pg_client.iter_recent_event_ids(self.config.SEEN_FILTER_WARM_SECONDS))
+            except Exception as e:
+                # Неполный фильтр безопасен: промах просто означает INSERT
+                logger.warning(f"⚠️  Seen-ids filter warm load failed: {e}")
+            else:
+                seen.checkpoint()
+                logger.info(f"✅ Seen-ids filter warmed with {loaded} event ids in {time.monotonic() - started:.1f}s")
+        self.seen = seen
+    
+    def stop_seen_filter(self):
+        seen, self.seen = self.seen, None
+        if seen is not None:
+            logger.info(f"Seen-ids filter closed: {seen.stats()}")
+            seen.close()
+    
+    def start_publisher(self):
+        """
+        Постоянный публикатор копий в DLQ и очереди повторов
+        
+        Соединение консьюмера для этого не подходит: BlockingConnection
+        нельзя использовать из потоков пула, а подтверждения на нём
+        синхронные — по одному сообщению. ConfirmingPublisher держит
+        своё соединение, собирает копии в пачки и подтверждает их.
+        """
+        if self.publisher is not None:
+            return
+        self.publisher = ConfirmingPublisher(
+            self.config.RABBIT_URL,
+            max_batch=self.config.PUBLISH_BATCH_SIZE,
+            linger_ms=self.config.PUBLISH_LINGER_MS,
+            confirm_timeout=self.config.PUBLISH_CONFIRM_TIMEOUT
+        )
+        self.publisher.start()
+    
+    def stop_publisher(self):
+        publisher, self.publisher = self.publisher, None
+        if publisher is not None:
+            publisher.stop()
+    
+    def stop_sinks(self):
+        """Дописать очереди приёмников (до SINK_SHUTDOWN_TIMEOUT) и остановить их"""
+        sinks, self.sinks = self.sinks, None
+        if sinks is not None:
+            sinks.close(self.config.SINK_SHUTDOWN_TIMEOUT)
+    
     def process_message(self, ch, method, properties, body):
         """Обработка сообщения с отправкой в DLQ при ошибках"""
         # Получаем correlation_id из заголовков RabbitMQ
@@ -113,7 +224,14 @@ class EventWorker:
                 body, 
                 self.pg_client, 
                 self.mysql_client,
-                self.config.RABBIT_URL
+                self.config.RABBIT_URL,
+                content_type=properties.content_type,
+                schemas=self.schemas,
+                sinks=self.sinks,
+                headers=properties.headers,
+                retry=self.retry,
+                publisher=self.publisher,
+                seen=self.seen
             )
             
             if success:
@@ -131,11 +249,237 @@ class EventWorker:
             # Очищаем correlation_id
             clear_correlation_id()
     
+    def dispatch_message(self, ch, method, properties, body):
+        """Передача сообщения в пул потоков (WORKER_CONCURRENCY > 1)"""
+        # Очередь пула ограничена prefetch_count: больше брокер не отдаст
+        self.executor.submit(self.process_in_thread, ch, method.delivery_tag, properties, body)
+    
+    def process_in_thread(self, ch, delivery_tag, properties, body):
+        """Обработка сообщения в потоке пула; ack/nack выполняет поток соединения"""
+        correlation_id = None
+        if properties.headers:
+            correlation_id = properties.headers.get('correlation_id')
+        
+        # Поток пула обрабатывает разные сообщения: correlation_id задаётся на каждое
+        if correlation_id:
+            set_correlation_id(correlation_id)
+        else:
+            clear_correlation_id()
+        
+        logger.info(f"Received message: {delivery_tag}, correlation: {correlation_id}")
+        
+        try:
+            pg_client, mysql_client = self.get_thread_clients()
+            success = handle_event_with_dlq(
+                body,
+                pg_client,
+                mysql_client,
+                self.config.RABBIT_URL,
+                content_type=properties.content_type,
+                schemas=self.schemas,
+                sinks=self.sinks,
+                headers=properties.headers,
+                retry=self.retry,
+                publisher=self.publisher,
+                seen=self.seen
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error processing message: {e}, correlation: {correlation_id}")
+            success = False
+        finally:
+            clear_correlation_id()
+        
+        # Канал pika не потокобезопасен: подтверждение уходит в поток соединения
+        settle = functools.partial(self.settle_message, ch, delivery_tag, success, correlation_id)
+        try:
+            ch.connection.add_callback_threadsafe(settle)
+        except Exception as e:
+            logger.warning(
+                f"Connection closed before message {delivery_tag} was settled, "
+                f"broker will redeliver it: {e}, correlation: {correlation_id}"
+            )
+    
+    def settle_message(self, ch, delivery_tag: int, success: bool, correlation_id: Optional[str]):
+        """Подтверждение сообщения, обработанного в пуле (поток соединения)"""
+        if not ch.is_open:
+            logger.warning(f"Channel closed, message {delivery_tag} will be redelivered, correlation: {correlation_id}")
+            return
+        
+        if success:
+            ch.basic_ack(delivery_tag=delivery_tag)
+            logger.info(f"Message acknowledged: {delivery_tag}, correlation: {correlation_id}")
+        else:
+            # Уже отправлено в DLQ, отклоняем без повторной попытки
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=False)
+            logger.warning(f"Message sent to DLQ: {delivery_tag}, correlation: {correlation_id}")
+    
+    def get_thread_clients(self) -> Tuple[PostgresClient, Optional[MySQLClient]]:
+        """Клиенты PostgreSQL и MySQL текущего потока пула (создаются при первом сообщении)"""
+        clients = getattr(self.thread_local, 'clients', None)
+        if clients is not None:
+            return clients
+        
+        pg_client = PostgresClient(self.config.POSTGRES_URL, outbox=self.config.OUTBOX_ENABLED)
+        pg_client.connect()
+        
+        # MySQL подключаем, только если проекция доступна основному потоку
+        mysql_client = None
+        if self.mysql_client is not None:
+            try:
+                mysql_client = MySQLClient(self.config.MYSQL_URL)
+                mysql_client.connect()
+            except Exception as e:
+                logger.warning(f"⚠️  Failed to connect to MySQL in {threading.current_thread().name}: {e}")
+                mysql_client = None
+        
+        clients = (pg_client, mysql_client)
+        self.thread_local.clients = clients
+        with self.thread_clients_lock:
+            self.thread_clients.append(clients)
+        return clients
+    
+    def shutdown_executor(self):
+        """Остановка пула: дождаться текущих сообщений и закрыть клиенты потоков"""
+        if self.executor is None:
+            return
+        
+        # Ещё не начатые сообщения не подтверждены — брокер вернёт их в очередь
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.executor = None
+        
+        # Отправляем подтверждения, поставленные потоками пула, пока соединение живо
+        try:
+            connection = self.rabbit_consumer.connection if self.rabbit_consumer else None
+            if connection is not None and connection.is_open:
+                connection.process_data_events(time_limit=0)
+        except Exception as e:
+            logger.warning(f"Failed to flush pending acks: {e}")
+        
+        with self.thread_clients_lock:
+            clients, self.thread_clients = self.thread_clients, []
+        for pg_client, mysql_client in clients:
+            pg_client.close()
+            if mysql_client:
+                mysql_client.close()
+    
+    def collect_message(self, ch, method, properties, body):
+        """Накопление сообщения в пачку (WORKER_BATCH_SIZE > 1)"""
+        correlation_id = None
+        if properties.headers:
+            correlation_id = properties.headers.get('correlation_id')
+        
+        self.batch.append((method.delivery_tag, body, properties.content_type, correlation_id, properties.headers))
+        
+        if len(self.batch) >= self.config.WORKER_BATCH_SIZE:
+            self.flush_batch()
+        elif self.batch_timer is None:
+            # Неполная пачка обрабатывается не позже чем через WORKER_BATCH_TIMEOUT_MS
+            self.batch_timer = self.rabbit_consumer.connection.call_later(
+                self.config.WORKER_BATCH_TIMEOUT_MS / 1000,
+                self.on_batch_timeout
+            )
+    
+    def on_batch_timeout(self):
+        """Таймер пачки сработал"""
+        self.batch_timer = None
+        self.flush_batch()
+    
+    def flush_batch(self):
+        """
+        Обработка накопленной пачки и подтверждение сообщений
+        
+        Отправленные в DLQ сообщения отклоняются по одному, остальные
+        подтверждаются одним basic_ack(multiple=True) по последнему тегу.
+        Если пачка упала на неожиданной ошибке, сообщения обрабатываются
+        по одному и подтверждаются каждое по своему результату.
+        """
+        if self.batch_timer is not None:
+            self.rabbit_consumer.connection.remove_timeout(self.batch_timer)
+            self.batch_timer = None
+        
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        
+        channel = self.rabbit_consumer.channel
+        last_tag = batch[-1][0]
+        
+        results = None
+        try:
+            results = handle_event_batch(
+                [message[1:] for message in batch],
+                self.pg_client,
+                self.mysql_client,
+                self.config.RABBIT_URL,
+                schemas=self.schemas,
+                sinks=self.sinks,
+                retry=self.retry,
+                publisher=self.publisher,
+                seen=self.seen
+            )
+        except CONNECTION_ERRORS as e:
+            # База недоступна, повторы выключены: возвращаем пачку в очередь и переподключаемся
+            logger.error(f"PostgreSQL unavailable, requeueing batch of {len(batch)} messages: {e}")
+            channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error processing batch of {len(batch)} messages, processing one by one: {e}")
+        finally:
+            clear_correlation_id()
+        
+        if results is None:
+            results = [self.process_batch_message(*message) for message in batch]
+        
+        self.settle_batch(channel, batch, results)
+    
+    def process_batch_message(self, delivery_tag: int, body: bytes, content_type: Optional[str],
+                              correlation_id: Optional[str], headers: Optional[dict]) -> bool:
+        """Обработка одного сообщения пачки (после неожиданной ошибки пачки)"""
+        if correlation_id:
+            set_correlation_id(correlation_id)
+        try:
+            return handle_event_with_dlq(
+                body,
+                self.pg_client,
+                self.mysql_client,
+                self.config.RABBIT_URL,
+                content_type=content_type,
+                schemas=self.schemas,
+                sinks=self.sinks,
+                headers=headers,
+                retry=self.retry,
+                publisher=self.publisher,
+                seen=self.seen
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error processing message {delivery_tag}: {e}, correlation: {correlation_id}")
+            return False
+        finally:
+            clear_correlation_id()
+    
+    def settle_batch(self, channel, batch, results: List[bool]):
+        """Подтверждение пачки: отклонённые — по одному, остальные — одним ack"""
+        last_acked = None
+        for (delivery_tag, *_), success in zip(batch, results):
+            if success:
+                last_acked = delivery_tag
+            else:
+                # Уже отправлено в DLQ, отклоняем без повторной попытки
+                channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+        
+        if last_acked is not None:
+            # Все сообщения с тегом <= last_acked, кроме отклонённых выше
+            channel.basic_ack(delivery_tag=last_acked, multiple=True)
+        
+        logger.info(f"Batch acknowledged: {sum(results)} acked, {len(results) - sum(results)} sent to DLQ")
+    
     def run(self):
         """Основной цикл работы воркера"""
         logger.info("Starting Event Worker...")
         logger.info("Architecture: PostgreSQL (source of truth) + MySQL (best-effort projection)")
         self.setup_signal_handlers()
+        start_metrics_server(self.config.WORKER_METRICS_PORT)
+        self.start_publisher()
         self.running = True
         
         while self.running:
@@ -145,20 +489,48 @@ class EventWorker:
                 
                 # Настраиваем обработку сообщений
                 if self.rabbit_consumer.channel:
-                    # Ограничиваем количество неподтверждённых сообщений
-                    self.rabbit_consumer.channel.basic_qos(
-                        prefetch_count=self.config.WORKER_PREFETCH_COUNT
-                    )
+                    # Ограничиваем количество неподтверждённых сообщений;
+                    # в пакетном режиме брокер должен отдать хотя бы целую пачку
+                    batch_mode = self.config.WORKER_BATCH_SIZE > 1
+                    concurrent_mode = not batch_mode and self.config.WORKER_CONCURRENCY > 1
+                    prefetch_count = self.config.WORKER_PREFETCH_COUNT
+                    if batch_mode:
+                        prefetch_count = max(prefetch_count, self.config.WORKER_BATCH_SIZE)
+                        on_message = self.collect_message
+                    elif concurrent_mode:
+                        prefetch_count = max(prefetch_count, self.config.WORKER_CONCURRENCY)
+                        on_message = self.dispatch_message
+                        self.executor = ThreadPoolExecutor(
+                            max_workers=self.config.WORKER_CONCURRENCY,
+                            thread_name_prefix='event-worker'
+                        )
+                    else:
+                        on_message = self.process_message
+                    self.rabbit_consumer.channel.basic_qos(prefetch_count=prefetch_count)
                     
                     # Начинаем слушать очередь
                     self.rabbit_consumer.channel.basic_consume(
                         queue=self.config.RABBIT_QUEUE_EVENTS,
-                        on_message_callback=self.process_message,
+                        on_message_callback=on_message,
                         auto_ack=False  # Важно: ручное подтверждение!
                     )
                     
                     logger.info(f"✅ Worker started, listening to queue: {self.config.RABBIT_QUEUE_EVENTS}")
-                    logger.info(f"✅ MySQL projection: {'ENABLED' if self.mysql_client else 'DISABLED'}")
+                    if self.config.OUTBOX_ENABLED:
+                        logger.info("✅ MySQL projection: OUTBOX")
+                    elif self.sinks is not None:
+                        logger.info("✅ MySQL projection: ENABLED (sink queue)")
+                    else:
+                        logger.info(f"✅ MySQL projection: {'ENABLED' if self.mysql_client else 'DISABLED'}")
+                    if batch_mode:
+                        logger.info(
+                            f"✅ Batch mode: up to {self.config.WORKER_BATCH_SIZE} messages "
+                            f"or {self.config.WORKER_BATCH_TIMEOUT_MS:.0f} ms per batch"
+                        )
+                        if self.config.WORKER_CONCURRENCY > 1:
+                            logger.warning("⚠️  WORKER_CONCURRENCY is ignored in batch mode")
+                    elif concurrent_mode:
+                        logger.info(f"✅ Concurrent mode: {self.config.WORKER_CONCURRENCY} threads, prefetch {prefetch_count}")
                     logger.info("Press Ctrl+C to stop")
                     
                     # Запускаем бесконечный цикл обработки
@@ -177,6 +549,13 @@ class EventWorker:
                     time.sleep(self.config.WORKER_RECONNECT_DELAY)
                     
             finally:
+                # Неподтверждённые сообщения пачки брокер вернёт в очередь при закрытии канала
+                self.batch = []
+                self.batch_timer = None
+                
+                # Пул останавливаем до закрытия канала, чтобы отправить готовые подтверждения
+                self.shutdown_executor()
+                
                 # Закрываем соединения
                 if self.rabbit_consumer:
                     self.rabbit_consumer.close()
@@ -190,16 +569,28 @@ class EventWorker:
                     self.mysql_client.close()
                     self.mysql_client = None
         
+        # Сообщения уже подтверждены: дописываем то, что осталось в очередях приёмников
+        self.stop_sinks()
+        self.stop_publisher()
+        self.stop_seen_filter()
         logger.info("Worker stopped")
 
     def stop(self):
         """Остановка воркера"""
         self.running = False
         logger.info("Stopping worker...")
+        self.stop_sinks()
+        self.stop_publisher()
+        self.stop_seen_filter()
 
 
 def main():
     """Точка входа"""
+    # Супервизор запускает эту же функцию, поэтому выбор движка действует и на него
+    if Config.WORKER_ENGINE == 'asyncio':
+        from worker.async_worker import main as run_async_worker
+        return run_async_worker()
+    
     worker = EventWorker()
     
     try: